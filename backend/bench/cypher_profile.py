@@ -0,0 +1,463 @@
+''' benchmark de las queries de Neo4jGraphRepository: PROFILE (db hits, filas, operadores) + tiempo
+
+Carga un grafo sintético del tamaño pedido en un Neo4j DEDICADO (lo vacía con --reset) y corre cada
+método del repositorio tal cual lo usa la app, con el Cypher prefijado por PROFILE y dentro de una
+transacción que se descarta al final: las escrituras no cambian el grafo entre casos ni repeticiones.
+Compara contra bench/baselines.json y sale con código 1 si algún caso empeoró: más db hits que el
+baseline (+tolerancia) o un operador caro que antes no estaba (CartesianProduct, AllNodesScan, ...).
+Un caso sin baseline también falla (si no, el benchmark pasaría siempre): se graba con
+--update-baselines y se commitea; --allow-missing-baselines solo para explorar en local.
+
+    docker run -d --name edugrade-neo4j-bench -p 7688:7687 -e NEO4J_AUTH=neo4j/benchpass neo4j:5.22
+    cd backend
+    PYTHONPATH=src python bench/cypher_profile.py --preset small --reset
+    PYTHONPATH=src python bench/cypher_profile.py --preset small --update-baselines
+
+El tiempo de pared se informa pero no falla el benchmark (depende de la máquina); los db hits sí.
+'''
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from neo4j import AsyncDriver, AsyncGraphDatabase
+
+from edugrade.models.neo4j import (
+    LABEL_EQUIVALENCE_GROUP,
+    LABEL_INSTITUTION,
+    LABEL_STUDENT,
+    LABEL_SUBJECT,
+    REL_EQUIVALENT_TO,
+    REL_MEMBER_OF,
+    REL_STUDIES_AT,
+    REL_TOOK,
+)
+from edugrade.repository.neo4j_graph import Neo4jGraphRepository
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+
+# operadores que en estas queries indican un plan roto (falta de índice, producto cartesiano)
+WATCHED_OPERATORS = {"CartesianProduct", "AllNodesScan", "NodeByLabelScan", "DirectedAllRelationshipsScan", "Eager"}
+
+LEVEL_STAGES = ["1", "2", "3"]
+
+PRESETS: Dict[str, Dict[str, int]] = {
+    "small": {"students": 2_000, "institutions": 20, "subjects": 40, "took": 12, "enrollments": 2, "groups": 200, "cycles": 50},
+    "medium": {"students": 50_000, "institutions": 200, "subjects": 60, "took": 20, "enrollments": 3, "groups": 3_000, "cycles": 500},
+    "large": {"students": 250_000, "institutions": 1_000, "subjects": 80, "took": 30, "enrollments": 3, "groups": 20_000, "cycles": 2_000},
+}
+
+
+# ---------- grafo sintético ----------
+
+def student_id(i: int) -> str:
+    # mismo formato que un ObjectId hex (24 chars), prefijo distinto por tipo
+    return f"5{i:023x}"
+
+
+def institution_id(i: int) -> str:
+    return f"6{i:023x}"
+
+
+@dataclass
+class Fixture:
+    # ids conocidos del grafo cargado, para parametrizar los casos
+    students: int
+    institutions: int
+    busy_student: str = ""
+    busy_institution: str = ""
+    student_sample: List[str] = field(default_factory=list)
+    subject_sample: List[str] = field(default_factory=list)
+    grouped_pair: List[str] = field(default_factory=list)
+    enrollment: Dict[str, str] = field(default_factory=dict)
+
+
+async def _run_batches(driver: AsyncDriver, cypher: str, rows: List[dict], batch_size: int = 5000) -> None:
+    async with driver.session() as session:
+        for i in range(0, len(rows), batch_size):
+            result = await session.run(cypher, {"rows": rows[i:i + batch_size]})
+            await result.consume()
+
+
+async def reset_graph(driver: AsyncDriver) -> None:
+    async with driver.session() as session:
+        result = await session.run("""
+            MATCH (n)
+            CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+        """)
+        await result.consume()
+
+
+async def graph_is_empty(driver: AsyncDriver) -> bool:
+    async with driver.session() as session:
+        result = await session.run("MATCH (n) RETURN n LIMIT 1")
+        return await result.single() is None
+
+
+async def load_graph(driver: AsyncDriver, size: Dict[str, int], seed: int) -> Fixture:
+    rng = random.Random(seed)
+    n_students, n_institutions = size["students"], size["institutions"]
+
+    # índices/constraints de producción antes de cargar: los planes tienen que ser los reales
+    await Neo4jGraphRepository(driver).ensure_constraints()
+
+    await _run_batches(
+        driver,
+        f"UNWIND $rows AS id CREATE (:{LABEL_INSTITUTION} {{mongoId: id}})",
+        [institution_id(i) for i in range(n_institutions)],
+    )
+
+    subjects_by_inst: Dict[str, List[str]] = {}
+    subject_rows: List[dict] = []
+    for i in range(n_institutions):
+        inst = institution_id(i)
+        ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(size["subjects"])]
+        subjects_by_inst[inst] = ids
+        subject_rows += [
+            {"id": sid, "name": f"Subject {k:03d} inst {i}", "institutionMongoId": inst}
+            for k, sid in enumerate(ids)
+        ]
+    await _run_batches(
+        driver,
+        f"UNWIND $rows AS row CREATE (:{LABEL_SUBJECT} {{id: row.id, name: row.name, institutionMongoId: row.institutionMongoId}})",
+        subject_rows,
+    )
+
+    await _run_batches(
+        driver,
+        f"UNWIND $rows AS id CREATE (:{LABEL_STUDENT} {{mongoId: id}})",
+        [student_id(i) for i in range(n_students)],
+    )
+
+    # inscripciones consecutivas y TOOK dentro de cada una; las instituciones siguen una ley de potencia
+    # (unas pocas concentran muchos alumnos, como en los datos reales)
+    weights = [1 / (i + 1) for i in range(n_institutions)]
+    enroll_rows: List[dict] = []
+    took_rows: List[dict] = []
+    for s in range(n_students):
+        sid = student_id(s)
+        start = date(2010, 3, 1) + timedelta(days=rng.randrange(0, 3650))
+        insts = rng.choices(range(n_institutions), weights=weights, k=rng.randint(1, size["enrollments"]))
+        taken: set = set()   # como en la app (MERGE), un solo TOOK por (alumno, materia)
+        for idx, i in enumerate(insts):
+            end = start + timedelta(days=rng.randrange(200, 1500))
+            is_last = idx == len(insts) - 1
+            inst = institution_id(i)
+            enroll_rows.append({
+                "s": sid, "i": inst, "start": start, "end": None if is_last and rng.random() < 0.5 else end,
+            })
+            for sub in rng.sample(subjects_by_inst[inst], k=min(size["took"] // len(insts) + 1, size["subjects"])):
+                if sub in taken:
+                    continue
+                taken.add(sub)
+                took_start = start + timedelta(days=rng.randrange(0, max((end - start).days - 120, 1)))
+                took_rows.append({
+                    "s": sid, "sub": sub, "start": took_start, "end": took_start + timedelta(days=120),
+                    "grade": str(rng.randint(1, 10)),
+                })
+            start = end + timedelta(days=1)
+
+    await _run_batches(driver, f"""
+        UNWIND $rows AS row
+        MATCH (s:{LABEL_STUDENT} {{mongoId: row.s}})
+        MATCH (i:{LABEL_INSTITUTION} {{mongoId: row.i}})
+        CREATE (s)-[:{REL_STUDIES_AT} {{startDate: row.start, endDate: row.end}}]->(i)
+    """, enroll_rows)
+    await _run_batches(driver, f"""
+        UNWIND $rows AS row
+        MATCH (s:{LABEL_STUDENT} {{mongoId: row.s}})
+        MATCH (sub:{LABEL_SUBJECT} {{id: row.sub}})
+        CREATE (s)-[:{REL_TOOK} {{startDate: row.start, endDate: row.end, grade: row.grade}}]->(sub)
+    """, took_rows)
+    # TRANSFER_FLOW precalculado, como queda en producción tras la migración
+    await Neo4jGraphRepository(driver).rebuild_transfer_flows()
+
+    # grupos de equivalencia de 2..6 materias al azar; como en la app, una materia está en
+    # a lo sumo un grupo por levelStage (cada levelStage reparte una permutación propia)
+    all_subjects = [r["id"] for r in subject_rows]
+    pools = {stage: rng.sample(all_subjects, k=len(all_subjects)) for stage in LEVEL_STAGES}
+    group_rows: List[dict] = []
+    for g in range(size["groups"]):
+        stage = rng.choice(LEVEL_STAGES)
+        members = [pools[stage].pop() for _ in range(min(rng.randint(2, 6), len(pools[stage])))]
+        if len(members) < 2:
+            break
+        group_rows.append({"levelStage": stage, "groupId": f"bench-{g}", "members": members})
+    await _run_batches(driver, f"""
+        UNWIND $rows AS row
+        MERGE (g:{LABEL_EQUIVALENCE_GROUP} {{levelStage: row.levelStage, groupId: row.groupId}})
+        WITH g, row
+        UNWIND row.members AS sid
+        MATCH (sub:{LABEL_SUBJECT} {{id: sid}})
+        MERGE (sub)-[:{REL_MEMBER_OF}]->(g)
+    """, group_rows)
+
+    # ciclos EQUIVALENT_TO del modelo viejo (los lee la migración a grupos)
+    cycle_rows: List[dict] = []
+    for _ in range(size["cycles"]):
+        ring = rng.sample(all_subjects, k=rng.randint(2, 5))
+        stage = rng.choice(LEVEL_STAGES)
+        cycle_rows += [{"a": a, "b": b, "levelStage": stage} for a, b in zip(ring, ring[1:] + ring[:1])]
+    await _run_batches(driver, f"""
+        UNWIND $rows AS row
+        MATCH (a:{LABEL_SUBJECT} {{id: row.a}})
+        MATCH (b:{LABEL_SUBJECT} {{id: row.b}})
+        CREATE (a)-[:{REL_EQUIVALENT_TO} {{levelStage: row.levelStage}}]->(b)
+    """, cycle_rows)
+
+    return _fixture(size, enroll_rows, took_rows, group_rows, rng)
+
+
+def _fixture(size: Dict[str, int], enroll_rows: List[dict], took_rows: List[dict], group_rows: List[dict], rng: random.Random) -> Fixture:
+    fx = Fixture(students=size["students"], institutions=size["institutions"])
+
+    took_count: Dict[str, int] = {}
+    for row in took_rows:
+        took_count[row["s"]] = took_count.get(row["s"], 0) + 1
+    # el alumno más cargado: es el peor caso de las queries por alumno
+    fx.busy_student = max(took_count, key=took_count.get)
+    fx.busy_institution = institution_id(0)
+    fx.student_sample = [student_id(i) for i in rng.sample(range(size["students"]), k=min(100, size["students"]))]
+    fx.subject_sample = [r["sub"] for r in took_rows[:100]]
+    fx.grouped_pair = group_rows[0]["members"][:2] + [group_rows[0]["levelStage"]]
+    first = next(r for r in enroll_rows if r["s"] == fx.busy_student)
+    fx.enrollment = {"institution": first["i"], "start": first["start"].isoformat()}
+    return fx
+
+
+# ---------- ejecución con PROFILE ----------
+
+@dataclass
+class Sample:
+    db_hits: int
+    rows: int
+    operators: List[str]
+
+
+def _walk_plan(plan: Dict[str, Any], hits: List[int], operators: set) -> None:
+    hits.append(int(plan.get("dbHits", 0)))
+    op = str(plan.get("operatorType", "")).split("@")[0]
+    operators.add(op)
+    for child in plan.get("children", []):
+        _walk_plan(child, hits, operators)
+
+
+class ProfilingRepository(Neo4jGraphRepository):
+    # mismos métodos y mismo Cypher que la app; cada statement corre con PROFILE y deja su muestra
+
+    def __init__(self, driver: AsyncDriver):
+        super().__init__(driver)
+        self.samples: List[Sample] = []
+
+    async def _fetch(self, tx, cypher: str, params: dict, single: bool):
+        result = await tx.run("PROFILE " + cypher, params)
+        records = [rec async for rec in result]
+        summary = await result.consume()
+        hits: List[int] = []
+        operators: set = set()
+        if summary.profile:
+            _walk_plan(summary.profile, hits, operators)
+        self.samples.append(Sample(db_hits=sum(hits), rows=len(records), operators=sorted(operators)))
+        if single:
+            return records[0] if records else None
+        return records
+
+
+Case = Callable[[Neo4jGraphRepository, Fixture], Awaitable[Any]]
+
+
+def build_cases() -> Dict[str, Case]:
+    def new_students(n: int) -> List[str]:
+        return [f"f{i:023x}" for i in range(n)]
+
+    return {
+        # ---- lecturas ----
+        "get_schema_version": lambda r, fx: r.get_schema_version("graph"),
+        "list_mongo_ids": lambda r, fx: r.list_mongo_ids(LABEL_STUDENT, None, 5000),
+        "get_student_subjects": lambda r, fx: r.get_student_subjects(fx.busy_student),
+        "get_institutions_by_student": lambda r, fx: r.get_institutions_by_student(fx.busy_student),
+        "get_student_subject_took": lambda r, fx: r.get_student_subject_took(fx.busy_student, fx.subject_sample[0]),
+        "get_student_history_rows": lambda r, fx: r.get_student_history_rows(fx.busy_student),
+        "get_student_enrollments": lambda r, fx: r.get_student_enrollments(fx.busy_student),
+        "get_student_subject_rows": lambda r, fx: r.get_student_subject_rows(fx.busy_student),
+        "get_enrollments_for_students[100]": lambda r, fx: r.get_enrollments_for_students(fx.student_sample),
+        "get_subject_rows_for_students[100]": lambda r, fx: r.get_subject_rows_for_students(fx.student_sample),
+        "get_subjects_by_ids[100]": lambda r, fx: r.get_subjects_by_ids(fx.subject_sample),
+        "get_subjects_by_institution": lambda r, fx: r.get_subjects_by_institution(fx.busy_institution),
+        "search_subjects": lambda r, fx: r.search_subjects("subject 01"),
+        "search_subjects[institution]": lambda r, fx: r.search_subjects("subject", fx.busy_institution, 0, 20),
+        "get_students_by_institution": lambda r, fx: r.get_students_by_institution(fx.busy_institution, None, 50),
+        "get_students_by_institution[dates]": lambda r, fx: r.get_students_by_institution(
+            fx.busy_institution, None, 50, "2014-01-01", "2014-12-31"
+        ),
+        "count_students_by_institution": lambda r, fx: r.count_students_by_institution(fx.busy_institution),
+        "count_students_by_institution[dates]": lambda r, fx: r.count_students_by_institution(
+            fx.busy_institution, "2014-01-01", "2014-12-31"
+        ),
+        "get_subjects_by_institution_student": lambda r, fx: r.get_subjects_by_institution_student(
+            fx.enrollment["institution"], fx.busy_student
+        ),
+        "get_subjects_by_institution_student_interval": lambda r, fx: r.get_subjects_by_institution_student_interval(
+            fx.enrollment["institution"], fx.busy_student, fx.enrollment["start"]
+        ),
+        "get_equivalences_group": lambda r, fx: r.get_equivalences_group(fx.grouped_pair[0], fx.grouped_pair[2]),
+        "get_group_memberships": lambda r, fx: r.get_group_memberships(fx.grouped_pair[2], fx.subject_sample),
+        "are_equivalent": lambda r, fx: r.are_equivalent(*fx.grouped_pair),
+        "get_transfer_matches": lambda r, fx: r.get_transfer_matches(fx.busy_student, fx.busy_institution, LEVEL_STAGES[0]),
+        "list_legacy_equivalence_pairs": lambda r, fx: r.list_legacy_equivalence_pairs(),
+        "count_string_dates": lambda r, fx: r.count_string_dates(REL_TOOK),
+        "get_transfer_flows": lambda r, fx: r.get_transfer_flows(None, None, None, 20),
+        "get_transfer_flows[year,from]": lambda r, fx: r.get_transfer_flows(2015, fx.busy_institution, None, 20),
+        # ---- escrituras (se descartan con rollback) ----
+        "apply_transfer_flows[100]": lambda r, fx: r.apply_transfer_flows(fx.student_sample, 1),
+        "upsert_student": lambda r, fx: r.upsert_student(new_students(1)[0]),
+        "upsert_students[500]": lambda r, fx: r.upsert_students(new_students(500)),
+        "delete_student": lambda r, fx: r.delete_student(fx.busy_student),
+        "delete_students[100]": lambda r, fx: r.delete_students(fx.student_sample),
+        "upsert_subject": lambda r, fx: r.upsert_subject("Bench subject", fx.busy_institution),
+        "link_studies_at": lambda r, fx: r.link_studies_at(fx.busy_student, fx.busy_institution, "2030-01-01"),
+        "link_studies_at_many[100]": lambda r, fx: r.link_studies_at_many([
+            {"studentMongoId": s, "institutionMongoId": fx.busy_institution, "startDate": "2030-01-01"}
+            for s in fx.student_sample
+        ]),
+        "link_took": lambda r, fx: r.link_took(fx.busy_student, fx.subject_sample[-1], "2030-01-01", "7"),
+        "link_took_many[100]": lambda r, fx: r.link_took_many([
+            {"studentMongoId": s, "subjectId": fx.subject_sample[0], "startDate": "2030-01-01", "grade": "7"}
+            for s in fx.student_sample
+        ]),
+        "enroll_students[100]": lambda r, fx: r.enroll_students([
+            {"studentMongoId": s, "institutionMongoId": fx.busy_institution, "startDate": "2030-01-01"}
+            for s in fx.student_sample
+        ]),
+        "unlink_equivalence_by_subject": lambda r, fx: r.unlink_equivalence_by_subject(fx.grouped_pair[0], fx.grouped_pair[2]),
+    }
+
+
+async def run_case(driver: AsyncDriver, case: Case, fx: Fixture, repeats: int) -> Dict[str, Any]:
+    walls: List[float] = []
+    last: List[Sample] = []
+    for _ in range(repeats + 1):   # la primera vuelta calienta caches y plan cache
+        repo = ProfilingRepository(driver)
+        async with driver.session() as session:
+            tx = await session.begin_transaction()
+            try:
+                t0 = time.perf_counter()
+                await case(repo._bound(tx), fx)
+                walls.append((time.perf_counter() - t0) * 1000)
+            finally:
+                await tx.rollback()
+        last = repo.samples
+    operators = sorted({op for s in last for op in s.operators})
+    return {
+        "dbHits": sum(s.db_hits for s in last),
+        "rows": sum(s.rows for s in last),
+        "statements": len(last),
+        "watched": [op for op in operators if op in WATCHED_OPERATORS],
+        "wallMs": round(statistics.median(walls[1:]), 2),
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    allow_missing: bool = False,
+) -> List[str]:
+    problems: List[str] = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            if not allow_missing:
+                problems.append(f"{name}: no baseline recorded")
+            continue
+        limit = base["dbHits"] * (1 + tolerance)
+        if res["dbHits"] > limit:
+            problems.append(f"{name}: dbHits {res['dbHits']} > baseline {base['dbHits']} (+{tolerance:.0%})")
+        new_ops = sorted(set(res["watched"]) - set(base.get("watched", [])))
+        if new_ops:
+            problems.append(f"{name}: new plan operators {', '.join(new_ops)}")
+    return problems
+
+
+def print_table(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'case':48} {'dbHits':>10} {'base':>10} {'rows':>8} {'wall ms':>9} {'base ms':>9}  watched")
+    for name, res in results.items():
+        base = baseline.get(name, {})
+        print(
+            f"{name:48} {res['dbHits']:>10} {str(base.get('dbHits', '-')):>10} {res['rows']:>8} "
+            f"{res['wallMs']:>9} {str(base.get('wallMs', '-')):>9}  {','.join(res['watched'])}"
+        )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="PROFILE the Neo4jGraphRepository queries against a synthetic graph")
+    parser.add_argument("--uri", default="bolt://localhost:7688")
+    parser.add_argument("--user", default="neo4j")
+    parser.add_argument("--password", default="benchpass")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    for key in PRESETS["small"]:
+        parser.add_argument(f"--{key}", type=int, default=None, help=f"override preset {key}")
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed dbHits growth over baseline")
+    parser.add_argument("--only", default=None, help="substring filter on case names")
+    parser.add_argument("--reset", action="store_true", help="wipe the target database before loading")
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--allow-missing-baselines", action="store_true", help="do not fail cases without a baseline")
+    args = parser.parse_args()
+
+    size = dict(PRESETS[args.preset])
+    overrides = {k: getattr(args, k) for k in size if getattr(args, k) is not None}
+    size.update(overrides)
+    # con overrides el grafo no es el del preset: baseline propio
+    profile_key = args.preset if not overrides else "custom-" + "-".join(f"{k}{v}" for k, v in sorted(size.items()))
+
+    driver = AsyncGraphDatabase.driver(args.uri, auth=(args.user, args.password))
+    try:
+        if not await graph_is_empty(driver):
+            if not args.reset:
+                print(f"[bench] {args.uri} is not empty; use a dedicated instance and pass --reset", file=sys.stderr)
+                return 2
+            await reset_graph(driver)
+
+        t0 = time.perf_counter()
+        fx = await load_graph(driver, size, args.seed)
+        print(f"[bench] loaded {profile_key} graph {size} in {time.perf_counter() - t0:.1f}s")
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for name, case in build_cases().items():
+            if args.only and args.only not in name:
+                continue
+            results[name] = await run_case(driver, case, fx, args.repeats)
+    finally:
+        await driver.close()
+
+    baselines = json.loads(BASELINES_PATH.read_text(encoding="utf-8")) if BASELINES_PATH.exists() else {}
+    baseline = baselines.get(profile_key, {})
+    print_table(results, baseline)
+
+    if args.update_baselines:
+        baselines[profile_key] = {**baseline, **results}
+        BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"[bench] baselines for {profile_key} written to {BASELINES_PATH}")
+        return 0
+
+    problems = compare(results, baseline, args.tolerance, args.allow_missing_baselines)
+    for p in problems:
+        print(f"[bench] REGRESSION {p}")
+    if any(name not in baseline for name in results):
+        print(f"[bench] missing baselines for {profile_key}; run with --update-baselines and commit baselines.json")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
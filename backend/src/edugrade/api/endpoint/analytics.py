@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from edugrade.core.loader import Loaders, get_loaders
+from edugrade.schemas.neo4j.analytics import TransferFlowOut
+from edugrade.services.neo4j_graph import Neo4jGraphService, get_neo4j_service
+from edugrade.utils.object_id import is_objectid_hex
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+@router.get("/transfer-flows", response_model=list[TransferFlowOut])
+async def get_transfer_flows(
+  year: int | None = Query(default=None, ge=1900, le=2200, description="year the student started at the destination; omitted = all years summed"),
+  fromInstitutionId: str | None = Query(default=None),
+  toInstitutionId: str | None = Query(default=None),
+  limit: int = Query(default=20, ge=1, le=500, description="top-k pairs by count"),
+  neo: Neo4jGraphService = Depends(get_neo4j_service),
+  loaders: Loaders = Depends(get_loaders),
+):
+  for name, value in (("fromInstitutionId", fromInstitutionId), ("toInstitutionId", toInstitutionId)):
+    if value is not None and not is_objectid_hex(value):
+      raise HTTPException(status_code=400, detail=f"Invalid {name}")
+
+  # se lee de TRANSFER_FLOW (precalculado), no se recorren los STUDIES_AT en cada request
+  flows = await neo.get_transfer_flows(year, fromInstitutionId, toInstitutionId, limit)
+
+  ids = list({f["fromInstitutionId"] for f in flows} | {f["toInstitutionId"] for f in flows})
+  names = {i: (doc or {}).get("name") for i, doc in zip(ids, await loaders.institutions.load_many(ids))}
+  return [
+    {**f, "fromInstitutionName": names.get(f["fromInstitutionId"]), "toInstitutionName": names.get(f["toInstitutionId"])}
+    for f in flows
+  ]
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, Request, status
+
+from edugrade.audit.context import AuditContext, get_audit_context
+from edugrade.core.services import get_app_service
+from edugrade.schemas.mongo.conversion_rule import ConversionRuleDraft
+from edugrade.schemas.mongo.reconversion_job import ReconversionJobCreate, ReconversionJobOut
+from edugrade.schemas.mongo.simulation import SimulationOut
+from edugrade.services.mongo.reconversion import ReconversionService
+from edugrade.services.mongo.simulation import ConversionSimulationService
+
+router = APIRouter(prefix="/conversion-rules", tags=["conversion-rules"])
+
+
+def get_reconversion_service(request: Request) -> ReconversionService:
+  return get_app_service(request, "reconversion")
+
+
+def get_simulation_service(request: Request) -> ConversionSimulationService:
+  return get_app_service(request, "simulation")
+
+
+@router.post("/simulate", response_model=SimulationOut)
+async def simulate_rule(
+  payload: ConversionRuleDraft,
+  svc: ConversionSimulationService = Depends(get_simulation_service),
+):
+  return await svc.simulate(payload.model_dump())
+
+
+@router.post("/reconversions", response_model=ReconversionJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def start_reconversion(
+  payload: ReconversionJobCreate,
+  audit: AuditContext = Depends(get_audit_context),
+  svc: ReconversionService = Depends(get_reconversion_service),
+):
+  return await svc.start(payload.model_dump(), audit=audit)
+
+
+@router.get("/reconversions/{job_id}", response_model=ReconversionJobOut)
+async def get_reconversion(
+  job_id: str,
+  svc: ReconversionService = Depends(get_reconversion_service),
+):
+  return await svc.get(job_id)
+
+
+@router.post("/reconversions/{job_id}/resume", response_model=ReconversionJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def resume_reconversion(
+  job_id: str,
+  svc: ReconversionService = Depends(get_reconversion_service),
+):
+  return await svc.resume(job_id)
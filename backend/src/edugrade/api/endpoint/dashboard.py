@@ -2,19 +2,14 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Depends, Query, Request
 
-from edugrade.core.db import get_mongo_db
+from edugrade.core.services import get_app_service
 from edugrade.schemas.mongo.dashboard import DashboardOut, DashboardSubjectsOut
 from edugrade.services.mongo.dashboard import DashboardService
-from edugrade.services.neo4j_graph import get_neo4j_service, Neo4jGraphService
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
-def get_service(
-  request: Request,
-  db=Depends(get_mongo_db),
-  neo: Neo4jGraphService = Depends(get_neo4j_service),
-) -> DashboardService:
-  return DashboardService(db, request.app.state.audit_logger, neo)
+def get_service(request: Request) -> DashboardService:
+  return get_app_service(request, "dashboard")
 
 
 @router.get("", response_model=DashboardOut)
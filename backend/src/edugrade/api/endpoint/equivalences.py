@@ -1,34 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
-from edugrade.schemas.neo4j.relations import EquivalentToIn
+from edugrade.schemas.neo4j.relations import EquivalenceBulkIn, EquivalenceBulkOut, EquivalentToIn
 from edugrade.services.neo4j_graph import get_neo4j_service, Neo4jGraphService
 from edugrade.audit.context import AuditContext, get_audit_context
 from edugrade.audit.exec import audited
-import asyncio
 
 router = APIRouter(prefix="/equivalences", tags=["equivalences"])
 
 
-async def _neo(callable_, *args, **kwargs):
-  return await asyncio.to_thread(callable_, *args, **kwargs)
-
-
-def get_service() -> Neo4jGraphService:
-  return get_neo4j_service()
-
-
 @router.post("", status_code=status.HTTP_201_CREATED)
 async def create_equivalence(
   request: Request,
   payload: EquivalentToIn,
   audit: AuditContext = Depends(get_audit_context),
-  svc: Neo4jGraphService = Depends(get_service),
+  svc: Neo4jGraphService = Depends(get_neo4j_service),
 ):
   audit_logger = request.app.state.audit_logger
 
   try:
     async def _do():
-      return await _neo(
-        svc.add_equivalence,
+      return await svc.add_equivalence(
         payload.fromSubjectId,
         payload.toSubjectId,
         payload.levelStage,
@@ -54,21 +44,45 @@ async def create_equivalence(
     raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/bulk", response_model=EquivalenceBulkOut, status_code=status.HTTP_200_OK)
+async def create_equivalences_bulk(
+  request: Request,
+  payload: EquivalenceBulkIn,
+  audit: AuditContext = Depends(get_audit_context),
+  svc: Neo4jGraphService = Depends(get_neo4j_service),
+):
+  pairs = [(p.fromSubjectId, p.toSubjectId) for p in payload.pairs]
+
+  async def _do():
+    return await svc.add_equivalences_bulk(payload.levelStage, pairs)
+
+  return await audited(
+    audit_logger=request.app.state.audit_logger,
+    audit=audit,
+    operation="CREATE_BATCH",
+    db="neo4j",
+    entity_type="Equivalence",
+    entity_id=f"(batch):{payload.levelStage}",
+    payload_summary=f"equivalence bulk import; levelStage={payload.levelStage} pairs={len(pairs)}",
+    fn=_do,
+  )
+
+
 @router.delete("/{subject_id}", status_code=status.HTTP_200_OK)
 async def delete_equivalence(
   request: Request,
   subject_id: str,
   levelStage: str = Query(..., min_length=1),
   audit: AuditContext = Depends(get_audit_context),
-  svc: Neo4jGraphService = Depends(get_service),
+  svc: Neo4jGraphService = Depends(get_neo4j_service),
 ):
   audit_logger = request.app.state.audit_logger
 
   async def _do():
-    result = await _neo(svc.unlink_equivalence_by_subject, subject_id, levelStage)
+    result = await svc.unlink_equivalence_by_subject(subject_id, levelStage)
     if not result["deleted"]:
       raise HTTPException(status_code=404, detail="Subject has no equivalence group for that levelStage")
-    return 0
+    return result
 
   res = await audited(
     audit_logger=audit_logger,
@@ -88,9 +102,9 @@ async def delete_equivalence(
 async def list_equivalences(
   subject_id: str,
   levelStage: str = Query(..., min_length=1),
-  svc: Neo4jGraphService = Depends(get_service),
+  svc: Neo4jGraphService = Depends(get_neo4j_service),
 ):
-  items = await _neo(svc.get_equivalences_group, subject_id, levelStage)
+  items = await svc.get_equivalences_group(subject_id, levelStage)
   if not items:
     return {"subjectId": subject_id, "levelStage": levelStage, "equivalences": []}
   return {"subjectId": subject_id, "levelStage": levelStage, "equivalences": items}
\ No newline at end of file
@@ -1,25 +1,39 @@
 from datetime import date
-from fastapi import APIRouter, Depends, Query, status, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, status, Request
 
-from edugrade.core.db import get_mongo_db
+from edugrade.config import settings
+from edugrade.core.services import get_app_service
 from edugrade.schemas.mongo.grade import GradeCreate, GradeOut, GradeOutDisplay
 from edugrade.audit.context import AuditContext, get_audit_context
 from edugrade.services.mongo.grade import GradeService
+from edugrade.services.mongo.grade_projection import GradeProjectionService
 
 router = APIRouter(prefix="/exams", tags=["exams"])
 
 
-def get_service(request: Request, db=Depends(get_mongo_db)) -> GradeService:
-  return GradeService(db, request.app.state.audit_logger)
+def get_service(request: Request) -> GradeService:
+  return get_app_service(request, "grades")
+
+
+def get_projection_service(request: Request) -> GradeProjectionService:
+  return get_app_service(request, "grade_projections")
 
 
 @router.post("", response_model=GradeOut, status_code=status.HTTP_201_CREATED)
 async def create_exam(
   payload: GradeCreate,
+  background: BackgroundTasks,
   audit: AuditContext = Depends(get_audit_context),
   svc: GradeService = Depends(get_service),
+  projections: GradeProjectionService = Depends(get_projection_service),
 ):
-  return await svc.create(payload.model_dump(), audit=audit)
+  doc = await svc.create(payload.model_dump(), audit=audit)
+
+  # proyecciones a todos los sistemas, fuera del request (opt-in)
+  if settings.grade_projections_enabled:
+    background.add_task(projections.fill, doc["_id"])
+
+  return doc
 
 
 @router.get("/{exam_id}", response_model=GradeOutDisplay)
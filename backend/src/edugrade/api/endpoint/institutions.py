@@ -1,74 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+from datetime import date
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Request
 from edugrade.schemas.neo4j.student import StudentOut
-from edugrade.services.mongo.student import StudentService
 from edugrade.schemas.mongo.institution import (
+  InstitutionBulkCreate,
   InstitutionCreate,
   InstitutionOut,
+  InstitutionSuggestOut,
   StudentInstitutionOut,
 )
+from edugrade.schemas.mongo.bulk import BulkCreateOut
 from edugrade.services.mongo.institution import InstitutionService
-from edugrade.core.db import get_mongo_db
+from edugrade.core.services import get_app_service
+from edugrade.core.loader import Loaders, get_loaders
 from edugrade.services.neo4j_graph import Neo4jGraphService, get_neo4j_service
 from edugrade.schemas.neo4j.subject import SubjectOut
 from edugrade.audit.context import AuditContext, get_audit_context
 from edugrade.audit.exec import audited
+from edugrade.utils.cursor import (
+  NEXT_CURSOR_HEADER,
+  TOTAL_COUNT_HEADER,
+  decode_key_cursor,
+  encode_key_cursor,
+  next_cursor,
+)
+from edugrade.utils.date import ensure_date_range
 import asyncio
 
 router = APIRouter(prefix="/institutions", tags=["institutions"])
 
 
-async def _neo(callable_, *args, **kwargs):
-  return await asyncio.to_thread(callable_, *args, **kwargs)
-
-
-def get_service(request: Request, db=Depends(get_mongo_db)) -> InstitutionService:
-  return InstitutionService(db, request.app.state.audit_logger)
-
-
-def get_student_service(request: Request, db=Depends(get_mongo_db)) -> StudentService:
-  return StudentService(db, request.app.state.audit_logger)
-
-
-def svc_dep() -> Neo4jGraphService:
-  return get_neo4j_service()
+def get_service(request: Request) -> InstitutionService:
+  return get_app_service(request, "institutions")
 
 
 @router.post("", response_model=InstitutionOut, status_code=status.HTTP_201_CREATED)
 async def create_institution(
-  request: Request,
   payload: InstitutionCreate,
   audit: AuditContext = Depends(get_audit_context),
   svc: InstitutionService = Depends(get_service),
-  neo: Neo4jGraphService = Depends(get_neo4j_service),
 ):
-  # 1) Mongo create (audit mongo lo hace el service)
-  mongo_response = await svc.create(payload.model_dump(), audit=audit)
+  # Mongo create (audit lo hace el service); el nodo en Neo4j lo crea el outbox
+  return await svc.create(payload.model_dump(), audit=audit)
 
-  institution_id = None
-  if isinstance(mongo_response, dict):
-    institution_id = mongo_response.get("id") or mongo_response.get("_id")
 
-  if not institution_id:
-    raise HTTPException(status_code=500, detail="Institution created in Mongo but id not found in response")
-
-  # 2) Neo4j upsert + audit cassandra
-  audit_logger = request.app.state.audit_logger
+@router.post("/bulk", response_model=BulkCreateOut, status_code=status.HTTP_201_CREATED)
+async def create_institutions_bulk(
+  payload: InstitutionBulkCreate,
+  audit: AuditContext = Depends(get_audit_context),
+  svc: InstitutionService = Depends(get_service),
+):
+  return await svc.create_many([it.model_dump() for it in payload.items], audit=audit)
 
-  async def _do():
-    return await _neo(neo.upsert_institution, str(institution_id))
-
-  await audited(
-    audit_logger=audit_logger,
-    audit=audit,
-    operation="UPSERT",
-    db="neo4j",
-    entity_type="Institution",
-    entity_id=str(institution_id),
-    payload_summary="institution upsert in neo4j",
-    fn=_do,
-  )
 
-  return mongo_response
+@router.get("/suggest", response_model=list[InstitutionSuggestOut])
+async def suggest_institutions(
+  q: str = Query(..., min_length=1, max_length=100, description="Prefijo del nombre (case/accent-insensitive)"),
+  country: str | None = Query(default=None),
+  limit: int = Query(default=10, ge=1, le=20),
+  svc: InstitutionService = Depends(get_service),
+):
+  return await svc.suggest(q, country, limit)
 
 
 @router.get("/{institution_id}", response_model=InstitutionOut)
@@ -82,37 +75,45 @@ async def get_institution(
 @router.get("/{institutionMongoId}/subjects", response_model=list[SubjectOut])
 async def get_subjects_by_institution(
   institutionMongoId: str,
-  svc: Neo4jGraphService = Depends(svc_dep),
+  svc: Neo4jGraphService = Depends(get_neo4j_service),
 ):
   try:
-    return await _neo(svc.get_subjects_by_institution, institutionMongoId)
+    return await svc.get_subjects_by_institution(institutionMongoId)
   except Exception as e:
     raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("", response_model=list[InstitutionOut])
 async def list_institutions(
-  name: str | None = Query(default=None, description="LIKE '%name%' (case-insensitive)"),
+  response: Response,
+  name: str | None = Query(default=None, description="LIKE '%name%' (case/accent-insensitive)"),
   country: str | None = Query(default=None),
-  address: str | None = Query(default=None, description="requires country; LIKE '%address%' (case-insensitive)"),
+  address: str | None = Query(default=None, description="requires country; LIKE '%address%' (case/accent-insensitive)"),
   limit: int = Query(default=50, ge=1, le=200),
   skip: int = Query(default=0, ge=0),
+  cursor: str | None = Query(default=None, description=f"opaque cursor from the {NEXT_CURSOR_HEADER} header"),
   svc: InstitutionService = Depends(get_service),
 ):
-  return await svc.list(name, country, address, limit, skip)
+  items = await svc.list(name, country, address, limit, skip, cursor)
+  nxt = next_cursor(items, limit) if not (name or address) else None
+  if nxt:
+    response.headers[NEXT_CURSOR_HEADER] = nxt
+  return items
 
 
 @router.get("/by-student/{student_id}", response_model=list[StudentInstitutionOut])
 async def list_institutions_for_student(
   student_id: str,
-  svc: InstitutionService = Depends(get_service),
+  loaders: Loaders = Depends(get_loaders),
   neo: Neo4jGraphService = Depends(get_neo4j_service),
 ):
-  institution_rows = await _neo(neo.get_student_institutions, student_id)
+  institution_rows = await neo.get_student_institutions(student_id)
+
+  # un solo $in para todas las instituciones del alumno
+  insts = await loaders.institutions.load_many([row.get("institutionId") for row in institution_rows])
 
   results: list[StudentInstitutionOut] = []
-  for row in institution_rows:
-    inst = await svc.get(row.get("institutionId"))
+  for row, inst in zip(institution_rows, insts):
     if inst is not None:
       institution = InstitutionOut.model_validate(inst)
       results.append(
@@ -128,15 +129,49 @@ async def list_institutions_for_student(
 
 @router.get("/{institution_id}/students", response_model=list[StudentOut])
 async def list_students_for_institution(
+  response: Response,
   institution_id: str,
-  student_svc: StudentService = Depends(get_student_service),
+  dateFrom: date | None = Query(default=None, description="enrollment active on/after this date"),
+  dateTo: date | None = Query(default=None, description="enrollment active on/before this date"),
+  limit: int = Query(default=50, ge=1, le=500),
+  cursor: str | None = Query(default=None, description=f"opaque cursor from the {NEXT_CURSOR_HEADER} header"),
+  loaders: Loaders = Depends(get_loaders),
   neo: Neo4jGraphService = Depends(get_neo4j_service),
 ):
-  student_ids: list[str] = await _neo(neo.get_students_by_institution, institution_id)
+  if dateFrom and dateTo:
+    try:
+      ensure_date_range(dateFrom, dateTo)
+    except ValueError as e:
+      raise HTTPException(status_code=400, detail=str(e))
+
+  after = None
+  if cursor:
+    try:
+      after = decode_key_cursor(cursor)
+    except ValueError as e:
+      raise HTTPException(status_code=400, detail=str(e))
+
+  date_from = dateFrom.isoformat() if dateFrom else None
+  date_to = dateTo.isoformat() if dateTo else None
+
+  # página (keyset sobre mongoId) y total en paralelo; Mongo hidrata solo la página
+  student_ids, total = await asyncio.gather(
+    neo.get_students_by_institution(institution_id, after, limit, date_from, date_to),
+    neo.count_students_by_institution(institution_id, date_from, date_to),
+  )
 
-  out: list[StudentOut] = []
   for sid in student_ids:
-    out.append(await student_svc.get(sid))
+    if not ObjectId.is_valid(sid):
+      raise HTTPException(status_code=400, detail="Invalid id")
+
+  # el grafo va detrás de Mongo (outbox): un alumno ya borrado puede seguir un rato en Neo4j; se omite
+  # (el cursor sigue sobre student_ids para no saltear la página siguiente)
+  docs = await loaders.students.load_many(student_ids)
+  out = [doc for doc in docs if doc is not None]
+
+  response.headers[TOTAL_COUNT_HEADER] = str(total - (len(docs) - len(out)))
+  if len(student_ids) == limit:
+    response.headers[NEXT_CURSOR_HEADER] = encode_key_cursor(student_ids[-1])
 
   return out
 
@@ -152,7 +187,7 @@ async def create_subject_for_institution(
   audit_logger = request.app.state.audit_logger
 
   async def _do():
-    return await _neo(neo.upsert_subject, name, institution_id)
+    return await neo.upsert_subject(name, institution_id)
 
   try:
     subject = await audited(
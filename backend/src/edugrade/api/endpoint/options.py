@@ -1,11 +1,11 @@
-from fastapi import APIRouter, Depends, Query
-from edugrade.core.db import get_mongo_db
+from fastapi import APIRouter, Depends, Query, Request
+from edugrade.core.services import get_app_service
 from edugrade.services.mongo.options import OptionsService
 
 router = APIRouter(prefix="/options", tags=["options"])
 
-def get_service(db=Depends(get_mongo_db)) -> OptionsService:
-  return OptionsService(db)
+def get_service(request: Request) -> OptionsService:
+  return get_app_service(request, "options")
 
 @router.get("/{key}")
 async def get_option(
@@ -1,60 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+import json
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status, Request
+from fastapi.responses import StreamingResponse
 from edugrade.audit.context import AuditContext, get_audit_context
 from edugrade.audit.exec import audited
 from edugrade.core.db import get_mongo_db
-from edugrade.schemas.mongo.student import StudentCreate, StudentOut
+from edugrade.core.loader import Loaders, get_loaders
+from edugrade.core.services import get_app_service
+from edugrade.schemas.mongo.bulk import BulkCreateOut
+from edugrade.schemas.mongo.student import StudentBulkCreate, StudentCreate, StudentHistoryBatchIn, StudentOut
+from edugrade.schemas.neo4j.transfer import TransferOut
 from edugrade.services.mongo.student import StudentService
 from edugrade.services.neo4j_graph import Neo4jGraphService, get_neo4j_service
+from edugrade.services.history_cache import etag_matches
+from edugrade.services.outbox import OutboxDispatcher, get_outbox
 from edugrade.services.student_history import StudentHistoryService
-import asyncio
+from edugrade.services.transfer import TransferService
+from edugrade.utils.cursor import NEXT_CURSOR_HEADER, next_cursor
+from edugrade.utils.date import ensure_date
 
 router = APIRouter(prefix="/students", tags=["students"])
 
 
-async def _neo(callable_, *args, **kwargs):
-  return await asyncio.to_thread(callable_, *args, **kwargs)
-
-
-def get_service(request: Request, db=Depends(get_mongo_db)) -> StudentService:
-  return StudentService(db, request.app.state.audit_logger)
+def get_service(request: Request) -> StudentService:
+  return get_app_service(request, "students")
 
 
 @router.post("", response_model=StudentOut, status_code=status.HTTP_201_CREATED)
 async def create_student(
-  request: Request,
   payload: StudentCreate,
+  institution_id: str | None = Query(default=None, description="optional: enroll (STUDIES_AT) in the same graph batch"),
+  start: str | None = Query(default=None, description="required with institution_id"),
+  end: str | None = Query(default=None),
   audit: AuditContext = Depends(get_audit_context),
   svc: StudentService = Depends(get_service),
-  neo: Neo4jGraphService = Depends(get_neo4j_service),
+  loaders: Loaders = Depends(get_loaders),
 ):
-  # 1) Mongo create (audit mongo lo hace el service)
-  mongo_response = await svc.create(payload.model_dump(), audit=audit)
-
-  student_id = None
-  if isinstance(mongo_response, dict):
-    student_id = mongo_response.get("id") or mongo_response.get("_id")
-
-  if not student_id:
-    raise HTTPException(status_code=500, detail="Student created in Mongo but id not found in response")
-
-  # 2) Neo4j upsert + audit cassandra
-  audit_logger = request.app.state.audit_logger
-
-  async def _do():
-    return await _neo(neo.upsert_student, str(student_id))
-
-  await audited(
-    audit_logger=audit_logger,
-    audit=audit,
-    operation="UPSERT",
-    db="neo4j",
-    entity_type="Student",
-    entity_id=str(student_id),
-    payload_summary="student upsert in neo4j",
-    fn=_do,
-  )
-
-  return mongo_response
+  # el request solo paga la escritura en Mongo; el nodo y STUDIES_AT los crea el outbox
+  enroll = None
+  if institution_id:
+    if not start:
+      raise HTTPException(status_code=400, detail="start is required when institution_id is provided")
+    try:
+      ensure_date(start, "start")
+      if end is not None:
+        ensure_date(end, "end")
+    except ValueError as e:
+      raise HTTPException(status_code=400, detail=str(e))
+    if await loaders.institutions.load(institution_id) is None:
+      raise HTTPException(status_code=404, detail="Institution not found")
+    enroll = {"institution_id": institution_id, "start": start, "end": end}
+
+  return await svc.create(payload.model_dump(), audit=audit, enroll=enroll)
+
+
+@router.post("/bulk", response_model=BulkCreateOut, status_code=status.HTTP_201_CREATED)
+async def create_students_bulk(
+  payload: StudentBulkCreate,
+  audit: AuditContext = Depends(get_audit_context),
+  svc: StudentService = Depends(get_service),
+):
+  # insert_many en Mongo (duplicados/errores por item); los nodos los crea el outbox en un UNWIND
+  return await svc.create_many([it.model_dump() for it in payload.items], audit=audit)
 
 
 @router.post("/{student_id}/institution", status_code=status.HTTP_204_NO_CONTENT)
@@ -66,22 +73,29 @@ async def link_student_institution(
   end: str = Query(default=None),
   audit: AuditContext = Depends(get_audit_context),
   neo: Neo4jGraphService = Depends(get_neo4j_service),
+  outbox: OutboxDispatcher | None = Depends(get_outbox),
 ):
   audit_logger = request.app.state.audit_logger
+  # MATCH de ambos nodos: primero aplicar lo que el outbox tenga pendiente de ellos
+  if outbox is not None:
+    await outbox.flush_for([student_id, institution_id])
 
   async def _do():
-    return await _neo(neo.link_studies_at, student_id, institution_id, start, end)
-
-  await audited(
-    audit_logger=audit_logger,
-    audit=audit,
-    operation="CREATE",
-    db="neo4j",
-    entity_type="StudiesAt",
-    entity_id=f"{student_id}->{institution_id}:{start}",
-    payload_summary=f"link studies_at; student={student_id} institution={institution_id} start={start} end={end}",
-    fn=_do,
-  )
+    return await neo.link_studies_at(student_id, institution_id, start, end)
+
+  try:
+    await audited(
+      audit_logger=audit_logger,
+      audit=audit,
+      operation="CREATE",
+      db="neo4j",
+      entity_type="StudiesAt",
+      entity_id=f"{student_id}->{institution_id}:{start}",
+      payload_summary=f"link studies_at; student={student_id} institution={institution_id} start={start} end={end}",
+      fn=_do,
+    )
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
 
   return None
 
@@ -96,22 +110,28 @@ async def link_student_subject(
   end: str = Query(default=None),
   audit: AuditContext = Depends(get_audit_context),
   neo: Neo4jGraphService = Depends(get_neo4j_service),
+  outbox: OutboxDispatcher | None = Depends(get_outbox),
 ):
   audit_logger = request.app.state.audit_logger
+  if outbox is not None:
+    await outbox.flush_for([student_id])
 
   async def _do():
-    return await _neo(neo.link_took, student_id, subject_id, start, grade, end)
-
-  await audited(
-    audit_logger=audit_logger,
-    audit=audit,
-    operation="CREATE",
-    db="neo4j",
-    entity_type="Took",
-    entity_id=f"{student_id}->{subject_id}:{start}",
-    payload_summary=f"link took; student={student_id} subject={subject_id} start={start} grade={grade} end={end}",
-    fn=_do,
-  )
+    return await neo.link_took(student_id, subject_id, start, grade, end)
+
+  try:
+    await audited(
+      audit_logger=audit_logger,
+      audit=audit,
+      operation="CREATE",
+      db="neo4j",
+      entity_type="Took",
+      entity_id=f"{student_id}->{subject_id}:{start}",
+      payload_summary=f"link took; student={student_id} subject={subject_id} start={start} grade={grade} end={end}",
+      fn=_do,
+    )
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
 
   return None
 
@@ -126,58 +146,82 @@ async def get_student(
 
 @router.get("", response_model=list[StudentOut])
 async def list_students(
+  response: Response,
   firstName: str | None = Query(default=None),
-  lastName: str | None = Query(default=None, description="LIKE '%lastName%' (case-insensitive)"),
+  lastName: str | None = Query(default=None, description="LIKE '%lastName%' (case/accent-insensitive)"),
   nationality: str | None = Query(default=None),
   identity: str | None = Query(default=None, description="requires nationality"),
   limit: int = Query(default=50, ge=1, le=200),
   skip: int = Query(default=0, ge=0),
+  cursor: str | None = Query(default=None, description=f"opaque cursor from the {NEXT_CURSOR_HEADER} header"),
   svc: StudentService = Depends(get_service),
 ):
-  return await svc.list(firstName, lastName, nationality, identity, limit, skip)
+  items = await svc.list(firstName, lastName, nationality, identity, limit, skip, cursor)
+  nxt = next_cursor(items, limit) if not (firstName or lastName) else None
+  if nxt:
+    response.headers[NEXT_CURSOR_HEADER] = nxt
+  return items
 
 
 @router.delete("/{student_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_student(
-  request: Request,
   student_id: str,
   audit: AuditContext = Depends(get_audit_context),
   svc: StudentService = Depends(get_service),
-  neo: Neo4jGraphService = Depends(get_neo4j_service),
 ):
-  # 1) Mongo delete (audit mongo lo hace el service)
+  # Mongo delete (audit lo hace el service); el DETACH DELETE en Neo4j lo aplica el outbox
   await svc.delete(student_id, audit=audit)
-
-  # 2) Neo4j delete + audit cassandra
-  audit_logger = request.app.state.audit_logger
-
-  async def _do():
-    return await _neo(neo.delete_student, student_id)
-
-  await audited(
-    audit_logger=audit_logger,
-    audit=audit,
-    operation="DELETE",
-    db="neo4j",
-    entity_type="Student",
-    entity_id=student_id,
-    payload_summary="student delete in neo4j",
-    fn=_do,
-  )
-
   return None
 
 
 def get_history_service(
   db=Depends(get_mongo_db),
   neo: Neo4jGraphService = Depends(get_neo4j_service),
+  loaders: Loaders = Depends(get_loaders),
 ):
-  return StudentHistoryService(db, neo)
+  return StudentHistoryService(db, neo, loaders, neo.history_cache)
+
+
+@router.post("/history/batch")
+async def get_students_history_batch(
+  payload: StudentHistoryBatchIn,
+  history_svc: StudentHistoryService = Depends(get_history_service),
+):
+  # NDJSON: una línea {"studentId", "years"} (o {"studentId", "error"}) por alumno, a medida que salen
+  async def _lines():
+    async for item in history_svc.iter_histories(payload.studentIds):
+      yield json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+  return StreamingResponse(_lines(), media_type="application/x-ndjson")
 
 
 @router.get("/{student_id}/history")
 async def get_student_history(
   student_id: str,
+  if_none_match: str | None = Header(default=None),
   history_svc: StudentHistoryService = Depends(get_history_service),
 ):
-  return await history_svc.get_history(student_id)
\ No newline at end of file
+  etag, body = await history_svc.get_history_json(student_id)
+  headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+  if if_none_match and etag_matches(if_none_match, etag):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+  return Response(content=body, media_type="application/json", headers=headers)
+
+
+def get_transfer_service(
+  db=Depends(get_mongo_db),
+  neo: Neo4jGraphService = Depends(get_neo4j_service),
+  loaders: Loaders = Depends(get_loaders),
+):
+  return TransferService(db, neo, loaders)
+
+
+@router.get("/{student_id}/transfer", response_model=TransferOut)
+async def evaluate_transfer(
+  student_id: str,
+  targetInstitution: str = Query(..., description="target institution ObjectId hex"),
+  levelStage: str = Query(...),
+  targetSystem: str | None = Query(default=None, description="project average grades to this system (default ZA)"),
+  svc: TransferService = Depends(get_transfer_service),
+):
+  return await svc.evaluate(student_id, targetInstitution, levelStage, targetSystem)
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from edugrade.core.loader import Loaders, get_loaders
+from edugrade.schemas.neo4j.subject import SubjectSearchOut
+from edugrade.services.neo4j_graph import Neo4jGraphService, get_neo4j_service
+from edugrade.utils.object_id import is_objectid_hex
+
+router = APIRouter(prefix="/subjects", tags=["subjects"])
+
+
+@router.get("/search", response_model=list[SubjectSearchOut])
+async def search_subjects(
+  q: str = Query(..., min_length=1, max_length=100, description="words of the subject name; each one exact or as prefix (case/accent-insensitive)"),
+  institutionId: str | None = Query(default=None, description="optional: only subjects of this institution"),
+  limit: int = Query(default=20, ge=1, le=100),
+  skip: int = Query(default=0, ge=0, le=1000),
+  neo: Neo4jGraphService = Depends(get_neo4j_service),
+  loaders: Loaders = Depends(get_loaders),
+):
+  if institutionId is not None and not is_objectid_hex(institutionId):
+    raise HTTPException(status_code=400, detail="Invalid institutionId")
+
+  # orden por relevancia (score) desc; paginado con skip como las demás búsquedas por texto
+  hits = await neo.search_subjects(q, institutionId, skip, limit)
+
+  # nombres de institución en un solo query a Mongo (BatchLoader)
+  institutions = await loaders.institutions.load_many([h["institutionMongoId"] for h in hits])
+  return [
+    {**h, "institutionName": inst.get("name") if inst else None}
+    for h, inst in zip(hits, institutions)
+  ]
@@ -1,17 +1,23 @@
 from fastapi import APIRouter
 from edugrade.api.endpoint.students import router as students_router
 from edugrade.api.endpoint.institutions import router as institutions_router
+from edugrade.api.endpoint.subjects import router as subjects_router
 from edugrade.api.endpoint.equivalences import router as equivalences_router
 from edugrade.api.endpoint.grades import router as grades_router
 from edugrade.api.endpoint.options import router as options_router
 from edugrade.api.endpoint.dashboard import router as dashboard_router
+from edugrade.api.endpoint.analytics import router as analytics_router
+from edugrade.api.endpoint.conversion_rules import router as conversion_rules_router
 from edugrade.audit.routes import router as audit_router
 
 router = APIRouter(prefix="/api")
 router.include_router(students_router)
 router.include_router(institutions_router)
+router.include_router(subjects_router)
 router.include_router(grades_router)
 router.include_router(equivalences_router)
 router.include_router(audit_router)
 router.include_router(options_router)
-router.include_router(dashboard_router)
\ No newline at end of file
+router.include_router(dashboard_router)
+router.include_router(analytics_router)
+router.include_router(conversion_rules_router)
\ No newline at end of file
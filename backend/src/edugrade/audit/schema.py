@@ -1,5 +1,9 @@
+from cassandra import InvalidRequest
 from cassandra.cluster import Session
 
+# subir al cambiar DDL: el arranque solo corre el DDL si la versión guardada difiere
+AUDIT_SCHEMA_VERSION = 1
+
 DDL = [
     # Keyspace
     """
@@ -69,11 +73,39 @@ DDL = [
       PRIMARY KEY ((request_id), ts, event_id)
     ) WITH CLUSTERING ORDER BY (ts DESC);
     """,
+
+    # Versión de schema aplicada
+    """
+    CREATE TABLE IF NOT EXISTS {ks}.schema_version (
+      component        text PRIMARY KEY,
+      version          int
+    );
+    """,
 ]
 
-def ensure_audit_schema(session: Session, keyspace: str) -> None:
-    for stmt in DDL:
-        session.execute(stmt.format(ks=keyspace))
+def get_audit_schema_version(session: Session, keyspace: str) -> int | None:
+    try:
+        row = session.execute(
+            f"SELECT version FROM {keyspace}.schema_version WHERE component = 'audit'"
+        ).one()
+    except InvalidRequest:
+        # keyspace o tabla todavía no existen
+        return None
+    return row.version if row else None
+
+
+def ensure_audit_schema(session: Session, keyspace: str, force: bool = False) -> bool:
+    # DDL (y su espera de schema agreement) solo si la versión guardada difiere
+    applied = False
+    if force or get_audit_schema_version(session, keyspace) != AUDIT_SCHEMA_VERSION:
+        for stmt in DDL:
+            session.execute(stmt.format(ks=keyspace))
+        session.execute(
+            f"INSERT INTO {keyspace}.schema_version (component, version) VALUES ('audit', %s)",
+            (AUDIT_SCHEMA_VERSION,),
+        )
+        applied = True
 
     # Setear keyspace para queries sin prefijo
     session.set_keyspace(keyspace)
+    return applied
@@ -19,6 +19,8 @@ class Settings(BaseSettings):
     neo4j_port: int
     neo4j_user: str
     neo4j_password: str
+    # tope de reintentos de execute_read/execute_write ante errores transitorios
+    neo4j_max_transaction_retry_seconds: float = 5.0
 
     cassandra_hosts: list[str]
     cassandra_port: int
@@ -28,6 +30,45 @@ class Settings(BaseSettings):
     redis_port: int
     redis_db: int
 
+    # exams con displayValue precalculado para todos los sistemas (options.system)
+    grade_projections_enabled: bool = False
+    grade_projections_refresh_seconds: int = 60
+
+    # jobs de reconversión: lease del worker que corre cada job, renovado en cada batch
+    reconversion_lease_seconds: float = 120
+
+    # autocomplete de instituciones: prefijos cortos cacheados en Redis
+    institution_suggest_cache_ttl_seconds: int = 300
+    institution_suggest_cache_max_prefix: int = 4
+
+    # write concern por colección: {"grades": "majority", ...} (ver repository/mongo/write_concern.py)
+    mongo_write_concerns: dict[str, str] = {}
+
+    # catálogo de materias en memoria (services/subject_catalog.py)
+    subject_catalog_ttl_seconds: int = 600
+    subject_catalog_max_subjects: int = 50000
+    subject_catalog_max_institutions: int = 2000
+    subject_catalog_version_check_seconds: float = 1.0
+
+    # historial armado por alumno en Redis (services/history_cache.py); se invalida en cada escritura
+    student_history_cache_ttl_seconds: int = 86400
+
+    # links STUDIES_AT/TOOK concurrentes: se juntan hasta N o hasta esperar X ms y van en un UNWIND
+    graph_link_batch_size: int = 200
+    graph_link_batch_wait_ms: float = 5
+
+    # outbox Mongo -> Neo4j (services/outbox.py)
+    outbox_poll_seconds: float = 0.5
+    outbox_batch_size: int = 500
+    outbox_max_attempts: int = 10
+    outbox_lease_seconds: float = 30
+    outbox_backoff_seconds: float = 1
+    # cuánto espera un link (STUDIES_AT/TOOK) a que se apliquen los pendientes de sus nodos
+    outbox_flush_timeout_seconds: float = 2
+
+    # el arranque aplica índices/constraints/DDL solo si la versión guardada difiere; true = siempre
+    schema_force_apply: bool = False
+
     @property
     def mongo_uri(self) -> str:
         return (
@@ -0,0 +1,6 @@
+from typing import Any
+from fastapi import Request
+
+def get_redis(request: Request) -> Any:
+    # None si Redis no levantó: los callers cachean solo si hay cliente
+    return getattr(request.app.state, "redis", None)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from bson import ObjectId
+from fastapi import Depends, Request
+
+from edugrade.core.db import get_mongo_db
+from edugrade.repository.mongo.institution import InstitutionRepository
+from edugrade.repository.mongo.student import StudentRepository
+from edugrade.utils.object_id import is_objectid_hex
+
+BatchFn = Callable[[list], Awaitable[dict]]
+
+
+class BatchLoader:
+    """
+    Estilo DataLoader: junta los load(key) del mismo tick del event loop en una sola
+    llamada a batch_fn(keys) -> {key: doc}. Cachea por key (vive lo que vive el request)
+    y load_many respeta el orden de entrada; las keys sin doc resuelven a None.
+    """
+
+    def __init__(self, batch_fn: BatchFn, max_batch_size: int = 1000):
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._cache: dict[Hashable, asyncio.Future] = {}
+        self._queue: list[Hashable] = []
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        fut = self._cache.get(key)
+        if fut is not None:
+            return fut
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._cache[key] = fut
+        self._queue.append(key)
+        if len(self._queue) == 1:
+            # despacha cuando el caller actual cede el loop (ya encoló todo lo de este tick)
+            loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return fut
+
+    async def load_many(self, keys: list[Hashable]) -> list[Any]:
+        return list(await asyncio.gather(*(self.load(k) for k in keys)))
+
+    async def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        for i in range(0, len(keys), self._max_batch_size):
+            chunk = keys[i:i + self._max_batch_size]
+            futs = [self._cache[k] for k in chunk]
+            try:
+                found = await self._batch_fn(chunk)
+            except Exception as e:
+                # el error no queda cacheado: un load posterior reintenta
+                for k, fut in zip(chunk, futs):
+                    self._cache.pop(k, None)
+                    fut.set_exception(e)
+                continue
+
+            for k, fut in zip(chunk, futs):
+                fut.set_result(found.get(k))
+
+
+class Loaders:
+    # loaders de un request; se crean a demanda
+    def __init__(self, db):
+        self._db = db
+        self._students: BatchLoader | None = None
+        self._institutions: BatchLoader | None = None
+
+    @property
+    def students(self) -> BatchLoader:
+        if self._students is None:
+            repo = StudentRepository(self._db)
+
+            async def _batch(ids: list[str]) -> dict:
+                oids = [ObjectId(i) for i in ids if i and is_objectid_hex(i)]
+                return {str(d["_id"]): d for d in await repo.get_many_by_ids(oids)}
+
+            self._students = BatchLoader(_batch)
+        return self._students
+
+    @property
+    def institutions(self) -> BatchLoader:
+        if self._institutions is None:
+            repo = InstitutionRepository(self._db)
+            self._institutions = BatchLoader(repo.get_many)
+        return self._institutions
+
+
+def get_loaders(request: Request, db=Depends(get_mongo_db)) -> Loaders:
+    loaders = getattr(request.state, "loaders", None)
+    if loaders is None:
+        loaders = Loaders(db)
+        request.state.loaders = loaders
+    return loaders
@@ -0,0 +1,59 @@
+''' services construidos una sola vez en lifespan; las dependencias de los endpoints los leen de app.state '''
+
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from fastapi import HTTPException, Request
+
+from edugrade.services.mongo.dashboard import DashboardService
+from edugrade.services.mongo.grade import GradeService
+from edugrade.services.mongo.grade_projection import GradeProjectionService
+from edugrade.services.mongo.institution import InstitutionService
+from edugrade.services.mongo.options import OptionsService
+from edugrade.services.mongo.reconversion import ReconversionService
+from edugrade.services.mongo.simulation import ConversionSimulationService
+from edugrade.services.mongo.student import StudentService
+from edugrade.services.neo4j_graph import Neo4jGraphService
+from edugrade.services.outbox import OutboxDispatcher
+
+
+@dataclass
+class AppServices:
+    # None = el store del que depende no levantó en el arranque
+    students: Optional[StudentService] = None
+    institutions: Optional[InstitutionService] = None
+    grades: Optional[GradeService] = None
+    grade_projections: Optional[GradeProjectionService] = None
+    options: Optional[OptionsService] = None
+    reconversion: Optional[ReconversionService] = None
+    simulation: Optional[ConversionSimulationService] = None
+    dashboard: Optional[DashboardService] = None
+    neo4j: Optional[Neo4jGraphService] = None
+    outbox: Optional[OutboxDispatcher] = None
+
+
+def build_services(mongo_db: Any, neo4j_driver: Any, audit_logger: Any, redis: Any) -> AppServices:
+    services = AppServices()
+    if neo4j_driver is not None:
+        services.neo4j = Neo4jGraphService(neo4j_driver, redis)
+
+    if mongo_db is not None:
+        services.students = StudentService(mongo_db, audit_logger)
+        services.institutions = InstitutionService(mongo_db, audit_logger, redis)
+        services.grades = GradeService(mongo_db, audit_logger)
+        services.grade_projections = GradeProjectionService(mongo_db)
+        services.options = OptionsService(mongo_db)
+        services.reconversion = ReconversionService(mongo_db, audit_logger)
+        services.simulation = ConversionSimulationService(mongo_db)
+        if services.neo4j is not None:
+            services.dashboard = DashboardService(mongo_db, audit_logger, services.neo4j)
+            services.outbox = OutboxDispatcher(mongo_db, services.neo4j, audit_logger)
+
+    return services
+
+
+def get_app_service(request: Request, name: str) -> Any:
+    service = getattr(getattr(request.app.state, "services", None), name, None)
+    if service is None:
+        raise HTTPException(status_code=503, detail=f"Service '{name}' unavailable")
+    return service
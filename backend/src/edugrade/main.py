@@ -4,6 +4,7 @@ from edugrade.startup import lifespan
 from edugrade.api.router import router as api_router
 from edugrade.audit.routes import router as audit_router
 from edugrade.audit.middleware import request_context_middleware
+from edugrade.core.services import get_app_service
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(
@@ -23,6 +24,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
 app.include_router(api_router)
@@ -44,8 +46,9 @@ async def health(request: Request):
 
     # Neo4j
     try:
-        with request.app.state.neo4j_driver.session() as session:
-            session.run("RETURN 1").single()
+        async with request.app.state.neo4j_driver.session() as session:
+            result = await session.run("RETURN 1")
+            await result.single()
         results["neo4j"] = "ok"
     except Exception as e:
         results["neo4j"] = {"type": type(e).__name__, "message": str(e), "repr": repr(e)}
@@ -78,4 +81,10 @@ async def health(request: Request):
     if status == "ok":
         payload["app"] = settings.app_name
 
-    return payload
\ No newline at end of file
+    return payload
+
+@app.get("/health/outbox")
+async def health_outbox(request: Request):
+    # pendientes / fallidas del outbox Mongo -> Neo4j y antigüedad de la más vieja (lag)
+    outbox = get_app_service(request, "outbox")
+    return await outbox.stats()
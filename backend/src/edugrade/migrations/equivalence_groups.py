@@ -0,0 +1,58 @@
+''' migración única: ciclos EQUIVALENT_TO -> EquivalenceGroup + MEMBER_OF
+
+Idempotente: sin aristas EQUIVALENT_TO no hace nada. Corre en el arranque (lifespan)
+y también a mano:
+
+    python -m edugrade.migrations.equivalence_groups
+'''
+
+import asyncio
+from collections import defaultdict
+
+from neo4j import AsyncDriver, AsyncGraphDatabase
+
+from edugrade.config import settings
+from edugrade.repository.neo4j_graph import Neo4jGraphRepository
+from edugrade.services.equivalence_groups import apply_equivalence_pairs
+
+
+async def migrate_equivalence_cycles(driver: AsyncDriver) -> dict[str, int]:
+    repo = Neo4jGraphRepository(driver)
+    rows = await repo.list_legacy_equivalence_pairs()
+    if not rows:
+        return {}
+
+    pairs_by_stage: dict[str, list[tuple[str, str]]] = defaultdict(list)
+    for r in rows:
+        pairs_by_stage[r["levelStage"]].append((r["a"], r["b"]))
+
+    migrated: dict[str, int] = {}
+    for level_stage, pairs in pairs_by_stage.items():
+        # una transacción por levelStage: grupos creados y aristas viejas borradas juntas
+        async def _work(tx_repo: Neo4jGraphRepository, level_stage=level_stage, pairs=pairs) -> int:
+            subject_ids = sorted({sid for pair in pairs for sid in pair})
+            memberships = await tx_repo.get_group_memberships(level_stage, subject_ids)
+            plan = await apply_equivalence_pairs(tx_repo, level_stage, pairs, memberships)
+            await tx_repo.delete_legacy_equivalences(level_stage)
+            return len(plan.group_of)
+
+        migrated[level_stage] = await repo.write_unit(_work)
+
+    return migrated
+
+
+async def main() -> None:
+    driver = AsyncGraphDatabase.driver(settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password))
+    try:
+        await Neo4jGraphRepository(driver).ensure_constraints()
+        migrated = await migrate_equivalence_cycles(driver)
+        for level_stage, subjects in sorted(migrated.items()):
+            print(f"[migration] levelStage={level_stage}: {subjects} subjects grouped")
+        if not migrated:
+            print("[migration] no EQUIVALENT_TO edges left; nothing to do")
+    finally:
+        await driver.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+''' migración: startDate/endDate de STUDIES_AT y TOOK de string ISO -> date nativo de Neo4j
+
+Idempotente: solo toca relaciones que todavía guardan strings. Convierte en lotes
+(CALL ... IN TRANSACTIONS) para no armar una transacción gigante. Corre en el arranque
+(lifespan) y también a mano:
+
+    python -m edugrade.migrations.native_dates
+'''
+
+import asyncio
+
+from neo4j import AsyncDriver, AsyncGraphDatabase
+
+from edugrade.config import settings
+from edugrade.models.neo4j import REL_STUDIES_AT, REL_TOOK
+from edugrade.repository.neo4j_graph import Neo4jGraphRepository
+
+
+async def migrate_native_dates(driver: AsyncDriver, batch_size: int = 10000) -> dict[str, int]:
+    repo = Neo4jGraphRepository(driver)
+    migrated: dict[str, int] = {}
+    for rel in (REL_STUDIES_AT, REL_TOOK):
+        pending = await repo.count_string_dates(rel)
+        if not pending:
+            continue
+        await repo.convert_string_dates(rel, batchSize=batch_size)
+        migrated[rel] = pending
+    return migrated
+
+
+async def main() -> None:
+    driver = AsyncGraphDatabase.driver(settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password))
+    try:
+        await Neo4jGraphRepository(driver).ensure_constraints()
+        migrated = await migrate_native_dates(driver)
+        for rel, count in sorted(migrated.items()):
+            print(f"[migration] {rel}: {count} relationships converted to native dates")
+        if not migrated:
+            print("[migration] no string dates left; nothing to do")
+    finally:
+        await driver.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
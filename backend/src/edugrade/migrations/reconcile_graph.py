@@ -0,0 +1,116 @@
+''' reconciliación Mongo -> Neo4j: repara lo que el outbox no llegó a aplicar
+
+Recorre los _id de Mongo y los mongoId del grafo, ambos ordenados, en un solo merge-join
+(memoria = solo las diferencias). Alumnos/instituciones que faltan en el grafo se crean;
+alumnos que sobran (borrados en Mongo) se eliminan. Las instituciones que sobran solo se
+informan: Mongo no tiene bajas de instituciones, así que indican un problema a mirar a mano.
+Los STUDIES_AT de un alumno que nunca llegó al grafo no se pueden reconstruir (viven solo en Neo4j).
+
+    python -m edugrade.migrations.reconcile_graph            # dry-run: solo informa
+    python -m edugrade.migrations.reconcile_graph --apply
+'''
+
+import argparse
+import asyncio
+from typing import AsyncIterator
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from neo4j import AsyncDriver, AsyncGraphDatabase
+
+from edugrade.config import settings
+from edugrade.models.neo4j import LABEL_INSTITUTION, LABEL_STUDENT
+from edugrade.repository.mongo.institution import InstitutionRepository
+from edugrade.repository.mongo.student import StudentRepository
+from edugrade.repository.neo4j_graph import Neo4jGraphRepository
+
+
+async def _graph_ids(repo: Neo4jGraphRepository, label: str, batch_size: int) -> AsyncIterator[str]:
+    after = None
+    while True:
+        ids = await repo.list_mongo_ids(label, after, batch_size)
+        for mongo_id in ids:
+            yield mongo_id
+        if len(ids) < batch_size:
+            return
+        after = ids[-1]
+
+
+async def _diff_sorted(mongo_ids: AsyncIterator[str], graph_ids: AsyncIterator[str]) -> tuple[list[str], list[str]]:
+    # (faltan en el grafo, sobran en el grafo); ObjectId hex tiene largo fijo: orden de string = orden de _id
+    missing: list[str] = []
+    extra: list[str] = []
+    m = await anext(mongo_ids, None)
+    g = await anext(graph_ids, None)
+    while m is not None or g is not None:
+        if g is None or (m is not None and m < g):
+            missing.append(m)
+            m = await anext(mongo_ids, None)
+        elif m is None or g < m:
+            extra.append(g)
+            g = await anext(graph_ids, None)
+        else:
+            m = await anext(mongo_ids, None)
+            g = await anext(graph_ids, None)
+    return missing, extra
+
+
+def _chunks(items: list[str], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def reconcile_graph(mongo_db, driver: AsyncDriver, apply: bool = False, batch_size: int = 5000) -> dict:
+    repo = Neo4jGraphRepository(driver)
+
+    students_missing, students_extra = await _diff_sorted(
+        StudentRepository(mongo_db).iter_ids(batch_size),
+        _graph_ids(repo, LABEL_STUDENT, batch_size),
+    )
+    institutions_missing, institutions_extra = await _diff_sorted(
+        InstitutionRepository(mongo_db).iter_ids(batch_size),
+        _graph_ids(repo, LABEL_INSTITUTION, batch_size),
+    )
+
+    if apply:
+        for chunk in _chunks(institutions_missing, batch_size):
+            await repo.upsert_institutions(chunk)
+        for chunk in _chunks(students_missing, batch_size):
+            await repo.upsert_students(chunk)
+        for chunk in _chunks(students_extra, batch_size):
+            # sus inscripciones salen de TRANSFER_FLOW junto con el nodo
+            async def _delete(tx_repo: Neo4jGraphRepository, chunk=chunk) -> None:
+                await tx_repo.apply_transfer_flows(chunk, -1)
+                await tx_repo.delete_students(chunk)
+
+            await repo.write_unit(_delete)
+
+    return {
+        "studentsMissing": students_missing,
+        "studentsExtra": students_extra,
+        "institutionsMissing": institutions_missing,
+        "institutionsExtra": institutions_extra,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconcile Neo4j Student/Institution nodes against Mongo")
+    parser.add_argument("--apply", action="store_true", help="write the fixes (default: dry-run)")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.mongo_uri)
+    driver = AsyncGraphDatabase.driver(settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password))
+    try:
+        report = await reconcile_graph(client[settings.mongo_db], driver, apply=args.apply)
+        verb = "fixed" if args.apply else "would fix"
+        print(f"[reconcile] students: {len(report['studentsMissing'])} missing, {len(report['studentsExtra'])} extra ({verb})")
+        print(f"[reconcile] institutions: {len(report['institutionsMissing'])} missing ({verb}), "
+              f"{len(report['institutionsExtra'])} extra (not in Mongo; review manually)")
+        for mongo_id in report["institutionsExtra"][:20]:
+            print(f"[reconcile]   extra institution {mongo_id}")
+    finally:
+        await driver.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+''' TRANSFER_FLOW (Institution -> Institution {year, count}) armado desde cero a partir de STUDIES_AT
+
+En operación normal se mantiene incremental (Neo4jGraphService, en la misma transacción que cada
+STUDIES_AT). Esto es para la primera carga y para reconstruirlo si se sospecha drift; en el arranque
+solo corre si todavía no hay ninguna arista. A mano (mejor sin escrituras de STUDIES_AT en curso):
+
+    python -m edugrade.migrations.transfer_flows
+'''
+
+import asyncio
+
+from neo4j import AsyncDriver, AsyncGraphDatabase
+
+from edugrade.config import settings
+from edugrade.repository.neo4j_graph import Neo4jGraphRepository
+
+
+async def migrate_transfer_flows(driver: AsyncDriver, batch_size: int = 5000) -> bool:
+    repo = Neo4jGraphRepository(driver)
+    if await repo.count_transfer_flows():
+        return False
+    await repo.rebuild_transfer_flows(batchSize=batch_size)
+    return True
+
+
+async def main() -> None:
+    driver = AsyncGraphDatabase.driver(settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password))
+    try:
+        repo = Neo4jGraphRepository(driver)
+        await repo.ensure_constraints()
+        await repo.rebuild_transfer_flows()
+        print(f"[migration] transfer flows rebuilt: {await repo.count_transfer_flows()} (from, to, year) edges")
+    finally:
+        await driver.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,8 +2,12 @@
 LABEL_STUDENT = "Student"
 LABEL_INSTITUTION = "Institution"
 LABEL_SUBJECT = "Subject"
+LABEL_EQUIVALENCE_GROUP = "EquivalenceGroup"
+LABEL_SCHEMA_VERSION = "SchemaVersion"
 
 # Relationship types
 REL_STUDIES_AT = "STUDIES_AT"
 REL_TOOK = "TOOK"
-REL_EQUIVALENT_TO = "EQUIVALENT_TO"
+REL_EQUIVALENT_TO = "EQUIVALENT_TO"  # legado: reemplazado por MEMBER_OF -> EquivalenceGroup
+REL_MEMBER_OF = "MEMBER_OF"
+REL_TRANSFER_FLOW = "TRANSFER_FLOW"  # Institution -> Institution {year, count}, derivado de STUDIES_AT
@@ -0,0 +1,14 @@
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+
+async def insert_many_tolerant(col, docs: list[dict]) -> dict[int, dict]:
+  # ordered=False: un duplicado no corta el resto del batch; devuelve {index: writeError}
+  if not docs:
+    return {}
+  try:
+    await col.insert_many(docs, ordered=False)
+    return {}
+  except BulkWriteError as e:
+    return {err["index"]: err for err in e.details.get("writeErrors", [])}
@@ -3,12 +3,14 @@ from __future__ import annotations
 from datetime import date as date_type, datetime
 from typing import Any
 
+from bson import ObjectId
 from pymongo import ReturnDocument
+from edugrade.repository.mongo.write_concern import collection
 
 
 class ConversionRuleRepository:
-  def __init__(self, db):
-    self.col = db["conversionRules"]
+  def __init__(self, db, write_concern: str | None = None):
+    self.col = collection(db, "conversionRules", write_concern)
 
   async def ensure_indexes(self) -> None:
     await self.col.create_index(
@@ -22,8 +24,28 @@ class ConversionRuleRepository:
     )
 
   async def create(self, doc: dict) -> dict:
-    res = await self.col.insert_one(doc)
-    return await self.col.find_one({"_id": res.inserted_id})
+    doc = {**doc, "_id": ObjectId()}
+    await self.col.insert_one(doc)
+    return doc
+
+  async def list_by_direction(self, *, direction: str, system: str | None = None) -> list[dict]:
+    q: dict[str, Any] = {"direction": direction}
+    if system is not None:
+      q["system"] = system
+    cursor = self.col.find(q).sort("validFrom", 1)
+    return [doc async for doc in cursor]
+
+  async def list_pending_projection_refresh(self, *, now: datetime) -> list[dict]:
+    q = {
+      "direction": "FROM_ZA",
+      "validFrom": {"$lte": now},
+      "projectionsRefreshedAt": {"$exists": False},
+    }
+    cursor = self.col.find(q).sort("createdAt", 1)
+    return [doc async for doc in cursor]
+
+  async def mark_projections_refreshed(self, _id, *, at: datetime) -> None:
+    await self.col.update_one({"_id": _id}, {"$set": {"projectionsRefreshedAt": at}})
 
   async def get_current(
     self,
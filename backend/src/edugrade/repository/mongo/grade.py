@@ -1,19 +1,36 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
+from edugrade.repository.mongo.write_concern import collection
 
 class GradeRepository:
-  def __init__(self, db):
-    self.col = db["grades"]
+  def __init__(self, db, write_concern: str | None = None):
+    self.col = collection(db, "grades", write_concern)
 
   async def ensure_indexes(self) -> None:
     # consulta principal: subject+student+institution
     await self.col.create_index(
-      [("id_subject", 1), ("id_student", 1), ("id_institution", 1), ("date", 1)]
+      [("subjectId", 1), ("studentId", 1), ("institutionId", 1), ("date", 1)]
     )
 
+    # agregados por institución/materia (dashboard, simulación)
+    await self.col.create_index([("institutionId", 1), ("subjectId", 1)])
+
+    # promedios de un alumno por materia (transferencias)
+    await self.col.create_index([("studentId", 1), ("subjectId", 1)])
+
+    # re-conversión por regla: (system, country, rango de fechas) con keyset (date, _id)
+    await self.col.create_index(
+      [("system", 1), ("country", 1), ("date", 1), ("_id", 1)]
+    )
+    # ... y sin country: el sort (date, _id) no puede salir del índice de arriba (sort en memoria por batch)
+    await self.col.create_index([("system", 1), ("date", 1), ("_id", 1)])
+
   async def create(self, doc: dict) -> dict:
-    res = await self.col.insert_one(doc)
-    return await self.col.find_one({"_id": res.inserted_id})
+    # _id generado acá: el insert es el único round trip
+    doc = {**doc, "_id": ObjectId()}
+    await self.col.insert_one(doc)
+    return doc
 
   async def get_by_id(self, _id: ObjectId) -> dict | None:
     return await self.col.find_one({"_id": _id})
@@ -45,6 +62,202 @@ class GradeRepository:
     
     return [doc async for doc in cursor]
   
+  # ---------- proyecciones materializadas (displayValue por sistema) ----------
+
+  async def set_projections(self, _id: ObjectId, projections: dict[str, str], *, at: datetime) -> None:
+    update: dict = {}
+    for system, value in projections.items():
+      update[f"projections.{system}"] = value
+      update[f"projectedAt.{system}"] = at
+    if update:
+      await self.col.update_one({"_id": _id}, {"$set": update})
+
+  async def ensure_projection_index(self, system: str) -> None:
+    # list_stale_projections: recorre solo los exams viejos/sin proyectar a `system`, no toda la colección.
+    # Ni sparse ni partial: los que nunca se proyectaron (sin projectedAt.<system>) tienen que estar
+    await self.col.create_index([(f"projectedAt.{system}", 1), ("_id", 1)])
+
+  async def list_stale_projections(
+    self,
+    *,
+    system: str,
+    country: str | None,
+    grade_min: str,
+    grade_max: str,
+    date_from: datetime,
+    date_to: datetime | None,
+    stale_before: datetime,
+    after_id: ObjectId | None,
+    limit: int,
+  ) -> list[dict]:
+    q: dict = {
+      "grade": {"$gte": grade_min, "$lte": grade_max},
+      "date": {"$gte": date_from},
+      "$or": [
+        {f"projectedAt.{system}": {"$lt": stale_before}},
+        {f"projectedAt.{system}": {"$exists": False}},
+      ],
+    }
+    if date_to is not None:
+      q["date"]["$lte"] = date_to
+    if country not in (None, "ANY"):
+      q["country"] = country
+    if after_id is not None:
+      q["_id"] = {"$gt": after_id}
+
+    fields = {"system": 1, "country": 1, "grade": 1, "date": 1, "value": 1, "valueConverted": 1}
+    cursor = self.col.find(q, fields).sort("_id", 1).limit(limit)
+    return [doc async for doc in cursor]
+
+  async def bulk_set_projection(self, system: str, values: dict[ObjectId, str], *, at: datetime) -> int:
+    if not values:
+      return 0
+    ops = [
+      UpdateOne({"_id": _id}, {"$set": {f"projections.{system}": v, f"projectedAt.{system}": at}})
+      for _id, v in values.items()
+    ]
+    res = await self.col.bulk_write(ops, ordered=False)
+    return res.modified_count
+
+  # ---------- re-conversión masiva (TO_ZA) ----------
+
+  def _reconversion_query(
+    self,
+    *,
+    system: str,
+    country: str | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+  ) -> dict:
+    q: dict = {"system": system}
+    if country is not None:
+      q["country"] = country
+    if date_from is not None or date_to is not None:
+      q["date"] = {}
+      if date_from is not None:
+        q["date"]["$gte"] = date_from
+      if date_to is not None:
+        q["date"]["$lte"] = date_to
+    return q
+
+  async def count_for_reconversion(
+    self,
+    *,
+    system: str,
+    country: str | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+  ) -> int:
+    q = self._reconversion_query(system=system, country=country, date_from=date_from, date_to=date_to)
+    return await self.col.count_documents(q)
+
+  async def list_for_reconversion(
+    self,
+    *,
+    system: str,
+    country: str | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+    after: tuple[datetime, ObjectId] | None,
+    limit: int,
+  ) -> list[dict]:
+    q = self._reconversion_query(system=system, country=country, date_from=date_from, date_to=date_to)
+    if after is not None:
+      after_date, after_id = after
+      q["$or"] = [
+        {"date": {"$gt": after_date}},
+        {"date": after_date, "_id": {"$gt": after_id}},
+      ]
+
+    fields = {"system": 1, "country": 1, "grade": 1, "date": 1, "value": 1, "valueConverted": 1}
+    cursor = self.col.find(q, fields).sort([("date", 1), ("_id", 1)]).limit(limit)
+    return [doc async for doc in cursor]
+
+  async def bulk_set_value_converted(self, updates: dict[ObjectId, dict]) -> int:
+    # updates: _id -> campos a setear (valueConverted y, si aplica, projections.*)
+    if not updates:
+      return 0
+    ops = [UpdateOne({"_id": _id}, {"$set": fields}) for _id, fields in updates.items()]
+    res = await self.col.bulk_write(ops, ordered=True)
+    return res.modified_count
+
+  # ---------- simulación de reglas (solo lectura) ----------
+
+  async def iter_for_simulation(
+    self,
+    *,
+    system: str,
+    country: str | None,
+    grade_min: str,
+    grade_max: str,
+    date_from: datetime,
+    batch_size: int,
+  ):
+    q: dict = {
+      "system": system,
+      "grade": {"$gte": grade_min, "$lte": grade_max},
+      "date": {"$gte": date_from},
+    }
+    if country not in (None, "ANY"):
+      q["country"] = country
+
+    # country/grade/date: el service decide si el borrador ganaría la selección de regla
+    fields = {
+      "_id": 0, "institutionId": 1, "subjectId": 1, "country": 1, "grade": 1, "date": 1,
+      "value": 1, "valueConverted": 1,
+    }
+    cursor = self.col.find(q, fields).batch_size(batch_size)
+
+    batch: list[dict] = []
+    async for doc in cursor:
+      batch.append(doc)
+      if len(batch) >= batch_size:
+        yield batch
+        batch = []
+    if batch:
+      yield batch
+
+  async def sums_by_institution_subject(self, institution_ids: list[str]) -> list[dict]:
+    if not institution_ids:
+      return []
+
+    pipeline = [
+      {"$match": {"institutionId": {"$in": institution_ids}}},
+      {
+        "$addFields": {
+          "_valueZA": {
+            "$convert": {
+              "input": "$valueConverted",
+              "to": "double",
+              "onError": None,
+              "onNull": None,
+            }
+          }
+        }
+      },
+      {
+        "$group": {
+          "_id": {"institutionId": "$institutionId", "subjectId": "$subjectId"},
+          "examsRead": {"$sum": 1},
+          "examsUsedInAverage": {"$sum": {"$cond": [{"$ne": ["$_valueZA", None]}, 1, 0]}},
+          "sumZA": {"$sum": {"$ifNull": ["$_valueZA", 0]}},
+        }
+      },
+      {
+        "$project": {
+          "_id": 0,
+          "institutionId": "$_id.institutionId",
+          "subjectId": "$_id.subjectId",
+          "examsRead": 1,
+          "examsUsedInAverage": 1,
+          "sumZA": 1,
+        }
+      },
+    ]
+
+    cursor = self.col.aggregate(pipeline)
+    return [doc async for doc in cursor]
+
   async def delete(self, _id: ObjectId) -> bool:
     res = await self.col.delete_one({"_id": _id})
     return res.deleted_count == 1
@@ -144,6 +357,58 @@ class GradeRepository:
       {"$sort": {"subjectId": 1}},
     ]
 
+    cursor = self.col.aggregate(pipeline)
+    out = [doc async for doc in cursor]
+    for d in out:
+      if d.get("averageZA") is not None:
+        d["averageZA"] = float(d["averageZA"])
+    return out
+
+  async def averages_by_student_subject(self, student_id: str, subject_ids: list[str] | None = None) -> list[dict]:
+    # mismo cálculo que dashboard_subjects, para un alumno (subject_ids=None: todas sus materias)
+    match_q: dict = {"studentId": student_id}
+    if subject_ids is not None:
+      match_q["subjectId"] = {"$in": subject_ids}
+
+    pipeline = [
+      {"$match": match_q},
+      {
+        "$addFields": {
+          "_valueZA": {
+            "$convert": {
+              "input": "$valueConverted",
+              "to": "double",
+              "onError": None,
+              "onNull": None,
+            }
+          }
+        }
+      },
+      {
+        "$group": {
+          "_id": "$subjectId",
+          "examsRead": {"$sum": 1},
+          "examsUsedInAverage": {"$sum": {"$cond": [{"$ne": ["$_valueZA", None]}, 1, 0]}},
+          "sumZA": {"$sum": {"$ifNull": ["$_valueZA", 0]}},
+        }
+      },
+      {
+        "$project": {
+          "_id": 0,
+          "subjectId": "$_id",
+          "examsRead": 1,
+          "examsUsedInAverage": 1,
+          "averageZA": {
+            "$cond": [
+              {"$gt": ["$examsUsedInAverage", 0]},
+              {"$divide": ["$sumZA", "$examsUsedInAverage"]},
+              None,
+            ]
+          },
+        }
+      },
+    ]
+
     cursor = self.col.aggregate(pipeline)
     out = [doc async for doc in cursor]
     for d in out:
@@ -1,29 +1,57 @@
+from __future__ import annotations
+
 from datetime import datetime, timezone
 from bson import ObjectId
 from edugrade.utils.object_id import is_objectid_hex
-import re
+from edugrade.utils.cursor import keyset_filter
+from edugrade.repository.mongo.write_concern import collection
+from edugrade.repository.mongo.bulk import insert_many_tolerant
+from edugrade.repository.mongo.search import (
+  HIDDEN_FIELDS,
+  apply_search_filters,
+  backfill_search_keys,
+  ranked_search,
+  search_fields,
+)
+
+# campos de búsqueda -> prefijo de sus trigramas en searchKeys
+SEARCH_FIELDS = {"name": "n:", "address": "a:"}
+
 
 class InstitutionRepository:
-  def __init__(self, db):
-    self.col = db['institutions']
+  def __init__(self, db, write_concern: str | None = None):
+    self.col = collection(db, "institutions", write_concern)
 
   async def ensure_indexes(self) -> None:
     await self.col.create_index("name")
     await self.col.create_index([("country", 1), ("address", 1)])
+    await self.col.create_index("searchKeys")
+    # listados paginados (con y sin filtro de igualdad)
+    await self.col.create_index([("createdAt", -1), ("_id", -1)])
+    await self.col.create_index([("country", 1), ("createdAt", -1), ("_id", -1)])
+    # autocomplete: prefijo sobre el nombre normalizado, con y sin país
+    await self.col.create_index("search.name")
+    await self.col.create_index([("country", 1), ("search.name", 1)])
 
-  async def create(self, payload: dict) -> dict:
+  def _new_doc(self, payload: dict) -> dict:
+    _id = ObjectId()
     doc = dict(payload)
+    doc["_id"] = _id
+    # mongoId = string del _id (sirve para Neo4j); va en el mismo insert
+    doc["mongoId"] = str(_id)
     doc["createdAt"] = datetime.now(timezone.utc)
+    doc.update(search_fields(doc, SEARCH_FIELDS))
+    return doc
 
-    res = await self.col.insert_one(doc)
-
-    # Guardar mongoId como string del _id (sirve para Neo4j)
-    await self.col.update_one(
-      {"_id": res.inserted_id},
-      {"$set": {"mongoId": str(res.inserted_id)}}
-    )
+  async def create(self, payload: dict) -> dict:
+    doc = self._new_doc(payload)
+    await self.col.insert_one(doc)
+    return doc
 
-    return await self.col.find_one({"_id": res.inserted_id})
+  async def create_many(self, items: list[dict]) -> tuple[list[dict], dict[int, dict]]:
+    docs = [self._new_doc(p) for p in items]
+    errors = await insert_many_tolerant(self.col, docs)
+    return docs, errors
 
   async def list(
     self,
@@ -33,21 +61,45 @@ class InstitutionRepository:
     address: str | None = None,
     limit: int = 50,
     skip: int = 0,
+    after: tuple[datetime, ObjectId] | None = None,
   ) -> list[dict]:
     q: dict = {}
-    if name:
-      q["name"] = {"$regex": re.escape(name), "$options": "i"}
-
+    filters = {"name": name}
     if address and country:
-      q["address"] = {"$regex": re.escape(address), "$options": "i"}
+      filters["address"] = address
+
+    keys = apply_search_filters(q, filters, SEARCH_FIELDS)
+
+    if country:
       q["country"] = country
-        
-    if country and "country" not in q:
+
+    if keys:
+      return await ranked_search(self.col, q, keys, limit=limit, skip=skip)
+
+    # keyset sobre (createdAt, _id): cada página cuesta lo mismo; skip queda para clientes viejos
+    if after is not None:
+      q.update(keyset_filter(after))
+      skip = 0
+
+    cursor = self.col.find(q, HIDDEN_FIELDS).sort([("createdAt", -1), ("_id", -1)]).skip(skip).limit(limit)
+    return [doc async for doc in cursor]
+
+  async def iter_ids(self, batch_size: int = 5000):
+    # todos los _id como hex en orden ascendente (reconciliación con el grafo)
+    async for doc in self.col.find({}, {"_id": 1}).sort("_id", 1).batch_size(batch_size):
+      yield str(doc["_id"])
+
+  async def backfill_search_keys(self) -> int:
+    return await backfill_search_keys(self.col, SEARCH_FIELDS)
+
+  async def suggest(self, *, prefix: str, country: str | None, limit: int) -> list[dict]:
+    q: dict = {"search.name": {"$gte": prefix, "$lt": prefix + "\uffff"}}
+    if country:
       q["country"] = country
 
-    cursor = self.col.find(q).sort("createdAt", -1).skip(skip).limit(limit)
+    cursor = self.col.find(q, {"name": 1, "country": 1}).sort("search.name", 1).limit(limit)
     return [doc async for doc in cursor]
-  
+
   async def get_one(self, identifier: str) -> dict | None:
     # 1) si parece ObjectId real
     if is_objectid_hex(identifier):
@@ -56,4 +108,18 @@ class InstitutionRepository:
         return doc
 
     # 2) si no, lo tratamos como mongoId (string)
-    return await self.col.find_one({"mongoId": identifier})
\ No newline at end of file
+    return await self.col.find_one({"mongoId": identifier})
+
+  async def get_many(self, identifiers: list[str]) -> dict[str, dict]:
+    # batch de get_one: primero por _id, los que falten por mongoId
+    found: dict[str, dict] = {}
+    oids = [ObjectId(i) for i in identifiers if i and is_objectid_hex(i)]
+    if oids:
+      async for doc in self.col.find({"_id": {"$in": oids}}, HIDDEN_FIELDS):
+        found[str(doc["_id"])] = doc
+
+    missing = [i for i in identifiers if i and i not in found]
+    if missing:
+      async for doc in self.col.find({"mongoId": {"$in": missing}}, HIDDEN_FIELDS):
+        found.setdefault(doc["mongoId"], doc)
+    return found
@@ -1,6 +1,9 @@
+from edugrade.repository.mongo.write_concern import collection
+
+
 class OptionsRepository:
-  def __init__(self, db):
-      self.col = db["options"]
+  def __init__(self, db, write_concern: str | None = None):
+    self.col = collection(db, "options", write_concern)
 
   async def ensure_indexes(self) -> None:
     await self.col.create_index("key", unique=True)
@@ -21,3 +24,15 @@ class OptionsRepository:
       return None
     values = doc.get("values")
     return values if isinstance(values, list) else None
+
+  async def get_systems(self) -> list[str]:
+    # "system" se guarda como {country: [systems]} en values o response (ver seed)
+    doc = await self.get_by_key("system")
+    if not doc:
+      return []
+    values = doc.get("values", doc.get("response"))
+    if isinstance(values, dict):
+      values = [s for systems in values.values() for s in (systems or [])]
+    if not isinstance(values, list):
+      return []
+    return sorted({str(s) for s in values})
@@ -0,0 +1,134 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+from edugrade.repository.mongo.bulk import DUPLICATE_KEY, insert_many_tolerant
+from edugrade.repository.mongo.write_concern import collection
+
+STATUS_PENDING = "PENDING"
+STATUS_DONE = "DONE"
+STATUS_FAILED = "FAILED"
+
+
+class OutboxRepository:
+  # operaciones de grafo pendientes (Mongo -> Neo4j); las aplica services/outbox.py en segundo plano
+  def __init__(self, db, write_concern: str | None = "journaled"):
+    self.col = collection(db, "graph_outbox", write_concern)
+
+  async def ensure_indexes(self) -> None:
+    # cola: pendientes por próximo intento, en orden de llegada
+    await self.col.create_index([("status", 1), ("nextAttemptAt", 1), ("_id", 1)])
+    # idempotencia: la misma operación no se encola dos veces mientras está pendiente
+    await self.col.create_index(
+      "key",
+      unique=True,
+      partialFilterExpression={"status": STATUS_PENDING},
+    )
+    # flush_for: pendientes que tocan ciertas entidades
+    await self.col.create_index([("entityIds", 1), ("status", 1)])
+    # las ya aplicadas se borran solas a la semana
+    await self.col.create_index(
+      "processedAt",
+      expireAfterSeconds=7 * 24 * 3600,
+      partialFilterExpression={"status": STATUS_DONE},
+    )
+
+  async def append(self, entries: list[dict]) -> int:
+    # un duplicado de key = la misma operación ya está pendiente: se ignora
+    now = datetime.now(timezone.utc)
+    docs = [
+      {
+        **e,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "createdAt": now,
+        "nextAttemptAt": now,
+        "lockedUntil": None,
+      }
+      for e in entries
+    ]
+    errors = await insert_many_tolerant(self.col, docs)
+    failed = [e for e in errors.values() if e.get("code") != DUPLICATE_KEY]
+    if failed:
+      raise RuntimeError(f"outbox append failed: {failed[0].get('errmsg', 'write error')}")
+    return len(docs) - len(errors)
+
+  async def claim(
+    self,
+    worker: str,
+    limit: int,
+    lease_seconds: float,
+    entity_ids: list[str] | None = None,
+  ) -> list[dict]:
+    # lease por doc (lockedUntil): otro worker no lo toma hasta que venza
+    now = datetime.now(timezone.utc)
+    # también con entity_ids (flush_for): una op en backoff no se toma antes de nextAttemptAt
+    q: dict = {
+      "status": STATUS_PENDING,
+      "nextAttemptAt": {"$lte": now},
+      "$or": [{"lockedUntil": None}, {"lockedUntil": {"$lt": now}}],
+    }
+    if entity_ids is not None:
+      q["entityIds"] = {"$in": entity_ids}
+
+    ids = [d["_id"] async for d in self.col.find(q, {"_id": 1}).sort("_id", 1).limit(limit)]
+    if not ids:
+      return []
+
+    # el token distingue este claim de uno anterior del mismo worker
+    token = uuid.uuid4().hex
+    await self.col.update_many(
+      {"_id": {"$in": ids}, **q},
+      {"$set": {"lockedBy": worker, "claimToken": token, "lockedUntil": now + timedelta(seconds=lease_seconds)}},
+    )
+    cursor = self.col.find({"_id": {"$in": ids}, "claimToken": token}).sort("_id", 1)
+    return [d async for d in cursor]
+
+  async def next_pending_at(self, entity_ids: list[str]) -> datetime | None:
+    # próximo intento entre las pendientes que tocan estas entidades (None = no queda ninguna)
+    doc = await self.col.find_one(
+      {"entityIds": {"$in": entity_ids}, "status": STATUS_PENDING},
+      {"nextAttemptAt": 1},
+      sort=[("nextAttemptAt", 1)],
+    )
+    if doc is None:
+      return None
+    at = doc["nextAttemptAt"]
+    return at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at
+
+  # mark_done / mark_retry solo tocan docs que siguen con el claimToken de este claim:
+  # si el lease venció y otro worker los tomó, el resultado del viejo se descarta
+  async def mark_done(self, ids: list, token: str) -> None:
+    if not ids:
+      return
+    await self.col.update_many(
+      {"_id": {"$in": ids}, "claimToken": token},
+      {"$set": {"status": STATUS_DONE, "processedAt": datetime.now(timezone.utc), "lockedUntil": None}},
+    )
+
+  async def mark_retry(self, doc: dict, error: str, *, max_attempts: int, backoff_seconds: float) -> dict | None:
+    attempts = int(doc.get("attempts") or 0) + 1
+    failed = attempts >= max_attempts
+    delay = min(backoff_seconds * (2 ** (attempts - 1)), 300)
+    return await self.col.find_one_and_update(
+      {"_id": doc["_id"], "claimToken": doc["claimToken"]},
+      {"$set": {
+        "status": STATUS_FAILED if failed else STATUS_PENDING,
+        "attempts": attempts,
+        "lastError": error[:500],
+        "nextAttemptAt": datetime.now(timezone.utc) + timedelta(seconds=delay),
+        "lockedUntil": None,
+      }},
+      return_document=ReturnDocument.AFTER,
+    )
+
+  async def stats(self) -> dict:
+    pending = await self.col.count_documents({"status": STATUS_PENDING})
+    failed = await self.col.count_documents({"status": STATUS_FAILED})
+    oldest = await self.col.find_one({"status": STATUS_PENDING}, {"createdAt": 1}, sort=[("_id", 1)])
+    return {
+      "pending": pending,
+      "failed": failed,
+      "oldestPendingAt": oldest.get("createdAt") if oldest else None,
+    }
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import ReturnDocument
+from edugrade.repository.mongo.write_concern import collection
+
+
+class ReconversionJobRepository:
+  def __init__(self, db, write_concern: str | None = None):
+    self.col = collection(db, "reconversionJobs", write_concern)
+
+  async def ensure_indexes(self) -> None:
+    await self.col.create_index([("status", 1), ("createdAt", 1)])
+
+  async def create(self, doc: dict) -> dict:
+    doc = dict(doc)
+    doc["_id"] = ObjectId()
+    doc["createdAt"] = datetime.now(timezone.utc)
+    doc["updatedAt"] = doc["createdAt"]
+    await self.col.insert_one(doc)
+    return doc
+
+  async def get_by_id(self, _id: ObjectId) -> dict | None:
+    return await self.col.find_one({"_id": _id})
+
+  async def list_by_status(self, status: str) -> list[dict]:
+    cursor = self.col.find({"status": status}).sort("createdAt", 1)
+    return [doc async for doc in cursor]
+
+  async def update(self, _id: ObjectId, fields: dict) -> dict | None:
+    fields = {**fields, "updatedAt": datetime.now(timezone.utc)}
+    return await self.col.find_one_and_update(
+      {"_id": _id},
+      {"$set": fields},
+      return_document=ReturnDocument.AFTER,
+    )
+
+  async def claim(self, _id: ObjectId, owner: str, lease_seconds: float) -> dict | None:
+    # un solo worker por job: se toma si está RUNNING y sin lease vigente (None = ya lo corre otro)
+    now = datetime.now(timezone.utc)
+    return await self.col.find_one_and_update(
+      {
+        "_id": _id,
+        "status": "RUNNING",
+        "$or": [{"leaseUntil": None}, {"leaseUntil": {"$lt": now}}],
+      },
+      {"$set": {"owner": owner, "leaseUntil": now + timedelta(seconds=lease_seconds), "updatedAt": now}},
+      return_document=ReturnDocument.AFTER,
+    )
+
+  async def update_owned(self, _id: ObjectId, owner: str, fields: dict) -> bool:
+    # cierre del job (DONE/FAILED) solo si el lease sigue siendo de este worker
+    fields = {**fields, "leaseUntil": None, "updatedAt": datetime.now(timezone.utc)}
+    res = await self.col.update_one({"_id": _id, "owner": owner}, {"$set": fields})
+    return res.matched_count == 1
+
+  async def save_checkpoint(
+    self,
+    _id: ObjectId,
+    *,
+    owner: str,
+    lease_seconds: float,
+    checkpoint: dict,
+    scanned: int,
+    updated: int,
+    failed: int,
+  ) -> bool:
+    # checkpoint + contadores + renovación del lease en un solo write: si el proceso muere, se retoma desde acá.
+    # False = el lease venció y otro worker tomó el job: este tiene que parar
+    now = datetime.now(timezone.utc)
+    res = await self.col.update_one(
+      {"_id": _id, "owner": owner},
+      {
+        "$set": {"checkpoint": checkpoint, "leaseUntil": now + timedelta(seconds=lease_seconds), "updatedAt": now},
+        "$inc": {"scanned": scanned, "updated": updated, "failed": failed},
+      },
+    )
+    return res.matched_count == 1
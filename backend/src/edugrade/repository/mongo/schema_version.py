@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+
+from edugrade.repository.mongo.write_concern import collection
+
+
+class SchemaVersionRepository:
+  # un doc por componente ({_id: "mongo", version, appliedAt}); lo lee el arranque
+  def __init__(self, db, write_concern: str | None = "majority"):
+    self.col = collection(db, "schema_versions", write_concern)
+
+  async def get(self, component: str) -> int | None:
+    doc = await self.col.find_one({"_id": component}, {"version": 1})
+    return int(doc["version"]) if doc and doc.get("version") is not None else None
+
+  async def set(self, component: str, version: int) -> None:
+    await self.col.update_one(
+      {"_id": component},
+      {"$set": {"version": version, "appliedAt": datetime.now(timezone.utc)}},
+      upsert=True,
+    )
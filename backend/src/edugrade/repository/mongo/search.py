@@ -0,0 +1,72 @@
+''' búsqueda por trigramas embebidos: searchKeys (índice multikey) + search.<campo> normalizado '''
+
+import re
+from pymongo import UpdateOne
+from edugrade.utils.string import fold_text, trigram_keys, query_trigrams
+
+HIDDEN_FIELDS = {"searchKeys": 0, "search": 0}
+
+# letras de más a menos frecuentes en nombres (español); lo que no está cuenta como rara
+_COMMON_LETTERS = "aeionrlsmtcudgbpvhfyzjqxkw"
+
+
+def search_fields(doc: dict, fields: dict[str, str]) -> dict:
+  # fields: campo -> prefijo de sus trigramas (ej. {"lastName": "l:"})
+  keys: list[str] = []
+  folded: dict[str, str] = {}
+  for field, prefix in fields.items():
+    keys.extend(trigram_keys(doc.get(field), prefix))
+    folded[field] = fold_text(doc.get(field))
+  return {"searchKeys": keys, "search": folded}
+
+
+def apply_search_filters(q: dict, filters: dict[str, str | None], fields: dict[str, str]) -> list[str]:
+  # Agrega a q la verificación de substring y devuelve los trigramas a exigir con $all
+  keys: list[str] = []
+  for field, value in filters.items():
+    folded = fold_text(value)
+    if not folded:
+      continue
+    keys.extend(query_trigrams(value, fields[field]))
+    q[f"search.{field}"] = {"$regex": re.escape(folded)}
+  return keys
+
+
+def _rarity(key: str) -> tuple:
+  # menos relleno y letras menos frecuentes = trigrama más selectivo
+  gram = key[-3:]
+  rank = sum(_COMMON_LETTERS.find(c) if c in _COMMON_LETTERS else len(_COMMON_LETTERS) for c in gram if c != " ")
+  return (gram.count(" "), -rank, key)
+
+
+def selective_first(keys: list[str]) -> list[str]:
+  # Mongo arma los bounds del índice multikey con el primer elemento de $all y filtra el resto:
+  # arrancar por el más raro y no por el primero alfabético ("  x", " xy" son los más comunes)
+  return sorted(set(keys), key=_rarity)
+
+
+async def ranked_search(col, q: dict, keys: list[str], *, limit: int, skip: int) -> list[dict]:
+  # ranking: proporción de trigramas del documento cubiertos por la búsqueda
+  pipeline = [
+    {"$match": {**q, "searchKeys": {"$all": selective_first(keys)}}},
+    {"$addFields": {"_score": {"$divide": [len(keys), {"$max": [{"$size": "$searchKeys"}, 1]}]}}},
+    {"$sort": {"_score": -1, "createdAt": -1}},
+    {"$skip": skip},
+    {"$limit": limit},
+    {"$project": {**HIDDEN_FIELDS, "_score": 0}},
+  ]
+  cursor = col.aggregate(pipeline)
+  return [doc async for doc in cursor]
+
+
+async def backfill_search_keys(col, fields: dict[str, str], batch_size: int = 1000) -> int:
+  total = 0
+  projection = {f: 1 for f in fields}
+  while True:
+    cursor = col.find({"searchKeys": {"$exists": False}}, projection).limit(batch_size)
+    docs = [doc async for doc in cursor]
+    if not docs:
+      return total
+    ops = [UpdateOne({"_id": d["_id"]}, {"$set": search_fields(d, fields)}) for d in docs]
+    await col.bulk_write(ops, ordered=False)
+    total += len(docs)
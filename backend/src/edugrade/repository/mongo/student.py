@@ -2,19 +2,38 @@ from datetime import datetime, timezone, date
 from bson import ObjectId
 from pymongo.errors import DuplicateKeyError
 from edugrade.utils.date import date_to_datetime_utc
+from edugrade.utils.cursor import keyset_filter
+from edugrade.repository.mongo.write_concern import collection
+from edugrade.repository.mongo.bulk import insert_many_tolerant
+from edugrade.repository.mongo.search import (
+  HIDDEN_FIELDS,
+  apply_search_filters,
+  backfill_search_keys,
+  ranked_search,
+  search_fields,
+)
+
+# campos de búsqueda -> prefijo de sus trigramas en searchKeys
+SEARCH_FIELDS = {"firstName": "f:", "lastName": "l:"}
+
 
 class StudentRepository:
-  def __init__(self, db):
-    self.col = db["student"]
+  def __init__(self, db, write_concern: str | None = None):
+    self.col = collection(db, "student", write_concern)
 
   async def ensure_indexes(self) -> None:
     await self.col.create_index([("nationality", 1), ("identity", 1)])
     await self.col.create_index("lastName")
     await self.col.create_index("firstName")
-    
-  async def create(self, data: dict) -> dict:
+    await self.col.create_index("searchKeys")
+    # listados paginados (con y sin filtro de igualdad)
+    await self.col.create_index([("createdAt", -1), ("_id", -1)])
+    await self.col.create_index([("nationality", 1), ("createdAt", -1), ("_id", -1)])
+
+  def _new_doc(self, data: dict) -> dict:
     doc = {
       **data,
+      "_id": ObjectId(),
       "createdAt": datetime.now(timezone.utc),
     }
     if isinstance(doc.get("birthDate"), date):
@@ -23,18 +42,40 @@ class StudentRepository:
     identity = doc.get("identity")
     if identity is None or str(identity).strip() == "":
       doc.pop("identity", None)
+
+    doc.update(search_fields(doc, SEARCH_FIELDS))
+    return doc
+
+  async def create(self, data: dict) -> dict:
+    doc = self._new_doc(data)
+
     try:
-      res = await self.col.insert_one(doc)
+      await self.col.insert_one(doc)
     except DuplicateKeyError:
       raise
 
-    created = await self.col.find_one({"_id": res.inserted_id})
-    created["_id"] = str(created["_id"])
-    return created
+    return {**doc, "_id": str(doc["_id"])}
+
+  async def create_many(self, items: list[dict]) -> tuple[list[dict], dict[int, dict]]:
+    docs = [self._new_doc(d) for d in items]
+    errors = await insert_many_tolerant(self.col, docs)
+    return docs, errors
 
   async def get_by_id(self, student_id: ObjectId) -> dict | None:
     return await self.col.find_one({"_id": student_id})
 
+  async def get_many_by_ids(self, student_ids: list[ObjectId]) -> list[dict]:
+    if not student_ids:
+      return []
+    cursor = self.col.find({"_id": {"$in": student_ids}}, HIDDEN_FIELDS)
+    return [doc async for doc in cursor]
+
+  async def existing_ids(self, ids: list[str]) -> set[str]:
+    oids = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+    if not oids:
+      return set()
+    return {str(d["_id"]) async for d in self.col.find({"_id": {"$in": oids}}, {"_id": 1})}
+
   async def list(
     self,
     *,
@@ -44,24 +85,37 @@ class StudentRepository:
     identity: str | None = None,
     limit: int = 50,
     skip: int = 0,
+    after: tuple[datetime, ObjectId] | None = None,
   ) -> list[dict]:
     q: dict = {}
 
     if identity and nationality:
       q["identity"] = identity; q["nationality"] = nationality
-      
-    if first_name:
-      q["firstName"] = {"$regex": first_name, "$options": "i"}
-    
-    if last_name_like:
-      q["lastName"] = {"$regex": last_name_like, "$options": "i"}
-      
+
+    keys = apply_search_filters(q, {"firstName": first_name, "lastName": last_name_like}, SEARCH_FIELDS)
+
     if nationality and "nationality" not in q:
       q["nationality"] = nationality
 
-    cursor = self.col.find(q).sort("createdAt", -1).skip(skip).limit(limit)
+    if keys:
+      return await ranked_search(self.col, q, keys, limit=limit, skip=skip)
+
+    # keyset sobre (createdAt, _id): cada página cuesta lo mismo; skip queda para clientes viejos
+    if after is not None:
+      q.update(keyset_filter(after))
+      skip = 0
+
+    cursor = self.col.find(q, HIDDEN_FIELDS).sort([("createdAt", -1), ("_id", -1)]).skip(skip).limit(limit)
     return [doc async for doc in cursor]
 
+  async def iter_ids(self, batch_size: int = 5000):
+    # todos los _id como hex en orden ascendente (reconciliación con el grafo)
+    async for doc in self.col.find({}, {"_id": 1}).sort("_id", 1).batch_size(batch_size):
+      yield str(doc["_id"])
+
+  async def backfill_search_keys(self) -> int:
+    return await backfill_search_keys(self.col, SEARCH_FIELDS)
+
   async def delete(self, student_id: ObjectId) -> bool:
     res = await self.col.delete_one({"_id": student_id})
     return res.deleted_count == 1
@@ -0,0 +1,26 @@
+''' perfiles de write concern por repositorio (opcional; por defecto el del cliente/URI) '''
+
+from pymongo import WriteConcern
+
+from edugrade.config import settings
+
+PROFILES: dict[str, WriteConcern | None] = {
+  "default": None,
+  # escrituras reconstruibles (proyecciones, checkpoints): ack del primario y listo
+  "fast": WriteConcern(w=1, j=False),
+  "journaled": WriteConcern(w=1, j=True),
+  "majority": WriteConcern(w="majority", j=True),
+}
+
+
+def collection(db, name: str, profile: str | None = None):
+  # prioridad: perfil del repo > MONGO_WRITE_CONCERNS[colección] > cliente
+  profile = profile or settings.mongo_write_concerns.get(name)
+  if profile is None:
+    return db[name]
+
+  if profile not in PROFILES:
+    raise ValueError(f"Unknown write concern profile '{profile}' for collection '{name}'")
+
+  wc = PROFILES[profile]
+  return db[name].with_options(write_concern=wc) if wc is not None else db[name]
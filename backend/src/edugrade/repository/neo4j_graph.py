@@ -1,7 +1,10 @@
 ''' solo cypher + acceso a neo4j'''
 
-from typing import Any, Dict, List, Optional
-from neo4j import Driver
+import copy
+import re
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from neo4j import AsyncDriver, AsyncManagedTransaction
 
 from edugrade.models.neo4j import (
     LABEL_STUDENT,
@@ -10,119 +13,308 @@ from edugrade.models.neo4j import (
     REL_STUDIES_AT,
     REL_TOOK,
     REL_EQUIVALENT_TO,
+    LABEL_EQUIVALENCE_GROUP,
+    REL_MEMBER_OF,
+    LABEL_SCHEMA_VERSION,
+    REL_TRANSFER_FLOW,
 )
+from edugrade.utils.date import ensure_date
+from edugrade.utils.string import fold_text
+
+
+T = TypeVar("T")
+
+# full-text sobre Subject.name (+ institutionMongoId para filtrar dentro de Lucene)
+SUBJECT_FULLTEXT_INDEX = "subject_name_fulltext"
+
+
+def _as_date(value, field_name: str) -> Optional[date]:
+    # las fechas de STUDIES_AT/TOOK viajan como date nativo (el driver lo mapea a Date de Neo4j)
+    return None if value is None else ensure_date(value, field_name)
+
+
+def _subject_fulltext_query(text: str, institutionMongoId: Optional[str]) -> str:
+    # cada palabra obligatoria, exacta o como prefijo (la exacta puntúa más); solo \w: no hay nada que escapar
+    terms = re.findall(r"\w+", fold_text(text))
+    if not terms:
+        return ""
+    query = "name:(" + " ".join(f"+({t} OR {t}*)" for t in terms) + ")"
+    if institutionMongoId:
+        query += f" AND institutionMongoId:{institutionMongoId.lower()}"
+    return query
 
 
 class Neo4jGraphRepository:
-    def __init__(self, driver: Driver):
+    def __init__(self, driver: AsyncDriver):
         self.driver = driver
-
-    def ensure_constraints(self) -> None:
-        with self.driver.session() as session:
-            session.run("""
+        # transacción de una unidad de trabajo en curso (ver read_unit/write_unit)
+        self._tx: Optional[AsyncManagedTransaction] = None
+
+    # ---------- TRANSACCIONES ----------
+    # Todo pasa por execute_read/execute_write: el driver reintenta errores transitorios
+    # (hasta max_transaction_retry_time) y rutea lecturas a followers en un cluster.
+
+    @staticmethod
+    async def _fetch(tx: AsyncManagedTransaction, cypher: str, params: dict, single: bool):
+        result = await tx.run(cypher, params)
+        if single:
+            return await result.single()
+        return [rec async for rec in result]
+
+    async def _read(self, cypher: str, params: Optional[dict] = None, *, single: bool = False):
+        if self._tx is not None:
+            return await self._fetch(self._tx, cypher, params or {}, single)
+        async with self.driver.session() as session:
+            return await session.execute_read(self._fetch, cypher, params or {}, single)
+
+    async def _write(self, cypher: str, params: Optional[dict] = None, *, single: bool = False):
+        if self._tx is not None:
+            return await self._fetch(self._tx, cypher, params or {}, single)
+        async with self.driver.session() as session:
+            return await session.execute_write(self._fetch, cypher, params or {}, single)
+
+    def _bound(self, tx: AsyncManagedTransaction) -> "Neo4jGraphRepository":
+        repo = copy.copy(self)
+        repo._tx = tx
+        return repo
+
+    async def read_unit(self, work: Callable[["Neo4jGraphRepository"], Awaitable[T]]) -> T:
+        # varias lecturas en UNA transacción; work recibe un repo atado a esa tx
+        if self._tx is not None:
+            return await work(self)
+        async with self.driver.session() as session:
+            return await session.execute_read(lambda tx: work(self._bound(tx)))
+
+    async def write_unit(self, work: Callable[["Neo4jGraphRepository"], Awaitable[T]]) -> T:
+        # si hay reintento se re-ejecuta work completo: no debe tener efectos fuera de Neo4j
+        if self._tx is not None:
+            return await work(self)
+        async with self.driver.session() as session:
+            return await session.execute_write(lambda tx: work(self._bound(tx)))
+
+    async def ensure_constraints(self) -> None:
+        async with self.driver.session() as session:
+            await session.run("""
                 CREATE CONSTRAINT student_mongoId IF NOT EXISTS
                 FOR (s:Student) REQUIRE s.mongoId IS UNIQUE
             """)
-            session.run("""
+            await session.run("""
                 CREATE CONSTRAINT institution_mongoId IF NOT EXISTS
                 FOR (i:Institution) REQUIRE i.mongoId IS UNIQUE
             """)
-            session.run("""
+            await session.run("""
                 CREATE CONSTRAINT subject_id IF NOT EXISTS
                 FOR (sub:Subject) REQUIRE sub.id IS UNIQUE
             """)
-            session.run("""
+            await session.run("""
                 CREATE CONSTRAINT subject_unique IF NOT EXISTS
                 FOR (sub:Subject) REQUIRE (sub.name, sub.institutionMongoId) IS UNIQUE
             """)
+            await session.run("""
+                CREATE CONSTRAINT equivalence_group_key IF NOT EXISTS
+                FOR (g:EquivalenceGroup) REQUIRE (g.levelStage, g.groupId) IS UNIQUE
+            """)
+            # range indexes para filtros por intervalo y materias por institución
+            # (subject_unique empieza por name, no sirve para buscar solo por institutionMongoId)
+            await session.run("""
+                CREATE INDEX subject_institution IF NOT EXISTS
+                FOR (sub:Subject) ON (sub.institutionMongoId)
+            """)
+            await session.run("""
+                CREATE INDEX studies_at_start IF NOT EXISTS
+                FOR ()-[r:STUDIES_AT]-() ON (r.startDate)
+            """)
+            await session.run("""
+                CREATE INDEX took_start IF NOT EXISTS
+                FOR ()-[r:TOOK]-() ON (r.startDate)
+            """)
+            await session.run("""
+                CREATE INDEX transfer_flow_year IF NOT EXISTS
+                FOR ()-[f:TRANSFER_FLOW]-() ON (f.year)
+            """)
+            # standard-folding: sin acentos ni mayúsculas, igual que fold_text del lado de la query
+            await session.run(f"""
+                CREATE FULLTEXT INDEX {SUBJECT_FULLTEXT_INDEX} IF NOT EXISTS
+                FOR (sub:Subject) ON EACH [sub.name, sub.institutionMongoId]
+                OPTIONS {{ indexConfig: {{ `fulltext.analyzer`: 'standard-folding' }} }}
+            """)
+            await session.run("""
+                CREATE CONSTRAINT schema_version_component IF NOT EXISTS
+                FOR (v:SchemaVersion) REQUIRE v.component IS UNIQUE
+            """)
             
+    # ---------- VERSIÓN DE SCHEMA (constraints/índices/migraciones aplicadas) ----------
+
+    async def get_schema_version(self, component: str) -> Optional[int]:
+        cypher = f"""
+        MATCH (v:{LABEL_SCHEMA_VERSION} {{component: $component}})
+        RETURN v.version AS version
+        """
+        rec = await self._read(cypher, {"component": component}, single=True)
+        return int(rec["version"]) if rec and rec["version"] is not None else None
+
+    async def set_schema_version(self, component: str, version: int) -> None:
+        cypher = f"""
+        MERGE (v:{LABEL_SCHEMA_VERSION} {{component: $component}})
+        SET v.version = $version, v.appliedAt = datetime()
+        """
+        await self._write(cypher, {"component": component, "version": version})
+
     # ---------- UPSERT NODES ----------
 
-    def upsert_student(self, mongoId: str) -> Dict[str, Any]:
+    async def upsert_student(self, mongoId: str) -> Dict[str, Any]:
         cypher = f"""
         MERGE (s:{LABEL_STUDENT} {{mongoId: $mongoId}})
         RETURN s
         """
-        with self.driver.session() as session:
-            rec = session.run(cypher, {"mongoId": mongoId}).single()
-            return dict(rec["s"])
+        rec = await self._write(cypher, {"mongoId": mongoId}, single=True)
+        return dict(rec["s"])
         
-    def delete_student(self, mongoId: str) -> Dict[str, Any]:
+    async def delete_student(self, mongoId: str) -> Dict[str, Any]:
         cypher = f"""
         MATCH (s:{LABEL_STUDENT} {{mongoId: $mongoId}})
         WITH s, s.mongoId AS id
         DETACH DELETE s
         RETURN id AS mongoId
         """
-        with self.driver.session() as session:
-            rec = session.run(cypher, {"mongoId": mongoId}).single()
-            if rec is None:
-                return {"deleted": False, "mongoId": mongoId}
-            return {"deleted": True, "mongoId": rec["mongoId"]}
+        rec = await self._write(cypher, {"mongoId": mongoId}, single=True)
+        if rec is None:
+            return {"deleted": False, "mongoId": mongoId}
+        return {"deleted": True, "mongoId": rec["mongoId"]}
 
-    def upsert_institution(self, mongoId: str) -> Dict[str, Any]:
+    async def upsert_institution(self, mongoId: str) -> Dict[str, Any]:
         cypher = f"""
         MERGE (i:{LABEL_INSTITUTION} {{mongoId: $mongoId}})
         RETURN i
         """
-        with self.driver.session() as session:
-            rec = session.run(cypher, {"mongoId": mongoId}).single()
-            return dict(rec["i"])
+        rec = await self._write(cypher, {"mongoId": mongoId}, single=True)
+        return dict(rec["i"])
+
+    # ---------- BATCH UPSERTS (una sola transacción por batch) ----------
+
+    async def upsert_students(self, mongoIds: List[str]) -> int:
+        if not mongoIds:
+            return 0
+        cypher = f"""
+        UNWIND $mongoIds AS mongoId
+        MERGE (s:{LABEL_STUDENT} {{mongoId: mongoId}})
+        RETURN count(s) AS upserted
+        """
+        rec = await self._write(cypher, {"mongoIds": mongoIds}, single=True)
+        return int(rec["upserted"]) if rec else 0
+
+    async def upsert_institutions(self, mongoIds: List[str]) -> int:
+        if not mongoIds:
+            return 0
+        cypher = f"""
+        UNWIND $mongoIds AS mongoId
+        MERGE (i:{LABEL_INSTITUTION} {{mongoId: mongoId}})
+        RETURN count(i) AS upserted
+        """
+        rec = await self._write(cypher, {"mongoIds": mongoIds}, single=True)
+        return int(rec["upserted"]) if rec else 0
+
+    async def delete_students(self, mongoIds: List[str]) -> int:
+        if not mongoIds:
+            return 0
+        cypher = f"""
+        UNWIND $mongoIds AS mongoId
+        MATCH (s:{LABEL_STUDENT} {{mongoId: mongoId}})
+        DETACH DELETE s
+        RETURN count(*) AS deleted
+        """
+        rec = await self._write(cypher, {"mongoIds": mongoIds}, single=True)
+        return int(rec["deleted"]) if rec else 0
+
+    async def enroll_students(self, rows: List[Dict[str, Any]]) -> int:
+        # rows: {studentMongoId, institutionMongoId, startDate, endDate}; MERGE de ambos nodos para
+        # no depender del orden en que llegan los upserts (idempotente: se puede reaplicar)
+        if not rows:
+            return 0
+        cypher = f"""
+        UNWIND $rows AS row
+        MERGE (s:{LABEL_STUDENT} {{mongoId: row.studentMongoId}})
+        MERGE (i:{LABEL_INSTITUTION} {{mongoId: row.institutionMongoId}})
+        MERGE (s)-[r:{REL_STUDIES_AT} {{startDate: row.startDate}}]->(i)
+        SET r.endDate = row.endDate
+        RETURN count(r) AS linked
+        """
+        params = {"rows": [
+            {
+                "studentMongoId": row["studentMongoId"],
+                "institutionMongoId": row["institutionMongoId"],
+                "startDate": _as_date(row["startDate"], "startDate"),
+                "endDate": _as_date(row.get("endDate"), "endDate"),
+            }
+            for row in rows
+        ]}
+        rec = await self._write(cypher, params, single=True)
+        return int(rec["linked"]) if rec else 0
 
-    def upsert_subject(self, name: str, institutionMongoId: str) -> Dict[str, Any]:
+    async def list_mongo_ids(self, label: str, after: Optional[str] = None, limit: int = 5000) -> List[str]:
+        # keyset sobre mongoId (reconciliación con Mongo); label es una constante de models.neo4j
+        cypher = f"""
+        MATCH (n:{label})
+        WHERE $after IS NULL OR n.mongoId > $after
+        RETURN n.mongoId AS mongoId
+        ORDER BY mongoId ASC
+        LIMIT $limit
+        """
+        records = await self._read(cypher, {"after": after, "limit": limit})
+        return [record["mongoId"] for record in records]
+
+    async def upsert_subject(self, name: str, institutionMongoId: str) -> Dict[str, Any]:
         cypher = f"""
         MERGE (sub:{LABEL_SUBJECT} {{name: $name, institutionMongoId: $institutionMongoId}})
         ON CREATE SET sub.id = randomUUID()
         RETURN sub.id AS id, sub.name AS name, sub.institutionMongoId AS institutionMongoId
         """
         params = {"name": name, "institutionMongoId": institutionMongoId}
-        with self.driver.session() as session:
-            rec = session.run(cypher, params).single()
-            if rec is None:
-                raise ValueError("Failed to upsert subject")
-            return {
-                "id": str(rec["id"]),
-                "name": rec["name"],
-                "institutionMongoId": rec["institutionMongoId"],
-            }
+        rec = await self._write(cypher, params, single=True)
+        if rec is None:
+            raise ValueError("Failed to upsert subject")
+        return {
+            "id": str(rec["id"]),
+            "name": rec["name"],
+            "institutionMongoId": rec["institutionMongoId"],
+        }
 
     # ---------- RELATIONSHIPS ----------
 
-    def link_studies_at(
+    async def link_studies_at(
         self,
         studentMongoId: str,
         institutionMongoId: str,
-        startDate: str,
-        endDate: Optional[str] = None,
+        startDate: str | date,
+        endDate: Optional[str | date] = None,
     ) -> Dict[str, Any]:
         cypher = f"""
         MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})
         MATCH (i:{LABEL_INSTITUTION} {{mongoId: $institutionMongoId}})
         MERGE (s)-[r:{REL_STUDIES_AT} {{startDate: $startDate}}]->(i)
         SET r.endDate = $endDate
-        RETURN r
+        RETURN r {{.*, startDate: toString(r.startDate), endDate: toString(r.endDate)}} AS r
         """
         params = {
             "studentMongoId": studentMongoId,
             "institutionMongoId": institutionMongoId,
-            "startDate": startDate,
-            "endDate": endDate,
+            "startDate": _as_date(startDate, "startDate"),
+            "endDate": _as_date(endDate, "endDate"),
         }
-        with self.driver.session() as session:
-            rec = session.run(cypher, params).single()
-            if rec is None:
-                raise ValueError(
-                    f"Not found: studentMongoId={studentMongoId} or institutionMongoId={institutionMongoId}"
-                )
-            return dict(rec["r"])
-
-    def link_took(
+        rec = await self._write(cypher, params, single=True)
+        if rec is None:
+            raise ValueError(
+                f"Not found: studentMongoId={studentMongoId} or institutionMongoId={institutionMongoId}"
+            )
+        return dict(rec["r"])
+
+    async def link_took(
         self,
         studentMongoId: str,
         subjectId: str,          # UUID
-        startDate: str,          # ISO string
+        startDate: str | date,   # ISO string o date; se guarda como date
         grade: str,
-        endDate: Optional[str] = None,
+        endDate: Optional[str | date] = None,
     ) -> Dict[str, Any]:
         cypher = f"""
         MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})
@@ -131,301 +323,579 @@ class Neo4jGraphRepository:
         SET r.startDate = $startDate,
             r.endDate   = $endDate,
             r.grade     = $grade
-        RETURN r
+        RETURN r {{.*, startDate: toString(r.startDate), endDate: toString(r.endDate)}} AS r
         """
         params = {
             "studentMongoId": studentMongoId,
             "subjectId": subjectId,
-            "startDate": startDate,
-            "endDate": endDate,
+            "startDate": _as_date(startDate, "startDate"),
+            "endDate": _as_date(endDate, "endDate"),
             "grade": grade,
         }
-        with self.driver.session() as session:
-            rec = session.run(cypher, params).single()
-            if rec is None:
-                raise ValueError(f"Not found: studentMongoId={studentMongoId} or subjectId={subjectId}")
-            return dict(rec["r"])
-
-    def add_equivalence(self, fromId: str, toId: str, levelStage: str) -> Dict[str, Any]:
-        if fromId == toId:
-            raise ValueError("fromSubjectId and toSubjectId must be different")
-
-        cypher = f"""
-        MATCH (a:{LABEL_SUBJECT} {{id:$fromId}})
-        MATCH (b:{LABEL_SUBJECT} {{id:$toId}})
-
-        // si ya hay arista directa, listo
-        OPTIONAL MATCH (a)-[existing:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(b)
-
-        // detectar si a está en un grupo (tiene succ y pred)
-        OPTIONAL MATCH (a)-[a_out:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(a_succ:{LABEL_SUBJECT})
-        OPTIONAL MATCH (a_pred:{LABEL_SUBJECT})-[a_in:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(a)
-
-        // detectar si b ya está en algún grupo
-        OPTIONAL MATCH (b)-[:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(:{LABEL_SUBJECT})
-        OPTIONAL MATCH (:{LABEL_SUBJECT})-[:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(b)
-
-        WITH a,b,existing,a_succ,a_out,a_pred,a_in,
-            CASE
-            WHEN existing IS NOT NULL THEN 'ALREADY_DIRECT'
-            WHEN a_succ IS NULL AND a_pred IS NULL THEN 'A_ISOLATED'
-            ELSE 'A_IN_GROUP'
-            END AS a_state,
-            CASE
-            WHEN ( (b)-[:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->() ) OR ( ()-[:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(b) )
-            THEN true ELSE false
-            END AS b_in_group
-
-        // si b ya está en un grupo, por ahora no mezclamos grupos
-        WITH a,b,existing,a_succ,a_out,a_state,b_in_group
-        WHERE NOT b_in_group
-
-        // CASO 1: A y B aislados => par bidireccional
-        FOREACH (_ IN CASE WHEN a_state='A_ISOLATED' THEN [1] ELSE [] END |
-        MERGE (a)-[r1:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(b)
-        ON CREATE SET r1.createdAt = datetime()
-        MERGE (b)-[r2:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(a)
-        ON CREATE SET r2.createdAt = datetime()
-        )
-
-        // CASO 2: A está en grupo (ciclo) y B aislado => insertar B "después" de A
-        // a -> a_succ pasa a ser: a -> b -> a_succ
-        FOREACH (_ IN CASE WHEN a_state='A_IN_GROUP' THEN [1] ELSE [] END |
-        DELETE a_out
-        MERGE (a)-[r3:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(b)
-        ON CREATE SET r3.createdAt = datetime()
-        MERGE (b)-[r4:{REL_EQUIVALENT_TO} {{levelStage:$levelStage}}]->(a_succ)
-        ON CREATE SET r4.createdAt = datetime()
-        )
-
-        RETURN true AS ok, a_state AS aState, b_in_group AS bWasInGroup;
-        """
-
-        params = {"fromId": fromId, "toId": toId, "levelStage": str(levelStage)}
-        with self.driver.session() as session:
-            rec = session.run(cypher, params).single()
-            if rec is None:
-                raise ValueError("Cannot add equivalence: subject not found or target is already in another group")
-            return {"ok": True, "aState": rec["aState"], "bWasInGroup": rec["bWasInGroup"]}
-
-    def unlink_equivalence_by_subject(self, subjectId: str, levelStage: str) -> Dict[str, Any]:
-        cypher = f"""
-        MATCH (s:{LABEL_SUBJECT} {{id: $subjectId}})
+        rec = await self._write(cypher, params, single=True)
+        if rec is None:
+            raise ValueError(f"Not found: studentMongoId={studentMongoId} or subjectId={subjectId}")
+        return dict(rec["r"])
 
-        OPTIONAL MATCH (pred:{LABEL_SUBJECT})-[rin:{REL_EQUIVALENT_TO} {{levelStage: $levelStage}}]->(s)
-        OPTIONAL MATCH (s)-[rout:{REL_EQUIVALENT_TO} {{levelStage: $levelStage}}]->(succ:{LABEL_SUBJECT})
+    # ---------- LINKS EN LOTE (WriteCoalescer de Neo4jGraphService) ----------
+    # una fila por caller; devuelven una lista alineada con rows: la relación, o None si falta algún nodo
 
-        WITH s, pred, succ, rin, rout
-        WHERE pred IS NOT NULL AND succ IS NOT NULL
+    async def link_studies_at_many(self, rows: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        if not rows:
+            return []
+        cypher = f"""
+        UNWIND $rows AS row
+        MATCH (s:{LABEL_STUDENT} {{mongoId: row.studentMongoId}})
+        MATCH (i:{LABEL_INSTITUTION} {{mongoId: row.institutionMongoId}})
+        MERGE (s)-[r:{REL_STUDIES_AT} {{startDate: row.startDate}}]->(i)
+        SET r.endDate = row.endDate
+        RETURN row.idx AS idx, r {{.*, startDate: toString(r.startDate), endDate: toString(r.endDate)}} AS r
+        """
+        params = {"rows": [
+            {
+                "idx": idx,
+                "studentMongoId": row["studentMongoId"],
+                "institutionMongoId": row["institutionMongoId"],
+                "startDate": _as_date(row["startDate"], "startDate"),
+                "endDate": _as_date(row.get("endDate"), "endDate"),
+            }
+            for idx, row in enumerate(rows)
+        ]}
+        out: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        for rec in await self._write(cypher, params):
+            out[rec["idx"]] = dict(rec["r"])
+        return out
+
+    async def link_took_many(self, rows: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        # misma semántica que link_took: un TOOK por (alumno, materia); si se repite en el lote gana el último
+        if not rows:
+            return []
+        cypher = f"""
+        UNWIND $rows AS row
+        MATCH (s:{LABEL_STUDENT} {{mongoId: row.studentMongoId}})
+        MATCH (sub:{LABEL_SUBJECT} {{id: row.subjectId}})
+        MERGE (s)-[r:{REL_TOOK}]->(sub)
+        SET r.startDate = row.startDate,
+            r.endDate   = row.endDate,
+            r.grade     = row.grade
+        RETURN row.idx AS idx, r {{.*, startDate: toString(r.startDate), endDate: toString(r.endDate)}} AS r
+        """
+        params = {"rows": [
+            {
+                "idx": idx,
+                "studentMongoId": row["studentMongoId"],
+                "subjectId": row["subjectId"],
+                "startDate": _as_date(row["startDate"], "startDate"),
+                "endDate": _as_date(row.get("endDate"), "endDate"),
+                "grade": row["grade"],
+            }
+            for idx, row in enumerate(rows)
+        ]}
+        out: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        for rec in await self._write(cypher, params):
+            out[rec["idx"]] = dict(rec["r"])
+        return out
+
+    # ---------- FLUJOS ENTRE INSTITUCIONES (TRANSFER_FLOW) ----------
+    # (A)-[:TRANSFER_FLOW {year, count}]->(B): alumnos con dos STUDIES_AT consecutivos (por startDate)
+    # en A y luego en B; year = año de inicio en B. Se mantiene por alumno dentro de la misma
+    # transacción que cambia sus inscripciones: restar sus pares (-1), escribir, sumarlos (+1).
+
+    _STUDENT_TRANSFER_PAIRS = f"""
+        MATCH (s)-[e:{REL_STUDIES_AT}]->(i:{LABEL_INSTITUTION})
+        WITH s, e, i ORDER BY e.startDate ASC, i.mongoId ASC
+        WITH s, collect({{inst: i, start: e.startDate}}) AS seq
+        UNWIND range(0, size(seq) - 2) AS k
+        WITH seq[k].inst AS a, seq[k + 1].inst AS b, seq[k + 1].start.year AS year
+        WHERE a <> b
+        WITH a, b, year, count(*) AS n
+        MERGE (a)-[f:{REL_TRANSFER_FLOW} {{year: year}}]->(b)
+        ON CREATE SET f.count = 0
+        SET f.count = f.count + $sign * n
+        WITH f WHERE f.count <= 0
+        DELETE f
+    """
+
+    async def apply_transfer_flows(self, studentMongoIds: List[str], sign: int) -> None:
+        if not studentMongoIds:
+            return
+        cypher = f"""
+        UNWIND $studentMongoIds AS sid
+        MATCH (s:{LABEL_STUDENT} {{mongoId: sid}})
+        CALL {{
+            WITH s
+            {self._STUDENT_TRANSFER_PAIRS}
+        }}
+        """
+        await self._write(cypher, {"studentMongoIds": studentMongoIds, "sign": sign})
+
+    async def count_transfer_flows(self) -> int:
+        rec = await self._read(f"MATCH ()-[f:{REL_TRANSFER_FLOW}]->() RETURN count(f) AS total", single=True)
+        return int(rec["total"]) if rec else 0
+
+    async def rebuild_transfer_flows(self, batchSize: int = 5000) -> None:
+        # desde cero, en lotes (CALL ... IN TRANSACTIONS => session.run); correr sin escrituras de STUDIES_AT en curso
+        async with self.driver.session() as session:
+            result = await session.run(f"""
+                MATCH ()-[f:{REL_TRANSFER_FLOW}]->()
+                CALL {{ WITH f DELETE f }} IN TRANSACTIONS OF $batchSize ROWS
+            """, {"batchSize": batchSize})
+            await result.consume()
+            result = await session.run(f"""
+                MATCH (s:{LABEL_STUDENT})
+                CALL {{
+                    WITH s
+                    {self._STUDENT_TRANSFER_PAIRS}
+                }} IN TRANSACTIONS OF $batchSize ROWS
+            """, {"batchSize": batchSize, "sign": 1})
+            await result.consume()
+
+    async def get_transfer_flows(
+        self,
+        year: Optional[int] = None,
+        fromInstitutionMongoId: Optional[str] = None,
+        toInstitutionMongoId: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        # top-k por cantidad; sin year se suman todos los años del par
+        cypher = f"""
+        MATCH (a:{LABEL_INSTITUTION})-[f:{REL_TRANSFER_FLOW}]->(b:{LABEL_INSTITUTION})
+        WHERE ($year IS NULL OR f.year = $year)
+          AND ($fromId IS NULL OR a.mongoId = $fromId)
+          AND ($toId IS NULL OR b.mongoId = $toId)
+        WITH a.mongoId AS fromInstitutionId, b.mongoId AS toInstitutionId, sum(f.count) AS count
+        RETURN fromInstitutionId, toInstitutionId, $year AS year, count
+        ORDER BY count DESC, fromInstitutionId ASC, toInstitutionId ASC
+        LIMIT $limit
+        """
+        params = {
+            "year": year,
+            "fromId": fromInstitutionMongoId,
+            "toId": toInstitutionMongoId,
+            "limit": limit,
+        }
+        records = await self._read(cypher, params)
+        return [record.data() for record in records]
 
-        WITH s, pred, succ, rin, rout,
-            CASE WHEN pred.id = succ.id THEN 'PAIR' ELSE 'CYCLE' END AS kind
+    # ---------- EQUIVALENCIAS (EquivalenceGroup + MEMBER_OF) ----------
+    # Cada (levelStage, groupId) es un nodo; una materia pertenece a lo sumo a un grupo por levelStage.
+    # Pertenencia y chequeos son un solo salto desde la materia, sin recorrer caminos.
 
-        // borrar aristas que conectan a s dentro del grupo
-        DELETE rin
-        DELETE rout
+    async def get_group_memberships(self, levelStage: str, subjectIds: List[str]) -> List[Dict[str, Any]]:
+        # solo devuelve materias existentes; groupId/groupSize en null si no tiene grupo
+        cypher = f"""
+        UNWIND $subjectIds AS sid
+        MATCH (s:{LABEL_SUBJECT} {{id: sid}})
+        OPTIONAL MATCH (s)-[:{REL_MEMBER_OF}]->(g:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage}})
+        RETURN
+            s.id AS subjectId,
+            g.groupId AS groupId,
+            CASE WHEN g IS NULL THEN null ELSE size([(g)<-[:{REL_MEMBER_OF}]-(m) | m]) END AS groupSize
+        """
+        params = {"levelStage": str(levelStage), "subjectIds": subjectIds}
+        records = await self._read(cypher, params)
+        return [record.data() for record in records]
+
+    async def apply_group_plan(
+        self,
+        levelStage: str,
+        *,
+        newGroups: List[str],
+        merges: List[Dict[str, str]],
+        joins: List[Dict[str, str]],
+        batchSize: int = 5000,
+    ) -> None:
+        # pensado para correr dentro de write_unit: crear -> fusionar -> sumar miembros
+        levelStage = str(levelStage)
+
+        create_cypher = f"""
+        UNWIND $rows AS gid
+        CREATE (:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage, groupId: gid, createdAt: datetime()}})
+        """
+        merge_cypher = f"""
+        UNWIND $rows AS mg
+        MATCH (drop:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage, groupId: mg.from}})
+        MATCH (keep:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage, groupId: mg.to}})
+        OPTIONAL MATCH (m:{LABEL_SUBJECT})-[:{REL_MEMBER_OF}]->(drop)
+        WITH drop, keep, collect(m) AS members
+        FOREACH (m IN members | MERGE (m)-[:{REL_MEMBER_OF}]->(keep))
+        DETACH DELETE drop
+        """
+        join_cypher = f"""
+        UNWIND $rows AS j
+        MATCH (s:{LABEL_SUBJECT} {{id: j.subjectId}})
+        MATCH (g:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage, groupId: j.groupId}})
+        MERGE (s)-[r:{REL_MEMBER_OF}]->(g)
+        ON CREATE SET r.createdAt = datetime()
+        """
 
-        // si era ciclo (>=3), puenteo pred -> succ para mantener ciclo
-        FOREACH (_ IN CASE WHEN kind = 'CYCLE' THEN [1] ELSE [] END |
-            MERGE (pred)-[rnew:{REL_EQUIVALENT_TO} {{levelStage: $levelStage}}]->(succ)
-            ON CREATE SET rnew.createdAt = datetime()
-        )
+        for cypher, rows in ((create_cypher, newGroups), (merge_cypher, merges), (join_cypher, joins)):
+            for i in range(0, len(rows), batchSize):
+                await self._write(cypher, {"levelStage": levelStage, "rows": rows[i:i + batchSize]})
 
-        RETURN true AS deleted, kind AS kind, pred.id AS predecessorId, succ.id AS successorId, s.id AS removedId
+    async def unlink_equivalence_by_subject(self, subjectId: str, levelStage: str) -> Dict[str, Any]:
+        # saca la materia de su grupo; un grupo que queda con < 2 miembros se disuelve
+        cypher = f"""
+        MATCH (s:{LABEL_SUBJECT} {{id: $subjectId}})-[r:{REL_MEMBER_OF}]->(g:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage}})
+        DELETE r
+        WITH s, g, g.groupId AS groupId
+        OPTIONAL MATCH (rest:{LABEL_SUBJECT})-[:{REL_MEMBER_OF}]->(g)
+        WITH s, g, groupId, count(rest) AS remaining
+        FOREACH (_ IN CASE WHEN remaining < 2 THEN [1] ELSE [] END | DETACH DELETE g)
+        RETURN s.id AS removedId, groupId, remaining
         """
 
         params = {"subjectId": subjectId, "levelStage": str(levelStage)}
-        with self.driver.session() as session:
-            rec = session.run(cypher, params).single()
-
-            if rec is None:
-                # no tenía pred o succ en ese levelStage -> no pertenece a grupo
-                return {"deleted": False}
-
-            return {
-                "deleted": bool(rec["deleted"]),
-                "kind": rec["kind"],              # 'PAIR' o 'CYCLE'
-                "removedId": rec["removedId"],
-                "predecessorId": rec["predecessorId"],
-                "successorId": rec["successorId"],
-            }
-    
-    def are_equivalent_by_cycle(self, aId: str, bId: str, levelStage: str) -> bool:
-        cypher = f"""
-        MATCH (a:{LABEL_SUBJECT} {{id: $aId}})
-        MATCH (b:{LABEL_SUBJECT} {{id: $bId}})
+        rec = await self._write(cypher, params, single=True)
+
+        if rec is None:
+            # no pertenece a ningún grupo en ese levelStage
+            return {"deleted": False}
+
+        remaining = int(rec["remaining"])
+        return {
+            "deleted": True,
+            "kind": "PAIR" if remaining < 2 else "GROUP",   # PAIR => el grupo se disolvió
+            "removedId": rec["removedId"],
+            "groupId": rec["groupId"],
+            "remaining": remaining if remaining >= 2 else 0,
+        }
 
-        OPTIONAL MATCH p1 = (a)-[:{REL_EQUIVALENT_TO}*1..]->(b)
-        OPTIONAL MATCH p2 = (b)-[:{REL_EQUIVALENT_TO}*1..]->(a)
+    async def are_equivalent(self, aId: str, bId: str, levelStage: str) -> bool:
+        cypher = f"""
+        MATCH (:{LABEL_SUBJECT} {{id: $aId}})-[:{REL_MEMBER_OF}]->(g:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage}})
+        MATCH (:{LABEL_SUBJECT} {{id: $bId}})-[:{REL_MEMBER_OF}]->(g)
+        RETURN true AS equivalent
+        LIMIT 1
+        """
+        params = {"aId": aId, "bId": bId, "levelStage": str(levelStage)}
+        rec = await self._read(cypher, params, single=True)
+        return bool(rec) and bool(rec["equivalent"])
 
-        WITH p1, p2
-        WHERE p1 IS NOT NULL
-        AND p2 IS NOT NULL
-        AND ALL(r IN relationships(p1) WHERE toString(r.levelStage) = $levelStage)
-        AND ALL(r IN relationships(p2) WHERE toString(r.levelStage) = $levelStage)
+    # ---------- MIGRACIÓN: ciclos EQUIVALENT_TO -> grupos ----------
 
-        RETURN true AS equivalent
+    async def list_legacy_equivalence_pairs(self) -> List[Dict[str, Any]]:
+        cypher = f"""
+        MATCH (a:{LABEL_SUBJECT})-[r:{REL_EQUIVALENT_TO}]->(b:{LABEL_SUBJECT})
+        WHERE r.levelStage IS NOT NULL
+        RETURN toString(r.levelStage) AS levelStage, a.id AS a, b.id AS b
         """
-        params = {"aId": aId, "bId": bId, "levelStage": levelStage}
-        with self.driver.session() as session:
-            rec = session.run(cypher, params).single()
-            return bool(rec) and bool(rec["equivalent"])
+        records = await self._read(cypher)
+        return [record.data() for record in records]
 
+    async def delete_legacy_equivalences(self, levelStage: Optional[str] = None) -> int:
+        cypher = f"""
+        MATCH (:{LABEL_SUBJECT})-[r:{REL_EQUIVALENT_TO}]->(:{LABEL_SUBJECT})
+        WHERE $levelStage IS NULL OR toString(r.levelStage) = $levelStage
+        DELETE r
+        RETURN count(r) AS deleted
+        """
+        rec = await self._write(cypher, {"levelStage": levelStage}, single=True)
+        return int(rec["deleted"]) if rec else 0
+
+    # ---------- MIGRACIÓN: fechas ISO string -> date nativo ----------
+    # x = toString(x) solo es verdadero cuando x ya es un string: las ya migradas no se tocan
+
+    _STRING_DATES = """
+        MATCH ()-[r:{rel}]->()
+        WHERE r.startDate = toString(r.startDate) OR r.endDate = toString(r.endDate)
+    """
+
+    async def count_string_dates(self, relType: str) -> int:
+        cypher = self._STRING_DATES.format(rel=relType) + "RETURN count(r) AS pending"
+        rec = await self._read(cypher, single=True)
+        return int(rec["pending"]) if rec else 0
+
+    async def convert_string_dates(self, relType: str, batchSize: int = 10000) -> None:
+        # CALL ... IN TRANSACTIONS necesita transacción implícita (session.run), no execute_write
+        cypher = self._STRING_DATES.format(rel=relType) + """
+        CALL {
+            WITH r
+            SET r.startDate = date(r.startDate),
+                r.endDate = CASE WHEN r.endDate = "" THEN null ELSE date(r.endDate) END
+        } IN TRANSACTIONS OF $batchSize ROWS
+        """
+        async with self.driver.session() as session:
+            result = await session.run(cypher, {"batchSize": batchSize})
+            await result.consume()
 
     # ---------- QUERIES (READ) ----------
 
-    def get_student_subjects(self, studentMongoId: str) -> List[Dict[str, Any]]:
+    async def get_student_subjects(self, studentMongoId: str) -> List[Dict[str, Any]]:
         cypher = f"""
         MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})-[r:{REL_TOOK}]->(sub:{LABEL_SUBJECT})
-        RETURN sub.id AS subjectId, sub, r
-        ORDER BY coalesce(r.startDate, "") DESC
-        """
-        with self.driver.session() as session:
-            results = session.run(cypher, {"studentMongoId": studentMongoId})
-            out: List[Dict[str, Any]] = []
-            for rec in results:
-                out.append({
-                    "subject": {"id": str(rec["subjectId"]), **dict(rec["sub"])},
-                    "took": dict(rec["r"])
-                })
-            return out
-
-    # ESTE TE PIDE LA LEVELSTAGE PARA DARTE TODAS LAS MATERIAS EQUIVALENTES DEL GRUPO QUE PERTENECE A UNA MATERIA    
-    def get_equivalences_group(self, subjectId: str, levelStage: str) -> List[Dict[str, Any]]:
+        RETURN sub.id AS subjectId, sub,
+            r {{.*, startDate: toString(r.startDate), endDate: toString(r.endDate)}} AS r
+        ORDER BY r.startDate DESC
+        """
+        records = await self._read(cypher, {"studentMongoId": studentMongoId})
+        out: List[Dict[str, Any]] = []
+        for rec in records:
+            out.append({
+                "subject": {"id": str(rec["subjectId"]), **dict(rec["sub"])},
+                "took": dict(rec["r"])
+            })
+        return out
+
+    # ESTE TE PIDE LA LEVELSTAGE PARA DARTE TODAS LAS MATERIAS EQUIVALENTES DEL GRUPO QUE PERTENECE A UNA MATERIA
+    # (sin grupo => solo la materia misma)
+    async def get_equivalences_group(self, subjectId: str, levelStage: str) -> List[Dict[str, Any]]:
         cypher = f"""
         MATCH (s:{LABEL_SUBJECT} {{id: $subjectId}})
-        MATCH p = (s)-[:{REL_EQUIVALENT_TO}*0..]-(eq:{LABEL_SUBJECT})
-        WHERE ALL(r IN relationships(p) WHERE toString(r.levelStage) = toString($levelStage))
-        RETURN DISTINCT
+        OPTIONAL MATCH (s)-[:{REL_MEMBER_OF}]->(g:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage}})
+        // patrón aparte: en uno solo la relación de s no se puede reusar y s quedaría fuera de su grupo
+        OPTIONAL MATCH (g)<-[:{REL_MEMBER_OF}]-(m:{LABEL_SUBJECT})
+        WITH s, collect(DISTINCT m) AS members
+        UNWIND CASE WHEN size(members) = 0 THEN [s] ELSE members END AS eq
+        RETURN
             eq.id AS id,
             eq.name AS name,
             eq.institutionMongoId AS institutionMongoId
         ORDER BY coalesce(name, "") ASC
         """
-        params = {"subjectId": subjectId, "levelStage": levelStage}
-        with self.driver.session() as session:
-            res = session.run(cypher, params)
-            return [dict(r) for r in res]
+        params = {"subjectId": subjectId, "levelStage": str(levelStage)}
+        records = await self._read(cypher, params)
+        return [dict(r) for r in records]
 
 
-    def get_institutions_by_student(self, studentId: str):
+    async def get_institutions_by_student(self, studentId: str):
         query = """
         MATCH (s:Student {mongoId: $studentId})-[e:STUDIES_AT]->(i:Institution)
         RETURN
         i.mongoId AS institutionId,
-        e.startDate AS startDate,
-        e.endDate AS endDate
+        toString(e.startDate) AS startDate,
+        toString(e.endDate) AS endDate
         ORDER BY e.startDate ASC
         """
 
-        with self.driver.session() as session:
-            result = session.run(query, studentId=studentId)
-            return [record.data() for record in result]
+        records = await self._read(query, {"studentId": studentId})
+        return [record.data() for record in records]
 
-    def get_student_subject_took(self, studentMongoId: str, subjectId: str) -> Dict[str, Any]: # datos de la relacion estudiante materia
+    async def get_student_subject_took(self, studentMongoId: str, subjectId: str) -> Dict[str, Any]: # datos de la relacion estudiante materia
         cypher = f"""
         MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})-[r:{REL_TOOK}]->(sub:{LABEL_SUBJECT} {{id: $subjectId}})
-        RETURN s, sub, r
+        RETURN s, sub, r {{.*, startDate: toString(r.startDate), endDate: toString(r.endDate)}} AS r
         """
         params = {"studentMongoId": studentMongoId, "subjectId": subjectId}
-        with self.driver.session() as session:
-            rec = session.run(cypher, params).single()
-            if rec is None:
-                return {"found": False}
-            return {
-                "found": True,
-                "student": dict(rec["s"]),
-                "subject": {"id": str(rec["sub"]["id"]), **dict(rec["sub"])},
-                "took": dict(rec["r"]),  # startDate, endDate, grade
-            }
+        rec = await self._read(cypher, params, single=True)
+        if rec is None:
+            return {"found": False}
+        return {
+            "found": True,
+            "student": dict(rec["s"]),
+            "subject": {"id": str(rec["sub"]["id"]), **dict(rec["sub"])},
+            "took": dict(rec["r"]),  # startDate, endDate, grade
+        }
         
-    def get_subjects_by_institution(self, institutionMongoId: str) -> List[Dict[str, Any]]:
+    async def get_subjects_by_institution(self, institutionMongoId: str) -> List[Dict[str, Any]]:
         cypher = f"""
         MATCH (sub:{LABEL_SUBJECT} {{institutionMongoId: $institutionMongoId}})
         RETURN sub.id AS id, sub.name AS name, sub.institutionMongoId AS institutionMongoId
         ORDER BY toLower(sub.name) ASC
         """
-        with self.driver.session() as session:
-            res = session.run(cypher, {"institutionMongoId": institutionMongoId})
-            return [dict(r) for r in res]
+        records = await self._read(cypher, {"institutionMongoId": institutionMongoId})
+        return [dict(r) for r in records]
 
-    def get_students_by_institution(self, institutionMongoId: str) -> list[str]:
-        query = """
-        MATCH (s:Student)-[:STUDIES_AT]->(i:Institution {mongoId: $institutionMongoId})
-        RETURN DISTINCT s.mongoId AS studentMongoId
+    async def search_subjects(
+        self,
+        text: str,
+        institutionMongoId: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        query = _subject_fulltext_query(text, institutionMongoId)
+        if not query:
+            return []
+        cypher = """
+        CALL db.index.fulltext.queryNodes($index, $query) YIELD node, score
+        RETURN node.id AS id, node.name AS name, node.institutionMongoId AS institutionMongoId, score
+        ORDER BY score DESC, toLower(name) ASC, id ASC
+        SKIP $skip
+        LIMIT $limit
         """
-        with self.driver.session() as session:
-            result = session.run(query, institutionMongoId=institutionMongoId)
-            return [record["studentMongoId"] for record in result]
-        
-    def get_student_history_rows(self, studentMongoId: str) -> List[Dict[str, Any]]:
+        params = {"index": SUBJECT_FULLTEXT_INDEX, "query": query, "skip": skip, "limit": limit}
+        records = await self._read(cypher, params)
+        return [record.data() for record in records]
+
+    # alumnos con STUDIES_AT activo en [dateFrom, dateTo] (sin fechas: todos los que alguna vez estudiaron)
+    # comparaciones directas sobre date nativo: e.startDate <= $dateTo puede resolverse con studies_at_start
+    _ROSTER_MATCH = f"""
+        MATCH (s:{LABEL_STUDENT})-[e:{REL_STUDIES_AT}]->(i:{LABEL_INSTITUTION} {{mongoId: $institutionMongoId}})
+        WHERE ($dateTo IS NULL OR e.startDate <= $dateTo)
+          AND ($dateFrom IS NULL OR e.endDate IS NULL OR e.endDate >= $dateFrom)
+    """
+
+    async def get_students_by_institution(
+        self,
+        institutionMongoId: str,
+        after: Optional[str] = None,
+        limit: int = 50,
+        dateFrom: Optional[str] = None,
+        dateTo: Optional[str] = None,
+    ) -> list[str]:
+        # keyset sobre mongoId: la página sale de Neo4j, Mongo hidrata solo esos ids
+        query = self._ROSTER_MATCH + """
+          AND ($after IS NULL OR s.mongoId > $after)
+        WITH DISTINCT s.mongoId AS studentMongoId
+        RETURN studentMongoId
+        ORDER BY studentMongoId ASC
+        LIMIT $limit
+        """
+        params = {
+            "institutionMongoId": institutionMongoId,
+            "after": after,
+            "limit": limit,
+            "dateFrom": _as_date(dateFrom, "dateFrom"),
+            "dateTo": _as_date(dateTo, "dateTo"),
+        }
+        records = await self._read(query, params)
+        return [record["studentMongoId"] for record in records]
+
+    async def count_students_by_institution(
+        self,
+        institutionMongoId: str,
+        dateFrom: Optional[str] = None,
+        dateTo: Optional[str] = None,
+    ) -> int:
+        query = self._ROSTER_MATCH + """
+        RETURN count(DISTINCT s) AS total
+        """
+        params = {
+            "institutionMongoId": institutionMongoId,
+            "dateFrom": _as_date(dateFrom, "dateFrom"),
+            "dateTo": _as_date(dateTo, "dateTo"),
+        }
+        rec = await self._read(query, params, single=True)
+        return int(rec["total"]) if rec else 0
+
+    async def get_student_history_rows(self, studentMongoId: str) -> List[Dict[str, Any]]:
         cypher = f"""
         MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})
 
         MATCH (s)-[e:{REL_STUDIES_AT}]->(i:{LABEL_INSTITUTION})
 
+        // solapamiento de intervalos sobre date nativo (endDate null = abierto)
         OPTIONAL MATCH (s)-[r:{REL_TOOK}]->(sub:{LABEL_SUBJECT})
-
-        WITH
-            i, e, r, sub,
-            date(e.startDate) AS instFrom,
-            coalesce(date(e.endDate), date("9999-12-31")) AS instTo,
-            CASE WHEN r IS NULL THEN null ELSE date(r.startDate) END AS subFrom,
-            CASE WHEN r IS NULL THEN null ELSE coalesce(date(r.endDate), date("9999-12-31")) END AS subTo,
-            e.startDate AS institutionStartDate,
-            e.endDate   AS institutionEndDate,
-            r.startDate AS subjectStartDate,
-            r.endDate   AS subjectEndDate
-
-        WHERE r IS NULL OR (instFrom <= subTo AND subFrom <= instTo)
+        WHERE (e.endDate IS NULL OR r.startDate <= e.endDate)
+          AND (r.endDate IS NULL OR e.startDate <= r.endDate)
 
         RETURN
             elementId(e) AS enrollmentId,
             i.mongoId AS institutionMongoId,
-            institutionStartDate,
-            institutionEndDate,
+            toString(e.startDate) AS institutionStartDate,
+            toString(e.endDate) AS institutionEndDate,
             sub.id AS subjectId,
             sub.name AS subjectName,
-            subjectStartDate,
-            subjectEndDate
-        ORDER BY institutionMongoId, enrollmentId, subjectStartDate ASC
+            toString(r.startDate) AS subjectStartDate,
+            toString(r.endDate) AS subjectEndDate
+        ORDER BY institutionMongoId, enrollmentId, r.startDate ASC
         """
 
-        with self.driver.session() as session:
-            res = session.run(cypher, {"studentMongoId": studentMongoId})
-            return [record.data() for record in res]
+        records = await self._read(cypher, {"studentMongoId": studentMongoId})
+        return [record.data() for record in records]
         
-    def get_student_enrollments(self, studentMongoId: str) -> list[dict]:
+    async def get_student_enrollments(self, studentMongoId: str) -> list[dict]:
         cypher = f"""
         MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})-[e:{REL_STUDIES_AT}]->(i:{LABEL_INSTITUTION})
         RETURN
         elementId(e) AS enrollmentId,
         i.mongoId AS institutionMongoId,
-        e.startDate AS institutionStartDate,
-        e.endDate AS institutionEndDate
-        ORDER BY institutionStartDate ASC
+        toString(e.startDate) AS institutionStartDate,
+        toString(e.endDate) AS institutionEndDate
+        ORDER BY e.startDate ASC
         """
-        with self.driver.session() as session:
-            res = session.run(cypher, {"studentMongoId": studentMongoId})
-            return [record.data() for record in res]
+        records = await self._read(cypher, {"studentMongoId": studentMongoId})
+        return [record.data() for record in records]
         
-    def get_student_subject_rows(self, studentMongoId: str) -> list[dict]:
+    async def get_student_subject_rows(self, studentMongoId: str) -> list[dict]:
         cypher = f"""
         MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})-[r:{REL_TOOK}]->(sub:{LABEL_SUBJECT})
         RETURN
         sub.id AS subjectId,
         sub.name AS subjectName,
         sub.institutionMongoId AS institutionMongoId,
-        r.startDate AS subjectStartDate,
-        r.endDate AS subjectEndDate,
+        toString(r.startDate) AS subjectStartDate,
+        toString(r.endDate) AS subjectEndDate,
         r.grade AS grade
-        ORDER BY subjectStartDate ASC
+        ORDER BY r.startDate ASC
         """
-        with self.driver.session() as session:
-            res = session.run(cypher, {"studentMongoId": studentMongoId})
-            return [record.data() for record in res]
+        records = await self._read(cypher, {"studentMongoId": studentMongoId})
+        return [record.data() for record in records]
     
-    def get_subjects_by_ids(self, subjectIds: list[str]) -> list[dict]:
+    # ---------- TRANSFERENCIAS ----------
+
+    async def get_transfer_matches(
+        self,
+        studentMongoId: str,
+        targetInstitutionMongoId: str,
+        levelStage: str,
+    ) -> List[Dict[str, Any]]:
+        # materias cursadas (TOOK) fuera de la institución destino -> su grupo en ese levelStage
+        # -> materias de la institución destino en el mismo grupo; todo en una sola query
+        cypher = f"""
+        MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})-[t:{REL_TOOK}]->(src:{LABEL_SUBJECT})
+        WHERE src.institutionMongoId <> $targetInstitutionMongoId
+        MATCH (src)-[:{REL_MEMBER_OF}]->(g:{LABEL_EQUIVALENCE_GROUP} {{levelStage: $levelStage}})
+              <-[:{REL_MEMBER_OF}]-(dst:{LABEL_SUBJECT} {{institutionMongoId: $targetInstitutionMongoId}})
+        RETURN
+            src.id AS sourceSubjectId,
+            src.name AS sourceSubjectName,
+            src.institutionMongoId AS sourceInstitutionId,
+            t.grade AS grade,
+            toString(t.startDate) AS startDate,
+            toString(t.endDate) AS endDate,
+            dst.id AS targetSubjectId,
+            dst.name AS targetSubjectName,
+            g.groupId AS groupId
+        ORDER BY toLower(dst.name) ASC, t.startDate ASC
+        """
+        params = {
+            "studentMongoId": studentMongoId,
+            "targetInstitutionMongoId": targetInstitutionMongoId,
+            "levelStage": str(levelStage),
+        }
+        records = await self._read(cypher, params)
+        return [record.data() for record in records]
+
+    # ---------- HISTORIAL EN LOTE (un UNWIND por tipo de fila) ----------
+
+    async def get_enrollments_for_students(self, studentMongoIds: list[str]) -> list[dict]:
+        if not studentMongoIds:
+            return []
+        cypher = f"""
+        UNWIND $studentMongoIds AS sid
+        MATCH (s:{LABEL_STUDENT} {{mongoId: sid}})-[e:{REL_STUDIES_AT}]->(i:{LABEL_INSTITUTION})
+        RETURN
+        sid AS studentMongoId,
+        elementId(e) AS enrollmentId,
+        i.mongoId AS institutionMongoId,
+        toString(e.startDate) AS institutionStartDate,
+        toString(e.endDate) AS institutionEndDate
+        ORDER BY studentMongoId, e.startDate ASC
+        """
+        records = await self._read(cypher, {"studentMongoIds": studentMongoIds})
+        return [record.data() for record in records]
+
+    async def get_subject_rows_for_students(self, studentMongoIds: list[str]) -> list[dict]:
+        if not studentMongoIds:
+            return []
+        cypher = f"""
+        UNWIND $studentMongoIds AS sid
+        MATCH (s:{LABEL_STUDENT} {{mongoId: sid}})-[r:{REL_TOOK}]->(sub:{LABEL_SUBJECT})
+        RETURN
+        sid AS studentMongoId,
+        sub.id AS subjectId,
+        sub.name AS subjectName,
+        sub.institutionMongoId AS institutionMongoId,
+        toString(r.startDate) AS subjectStartDate,
+        toString(r.endDate) AS subjectEndDate,
+        r.grade AS grade
+        ORDER BY studentMongoId, r.startDate ASC
+        """
+        records = await self._read(cypher, {"studentMongoIds": studentMongoIds})
+        return [record.data() for record in records]
+
+    async def get_subjects_by_ids(self, subjectIds: list[str]) -> list[dict]:
         if not subjectIds:
             return []
 
@@ -434,12 +904,11 @@ class Neo4jGraphRepository:
         WHERE sub.id IN $subjectIds
         RETURN sub.id AS id, sub.name AS name
         """
-        with self.driver.session() as session:
-            res = session.run(cypher, {"subjectIds": subjectIds})
-            return [dict(r) for r in res]
+        records = await self._read(cypher, {"subjectIds": subjectIds})
+        return [dict(r) for r in records]
 
 
-    def get_subjects_by_institution_student_interval(
+    async def get_subjects_by_institution_student_interval(
         self,
         institutionMongoId: str,
         studentMongoId: str,
@@ -450,14 +919,11 @@ class Neo4jGraphRepository:
         MATCH (s:{LABEL_STUDENT} {{mongoId: $studentMongoId}})
         MATCH (i:{LABEL_INSTITUTION} {{mongoId: $institutionMongoId}})
         MATCH (s)-[e:{REL_STUDIES_AT}]->(i)
+        WHERE e.startDate <= coalesce($dateTo, date())
+          AND coalesce(e.endDate, date()) >= $dateFrom
 
-        WITH i, e,
-            date($dateFrom) AS qFrom,
-            coalesce(date($dateTo), date()) AS qTo,
-            date(e.startDate) AS eFrom,
-            coalesce(date(e.endDate), date()) AS eTo
-        WHERE eFrom <= qTo AND qFrom <= eTo
-
+        // con varias inscripciones solapadas la materia no debe repetirse
+        WITH DISTINCT i
         MATCH (sub:{LABEL_SUBJECT} {{institutionMongoId: $institutionMongoId}})
         RETURN sub.id AS id, sub.name AS name, sub.institutionMongoId AS institutionMongoId
         ORDER BY toLower(sub.name) ASC
@@ -466,15 +932,14 @@ class Neo4jGraphRepository:
         params = {
             "studentMongoId": studentMongoId,
             "institutionMongoId": institutionMongoId,
-            "dateFrom": dateFrom,
-            "dateTo": dateTo,
+            "dateFrom": _as_date(dateFrom, "dateFrom"),
+            "dateTo": _as_date(dateTo, "dateTo"),
         }
 
-        with self.driver.session() as session:
-            res = session.run(cypher, params)
-            return [dict(r) for r in res]
+        records = await self._read(cypher, params)
+        return [dict(r) for r in records]
         
-    def get_subjects_by_institution_student(
+    async def get_subjects_by_institution_student(
         self,
         institutionMongoId: str,
         studentMongoId: str,
@@ -504,6 +969,5 @@ class Neo4jGraphRepository:
             "institutionMongoId": institutionMongoId,
         }
 
-        with self.driver.session() as session:
-            res = session.run(cypher, params)
-            return [dict(r) for r in res]
\ No newline at end of file
+        records = await self._read(cypher, params)
+        return [dict(r) for r in records]
\ No newline at end of file
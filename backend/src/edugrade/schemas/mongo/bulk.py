@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from typing import Optional
+from pydantic import BaseModel, Field
+
+BULK_MAX_ITEMS = 5000
+
+ITEM_CREATED = "CREATED"
+ITEM_DUPLICATE = "DUPLICATE"
+ITEM_ERROR = "ERROR"
+
+
+class BulkItemOut(BaseModel):
+  index: int
+  status: str
+  id: Optional[str] = None
+  error: Optional[str] = None
+
+
+class BulkCreateOut(BaseModel):
+  total: int
+  created: int
+  failed: int
+  items: list[BulkItemOut] = Field(default_factory=list)
@@ -39,4 +39,29 @@ class ConversionRuleOut(BaseModel):
     grade: str
     validFrom: date
     validTo: date | None = None
-    map: dict[str, str]
\ No newline at end of file
+    map: dict[str, str]
+
+class GradeRange(BaseModel):
+    min: str = Field(min_length=1, max_length=10)
+    max: str = Field(min_length=1, max_length=10)
+
+
+class ConversionRuleDraft(BaseModel):
+    direction: str = Field(default="TO_ZA", pattern="^(TO_ZA|FROM_ZA)$")
+    system: str = Field(min_length=1, max_length=50)
+    country: str = Field(default="ANY", min_length=2, max_length=80)
+    grade: GradeRange = Field(default_factory=lambda: GradeRange(min="0", max="99"))
+    validFrom: date
+    map: dict[str, str]
+
+    @field_validator("system", "country")
+    @classmethod
+    def _strip_fields(cls, v: str):
+        return non_empty_str(v)
+
+    @field_validator("map")
+    @classmethod
+    def _validate_map(cls, v: dict[str, str]):
+        if not v:
+            raise ValueError("map must not be empty")
+        return {non_empty_str(k): non_empty_str(val) for k, val in v.items()}
@@ -1,12 +1,16 @@
 from datetime import date
 from pydantic import BaseModel, Field, ConfigDict
 from edugrade.core.mongo_types import PyObjectId
+from edugrade.schemas.mongo.bulk import BULK_MAX_ITEMS
 
 class InstitutionCreate(BaseModel):
     name: str = Field(min_length=1, max_length=200)
     country: str = Field(min_length=2, max_length=80)
     address: str = Field(min_length=1, max_length=250)
 
+class InstitutionBulkCreate(BaseModel):
+    items: list[InstitutionCreate] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
 class InstitutionOut(BaseModel):
     model_config = ConfigDict(
       populate_by_name=True,
@@ -18,6 +22,11 @@ class InstitutionOut(BaseModel):
     country: str
     address: str
     
+class InstitutionSuggestOut(BaseModel):
+    id: str
+    name: str
+    country: str
+
 class StudentInstitutionOut(BaseModel):
     institution: InstitutionOut
     startDate: date | None = None
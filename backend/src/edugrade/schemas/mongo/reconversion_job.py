@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, ConfigDict, field_validator
+
+from edugrade.core.mongo_types import PyObjectId
+from edugrade.utils.string import non_empty_str
+
+
+class ReconversionJobCreate(BaseModel):
+  system: str = Field(min_length=1, max_length=50)
+  country: Optional[str] = Field(default=None, min_length=2, max_length=80)
+  dateFrom: Optional[date] = None
+  dateTo: Optional[date] = None
+
+  @field_validator("system")
+  @classmethod
+  def _strip_system(cls, v: str):
+    return non_empty_str(v, "system")
+
+
+class ReconversionCheckpoint(BaseModel):
+  model_config = ConfigDict(arbitrary_types_allowed=True)
+
+  date: datetime
+  lastId: PyObjectId
+
+
+class ReconversionJobOut(BaseModel):
+  model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
+
+  id: PyObjectId = Field(alias="_id")
+  status: str
+  system: str
+  country: Optional[str] = None
+  dateFrom: Optional[datetime] = None
+  dateTo: Optional[datetime] = None
+
+  total: int = 0
+  scanned: int = 0
+  updated: int = 0
+  failed: int = 0
+  checkpoint: Optional[ReconversionCheckpoint] = None
+
+  error: Optional[str] = None
+  createdAt: datetime
+  startedAt: Optional[datetime] = None
+  finishedAt: Optional[datetime] = None
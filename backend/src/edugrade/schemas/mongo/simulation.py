@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class SimulationAverage(BaseModel):
+  examsRead: int = 0
+  examsUsedInAverage: int = 0
+  averageZA: Optional[float] = None
+
+
+class SubjectSimulationOut(BaseModel):
+  subjectId: str
+  examsMatched: int = 0
+  before: SimulationAverage
+  after: SimulationAverage
+
+
+class InstitutionSimulationOut(BaseModel):
+  institutionId: str
+  examsMatched: int = 0
+  before: SimulationAverage
+  after: SimulationAverage
+  subjects: list[SubjectSimulationOut] = Field(default_factory=list)
+
+
+class SimulationOut(BaseModel):
+  system: str
+  country: str
+  examsMatched: int = 0
+  examsChanged: int = 0
+  examsNotConvertible: int = 0
+  # en el rango del borrador pero seguirían con otra regla (más nueva): no cuentan en los promedios
+  examsShadowed: int = 0
+  institutions: list[InstitutionSimulationOut] = Field(default_factory=list)
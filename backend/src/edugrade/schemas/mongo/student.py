@@ -1,6 +1,7 @@
 from datetime import date
 from pydantic import BaseModel, Field, ConfigDict
 from edugrade.core.mongo_types import PyObjectId
+from edugrade.schemas.mongo.bulk import BULK_MAX_ITEMS
 
 class StudentCreate(BaseModel):
   identity: str | None = Field(default=None, min_length=3, max_length=20)
@@ -9,6 +10,14 @@ class StudentCreate(BaseModel):
   birthDate: date
   nationality: str = Field(min_length=2, max_length=80)
 
+class StudentBulkCreate(BaseModel):
+  items: list[StudentCreate] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+HISTORY_BATCH_MAX_IDS = 10000
+
+class StudentHistoryBatchIn(BaseModel):
+  studentIds: list[str] = Field(min_length=1, max_length=HISTORY_BATCH_MAX_IDS)
+
 class StudentOut(BaseModel):
   model_config = ConfigDict(
     populate_by_name=True,
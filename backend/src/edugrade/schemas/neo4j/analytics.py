@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class TransferFlowOut(BaseModel):
+    fromInstitutionId: str
+    fromInstitutionName: Optional[str] = None   # de Mongo
+    toInstitutionId: str
+    toInstitutionName: Optional[str] = None
+    year: Optional[int] = None   # null = suma de todos los años
+    count: int
@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 
+EQUIVALENCE_BULK_MAX_PAIRS = 50000
+
 ''' S (Student) -> I (Institution) '''
 # ambos id son de mongo, acá se usan como str
 
@@ -30,6 +32,27 @@ class EquivalentToIn(BaseModel):
     toSubjectId: str     # UUID (Subject.id)
     levelStage: str         # ej "19"    
 
+class EquivalencePairIn(BaseModel):
+    fromSubjectId: str
+    toSubjectId: str
+
+class EquivalenceBulkIn(BaseModel):
+    levelStage: str = Field(min_length=1)
+    pairs: list[EquivalencePairIn] = Field(min_length=1, max_length=EQUIVALENCE_BULK_MAX_PAIRS)
+
+class EquivalenceBulkSkipped(BaseModel):
+    index: int
+    reason: str
+
+class EquivalenceBulkOut(BaseModel):
+    levelStage: str
+    pairs: int
+    applied: int
+    groupsCreated: int
+    groupsMerged: int
+    subjectsJoined: int
+    skipped: list[EquivalenceBulkSkipped] = []
+
 class EquivalentRemoveIn(BaseModel):
     subjectId: str
     levelStage: str  # "19"
@@ -10,3 +10,7 @@ class SubjectOut(BaseModel):
     name: str
     institutionMongoId: str
 
+class SubjectSearchOut(SubjectOut):
+    institutionName: Optional[str] = None   # de Mongo
+    score: float                            # relevancia de Lucene; solo sirve para ordenar
+
@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class TransferMatchOut(BaseModel):
+    sourceSubjectId: str
+    sourceSubjectName: Optional[str] = None
+    sourceInstitutionId: Optional[str] = None
+    targetSubjectId: str
+    targetSubjectName: Optional[str] = None
+    groupId: str
+    grade: Optional[str] = None        # nota registrada en TOOK
+    startDate: Optional[str] = None
+    endDate: Optional[str] = None
+    # promedio de exámenes (Mongo) de la materia de origen, en ZA y proyectado a targetSystem
+    examsUsedInAverage: int = 0
+    averageZA: Optional[float] = None
+    displayValue: Optional[str] = None
+    displaySystem: Optional[str] = None
+
+class TransferOut(BaseModel):
+    studentId: str
+    targetInstitutionId: str
+    levelStage: str
+    matches: list[TransferMatchOut] = Field(default_factory=list)
@@ -0,0 +1,77 @@
+''' plan de grupos de equivalencia (EquivalenceGroup + MEMBER_OF) a partir de pares de materias '''
+
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass, field
+
+from edugrade.utils.union_find import UnionFind
+
+
+@dataclass
+class GroupPlan:
+    new_groups: list[str] = field(default_factory=list)    # groupIds a crear
+    merges: list[dict] = field(default_factory=list)       # {"from": groupId, "to": groupId}; "from" se borra
+    joins: list[dict] = field(default_factory=list)        # {"subjectId", "groupId"} sin grupo previo
+    group_of: dict[str, str] = field(default_factory=dict)  # subjectId -> groupId final (solo los tocados)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.new_groups or self.merges or self.joins)
+
+
+def plan_groups(
+    pairs: list[tuple[str, str]],
+    memberships: dict[str, str | None],
+    group_sizes: dict[str, int],
+) -> GroupPlan:
+    """
+    Componentes conexas en memoria (union-find) sobre materias y grupos existentes.
+    memberships: subjectId -> groupId actual (o None) de las materias de los pares.
+    Por componente se conserva el grupo existente más grande; los demás se fusionan en él.
+    """
+    uf = UnionFind()
+    for sid, gid in memberships.items():
+        uf.add(("s", sid))
+        if gid:
+            uf.union(("s", sid), ("g", gid))
+    for a, b in pairs:
+        uf.union(("s", a), ("s", b))
+
+    plan = GroupPlan()
+    for component in uf.groups():
+        subjects = [key for kind, key in component if kind == "s"]
+        groups = [key for kind, key in component if kind == "g"]
+        if len(subjects) < 2 and not groups:
+            continue
+
+        if groups:
+            keep = max(groups, key=lambda g: (group_sizes.get(g, 0), g))
+        else:
+            keep = str(uuid.uuid4())
+            plan.new_groups.append(keep)
+
+        plan.merges.extend({"from": g, "to": keep} for g in groups if g != keep)
+        for sid in subjects:
+            if memberships.get(sid) is None:
+                plan.joins.append({"subjectId": sid, "groupId": keep})
+            plan.group_of[sid] = keep
+
+    return plan
+
+
+async def apply_equivalence_pairs(repo, levelStage: str, pairs: list[tuple[str, str]], memberships: list[dict]) -> GroupPlan:
+    # repo debe estar dentro de write_unit: lectura de membresías + plan + escritura en la misma tx
+    plan = plan_groups(
+        pairs,
+        {m["subjectId"]: m.get("groupId") for m in memberships},
+        {m["groupId"]: int(m.get("groupSize") or 0) for m in memberships if m.get("groupId")},
+    )
+    if not plan.is_empty:
+        await repo.apply_group_plan(
+            levelStage,
+            newGroups=plan.new_groups,
+            merges=plan.merges,
+            joins=plan.joins,
+        )
+    return plan
@@ -0,0 +1,76 @@
+''' historial armado por alumno, cacheado en Redis (JSON serializado + ETag) '''
+
+from __future__ import annotations
+
+import hashlib
+from datetime import date
+from typing import Any
+
+from edugrade.config import settings
+
+VERSION_KEY = "students:history:ver:{id}"
+# day: las inscripciones abiertas se cierran en "hoy" al armar el historial; otro día = otra entrada
+BODY_KEY = "students:history:{id}:{ver}:{day}"
+
+
+def etag_for(body: bytes) -> str:
+  return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+  # If-None-Match puede traer varios tags, débiles (W/) o "*"
+  tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+  return "*" in tags or etag in tags
+
+
+class StudentHistoryCache:
+  """
+  La key del historial incluye una versión por alumno; invalidar = INCR de esa versión.
+  Un historial calculado con datos viejos queda guardado bajo la versión anterior
+  (nadie lo vuelve a leer y vence por TTL), así que no hay carrera lectura/escritura.
+  """
+
+  def __init__(self, redis: Any = None):
+    self.redis = redis
+
+  async def version(self, student_id: str) -> str | None:
+    if self.redis is None:
+      return None
+    try:
+      return await self.redis.get(VERSION_KEY.format(id=student_id)) or "0"
+    except Exception as e:
+      print(f"[cache] history version FAILED: {type(e).__name__}: {e}")
+      return None
+
+  async def get(self, student_id: str, version: str | None, day: date) -> tuple[str, bytes] | None:
+    if self.redis is None or version is None:
+      return None
+    try:
+      # redis con decode_responses: el body se guarda como str
+      etag, body = await self.redis.hmget(BODY_KEY.format(id=student_id, ver=version, day=day.isoformat()), "etag", "body")
+    except Exception as e:
+      print(f"[cache] history get FAILED: {type(e).__name__}: {e}")
+      return None
+    if etag is None or body is None:
+      return None
+    return etag, body.encode("utf-8")
+
+  async def set(self, student_id: str, version: str | None, day: date, etag: str, body: bytes) -> None:
+    if self.redis is None or version is None:
+      return
+    key = BODY_KEY.format(id=student_id, ver=version, day=day.isoformat())
+    try:
+      async with self.redis.pipeline(transaction=False) as pipe:
+        pipe.hset(key, mapping={"etag": etag, "body": body.decode("utf-8")})
+        pipe.expire(key, settings.student_history_cache_ttl_seconds)
+        await pipe.execute()
+    except Exception as e:
+      print(f"[cache] history set FAILED: {type(e).__name__}: {e}")
+
+  async def invalidate(self, student_id: str) -> None:
+    if self.redis is None:
+      return
+    try:
+      await self.redis.incr(VERSION_KEY.format(id=student_id))
+    except Exception as e:
+      print(f"[cache] history invalidate FAILED: {type(e).__name__}: {e}")
@@ -0,0 +1,26 @@
+from edugrade.repository.mongo.bulk import DUPLICATE_KEY
+from edugrade.schemas.mongo.bulk import ITEM_CREATED, ITEM_DUPLICATE, ITEM_ERROR
+
+
+def bulk_report(docs: list[dict], errors: dict[int, dict]) -> dict:
+  # resultado por item, en el orden del request
+  items: list[dict] = []
+  for i, doc in enumerate(docs):
+    err = errors.get(i)
+    if err is None:
+      items.append({"index": i, "status": ITEM_CREATED, "id": str(doc["_id"])})
+    elif err.get("code") == DUPLICATE_KEY:
+      items.append({"index": i, "status": ITEM_DUPLICATE, "error": "Duplicate key"})
+    else:
+      items.append({"index": i, "status": ITEM_ERROR, "error": str(err.get("errmsg", "write error"))[:200]})
+
+  return {
+    "total": len(docs),
+    "created": len(docs) - len(errors),
+    "failed": len(errors),
+    "items": items,
+  }
+
+
+def created_ids(report: dict) -> list[str]:
+  return [it["id"] for it in report["items"] if it["status"] == ITEM_CREATED]
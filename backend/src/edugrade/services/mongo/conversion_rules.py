@@ -5,6 +5,7 @@ from fastapi import HTTPException
 
 from edugrade.repository.mongo.conversion_rule import ConversionRuleRepository
 from edugrade.repository.mongo.options import OptionsRepository
+from edugrade.utils.date import as_naive_utc
 from edugrade.utils.string import normalize_value_key
 
 
@@ -54,11 +55,7 @@ class ConversionRulesService:
       when=when,
     )
 
-    key = normalize_value_key(value)
-    mapping: dict[str, str] = rule.get("map", {})
-    if key not in mapping:
-      raise HTTPException(status_code=422, detail=f"Value '{key}' not convertible for this rule")
-    return str(mapping[key])
+    return self.map_to_za(rule.get("map", {}), value)
 
   async def convert_from_za(
     self,
@@ -77,7 +74,52 @@ class ConversionRulesService:
       when=when,
     )
 
-    mapping: dict[str, str] = rule.get("map", {})
+    return self.map_from_za(rule.get("map", {}), value_za, to_system)
+
+  # ---------- conversión en memoria (sin ir a Mongo por cada valor) ----------
+
+  async def load_rules(self, *, direction: str, system: str | None = None) -> list[dict]:
+    return await self.rules.list_by_direction(direction=direction, system=system)
+
+  def pick_rule(
+    self,
+    rules: list[dict],
+    *,
+    system: str,
+    country: str | None,
+    grade: str,
+    when: datetime,
+  ) -> dict | None:
+    # Mismo criterio que ConversionRuleRepository.get_for_date, pero sobre reglas ya cargadas
+    when = as_naive_utc(when)
+    countries = {"ANY", None}
+    if country is not None:
+      countries.add(country)
+
+    best: dict | None = None
+    for r in rules:
+      if r.get("system") != system or r.get("country") not in countries:
+        continue
+      g = r.get("grade") or {}
+      if not (str(g.get("min")) <= grade <= str(g.get("max"))):
+        continue
+      valid_from = as_naive_utc(r.get("validFrom"))
+      valid_to = as_naive_utc(r.get("validTo"))
+      if valid_from is None or valid_from > when:
+        continue
+      if valid_to is not None and valid_to < when:
+        continue
+      if best is None or valid_from > as_naive_utc(best.get("validFrom")):
+        best = r
+    return best
+
+  def map_to_za(self, mapping: dict[str, str], value: str) -> str:
+    key = normalize_value_key(value)
+    if key not in mapping:
+      raise HTTPException(status_code=422, detail=f"Value '{key}' not convertible for this rule")
+    return str(mapping[key])
+
+  def map_from_za(self, mapping: dict[str, str], value_za: str, to_system: str) -> str:
     if not mapping:
       raise HTTPException(status_code=422, detail=f"No conversion mapping found for system '{to_system}'")
 
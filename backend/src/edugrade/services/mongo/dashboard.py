@@ -110,7 +110,7 @@ class DashboardService:
 
     # --- lookup de nombres en neo4j (batch) ---
     subject_ids = [r.get("subjectId") for r in rows if r.get("subjectId")]
-    neo_rows = self.neo.get_subjects_by_ids(subject_ids)
+    neo_rows = await self.neo.get_subjects_by_ids(subject_ids)
     name_by_id = {r["id"]: r.get("name") for r in neo_rows}
 
     subjects_out: list[dict] = []
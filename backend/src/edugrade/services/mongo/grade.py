@@ -8,6 +8,7 @@ from fastapi import HTTPException
 
 from edugrade.audit.context import AuditContext
 from edugrade.audit.exec import audited
+from edugrade.config import settings
 from edugrade.repository.mongo.grade import GradeRepository
 from edugrade.services.mongo.conversion_rules import ConversionRulesService
 from edugrade.utils.date import date_to_datetime_utc, ensure_date, ensure_date_range
@@ -186,9 +187,15 @@ class GradeService:
         out.append(self._inject_display(d, str(vza), "ZA"))
       return out
 
+    # con las proyecciones apagadas nadie las refresca: lo guardado puede estar viejo, se convierte en vivo
+    use_projections = settings.grade_projections_enabled
     for d in docs:
+      projected = (d.get("projections") or {}).get(ts) if use_projections else None
       if d.get("system") == ts:
         out.append(self._inject_display(d, str(d.get("value")), ts))
+      elif projected is not None:
+        # proyección materializada (GradeProjectionService): sin conversión en lectura
+        out.append(self._inject_display(d, str(projected), ts))
       else:
         out.append(d)
 
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from edugrade.repository.mongo.conversion_rule import ConversionRuleRepository
+from edugrade.repository.mongo.grade import GradeRepository
+from edugrade.repository.mongo.options import OptionsRepository
+from edugrade.services.mongo.conversion_rules import ConversionRulesService, DIR_FROM_ZA
+
+
+REFRESH_BATCH_SIZE = 1000
+
+
+class GradeProjectionService:
+  """
+  Proyecciones materializadas de cada exam a todos los sistemas configurados
+  (options.system). Se guardan en `projections.<system>` y `projectedAt.<system>`
+  para que GradeService lea el displayValue sin convertir.
+  """
+
+  def __init__(self, db):
+    self.repo = GradeRepository(db)
+    self.rules = ConversionRuleRepository(db)
+    self.options = OptionsRepository(db)
+    self.conv = ConversionRulesService(db)
+
+  def _project(self, doc: dict, system: str, rules: list[dict]) -> str | None:
+    vza = doc.get("valueConverted")
+    if vza is None:
+      return None
+
+    rule = self.conv.pick_rule(
+      rules,
+      system=system,
+      country=doc.get("country"),
+      grade=str(doc.get("grade")),
+      when=doc.get("date"),
+    )
+    if rule is None:
+      return None
+
+    try:
+      return self.conv.map_from_za(rule.get("map", {}), str(vza), system)
+    except HTTPException:
+      return None
+
+  def compute(self, doc: dict, systems: list[str], rules: list[dict]) -> dict[str, str]:
+    projections: dict[str, str] = {}
+    for system in systems:
+      if system in ("ZA", doc.get("system")):
+        continue
+      value = self._project(doc, system, rules)
+      if value is not None:
+        projections[system] = value
+    return projections
+
+  async def fill(self, grade_id: ObjectId) -> None:
+    # Se corre en background después del insert: si falla, la lectura convierte en vivo
+    try:
+      doc = await self.repo.get_by_id(grade_id)
+      if not doc:
+        return
+
+      systems = await self.options.get_systems()
+      rules = await self.conv.load_rules(direction=DIR_FROM_ZA)
+      projections = self.compute(doc, systems, rules)
+      await self.repo.set_projections(grade_id, projections, at=datetime.now(timezone.utc))
+    except Exception as e:
+      print(f"[projections] fill {grade_id} FAILED: {type(e).__name__}: {e}")
+
+  async def refresh_rule(self, rule: dict) -> int:
+    system = rule["system"]
+    grade = rule.get("grade") or {}
+    rules = await self.conv.load_rules(direction=DIR_FROM_ZA, system=system)
+    at = datetime.now(timezone.utc)
+    # un índice por sistema (options.system puede crecer); create_index es no-op si ya existe
+    await self.repo.ensure_projection_index(system)
+
+    updated = 0
+    after_id: ObjectId | None = None
+    while True:
+      docs = await self.repo.list_stale_projections(
+        system=system,
+        country=rule.get("country"),
+        grade_min=str(grade.get("min", "")),
+        grade_max=str(grade.get("max", "")),
+        date_from=rule["validFrom"],
+        date_to=rule.get("validTo"),
+        stale_before=rule.get("createdAt") or at,
+        after_id=after_id,
+        limit=REFRESH_BATCH_SIZE,
+      )
+      if not docs:
+        return updated
+
+      values: dict[ObjectId, str] = {}
+      for d in docs:
+        if d.get("system") == system:
+          continue
+        value = self._project(d, system, rules)
+        if value is not None:
+          values[d["_id"]] = value
+
+      updated += await self.repo.bulk_set_projection(system, values, at=at)
+      after_id = docs[-1]["_id"]
+
+  async def refresh_pending(self) -> int:
+    now = datetime.now(timezone.utc)
+    updated = 0
+    for rule in await self.rules.list_pending_projection_refresh(now=now):
+      updated += await self.refresh_rule(rule)
+      await self.rules.mark_projections_refreshed(rule["_id"], at=now)
+    return updated
+
+
+async def run_projection_refresher(db, interval_seconds: int) -> None:
+  svc = GradeProjectionService(db)
+  while True:
+    try:
+      updated = await svc.refresh_pending()
+      if updated:
+        print(f"[projections] refreshed {updated} exams")
+    except Exception as e:
+      print(f"[projections] refresh FAILED: {type(e).__name__}: {e}")
+    await asyncio.sleep(interval_seconds)
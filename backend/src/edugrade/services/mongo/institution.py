@@ -1,25 +1,41 @@
+from __future__ import annotations
+
+import json
+
 from bson import ObjectId
 from fastapi import HTTPException
 
+from edugrade.config import settings
 from edugrade.repository.mongo.institution import InstitutionRepository
+from edugrade.repository.mongo.outbox import OutboxRepository
 from edugrade.audit.context import AuditContext
 from edugrade.audit.exec import audited
+from edugrade.utils.cursor import decode_cursor
+from edugrade.services.mongo.bulk import bulk_report, created_ids
+from edugrade.services.outbox import upsert_institution_op
+from edugrade.utils.string import fold_text
+
+SUGGEST_CACHE_KEY = "institutions:suggest"
 
 
 class InstitutionService:
-  def __init__(self, db, audit_logger):
+  def __init__(self, db, audit_logger, redis=None):
     self.repo = InstitutionRepository(db)
+    self.outbox = OutboxRepository(db)
     self.audit_logger = audit_logger
+    self.redis = redis
 
   async def create(self, payload: dict, audit: AuditContext) -> dict:
     async def _do():
-      return await self.repo.create(payload)
+      doc = await self.repo.create(payload)
+      await self.outbox.append([upsert_institution_op(str(doc.get("_id") or doc.get("id")))])
+      return doc
 
     def _entity_id(doc: dict) -> str:
       _id = doc.get("_id") or doc.get("id")
       return str(_id) if _id is not None else "(missing)"
 
-    return await audited(
+    created = await audited(
       audit_logger=self.audit_logger,
       audit=audit,
       operation="CREATE",
@@ -31,6 +47,32 @@ class InstitutionService:
       entity_id_from_result=_entity_id,
     )
 
+    await self._invalidate_suggestions()
+    return created
+
+  async def create_many(self, items: list[dict], audit: AuditContext) -> dict:
+    async def _do() -> dict:
+      docs, errors = await self.repo.create_many(items)
+      report = bulk_report(docs, errors)
+      await self.outbox.append([upsert_institution_op(i) for i in created_ids(report)])
+      return report
+
+    report = await audited(
+      audit_logger=self.audit_logger,
+      audit=audit,
+      operation="CREATE_BATCH",
+      db="mongo",
+      entity_type="Institution",
+      entity_id="(batch)",
+      payload_summary=f"bulk create institutions; items={len(items)}",
+      fn=_do,
+      entity_id_from_result=lambda r: f"(batch created={r['created']} failed={r['failed']})",
+    )
+
+    if report["created"]:
+      await self._invalidate_suggestions()
+    return report
+
   async def get(self, institution_id: str) -> dict:
     if not ObjectId.is_valid(institution_id):
       raise HTTPException(status_code=400, detail="Invalid id")
@@ -48,8 +90,59 @@ class InstitutionService:
     address: str | None,
     limit: int,
     skip: int,
+    cursor: str | None = None,
   ) -> list[dict]:
     if address and not country:
       raise HTTPException(status_code=400, detail="country is required when address is provided")
 
-    return await self.repo.list(name=name, country=country, address=address, limit=limit, skip=skip)
\ No newline at end of file
+    after = None
+    if cursor:
+      if name or address:
+        raise HTTPException(status_code=400, detail="cursor is not supported with name/address search; use skip")
+      try:
+        after = decode_cursor(cursor)
+      except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await self.repo.list(name=name, country=country, address=address, limit=limit, skip=skip, after=after)
+
+  # ---------- autocomplete ----------
+
+  async def suggest(self, q: str, country: str | None, limit: int) -> list[dict]:
+    prefix = fold_text(q)
+    if not prefix:
+      return []
+
+    # Solo se cachean prefijos cortos: son los que pasan todos los que tipean
+    cacheable = self.redis is not None and len(prefix) <= settings.institution_suggest_cache_max_prefix
+    field = f"{country or '*'}:{limit}:{prefix}"
+
+    if cacheable:
+      try:
+        hit = await self.redis.hget(SUGGEST_CACHE_KEY, field)
+        if hit is not None:
+          return json.loads(hit)
+      except Exception as e:
+        print(f"[cache] suggest get FAILED: {type(e).__name__}: {e}")
+
+    docs = await self.repo.suggest(prefix=prefix, country=country, limit=limit)
+    items = [{"id": str(d["_id"]), "name": d.get("name"), "country": d.get("country")} for d in docs]
+
+    if cacheable:
+      try:
+        async with self.redis.pipeline(transaction=False) as pipe:
+          pipe.hset(SUGGEST_CACHE_KEY, field, json.dumps(items))
+          pipe.expire(SUGGEST_CACHE_KEY, settings.institution_suggest_cache_ttl_seconds, nx=True)
+          await pipe.execute()
+      except Exception as e:
+        print(f"[cache] suggest set FAILED: {type(e).__name__}: {e}")
+
+    return items
+
+  async def _invalidate_suggestions(self) -> None:
+    if self.redis is None:
+      return
+    try:
+      await self.redis.delete(SUGGEST_CACHE_KEY)
+    except Exception as e:
+      print(f"[cache] suggest invalidate FAILED: {type(e).__name__}: {e}")
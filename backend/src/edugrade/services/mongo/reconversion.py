@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import socket
+from datetime import datetime, timezone
+
+from uuid import uuid4
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from edugrade.audit.context import AuditContext
+from edugrade.audit.exec import audited
+from edugrade.config import settings
+from edugrade.repository.mongo.grade import GradeRepository
+from edugrade.repository.mongo.options import OptionsRepository
+from edugrade.repository.mongo.reconversion_job import ReconversionJobRepository
+from edugrade.services.mongo.conversion_rules import ConversionRulesService, DIR_FROM_ZA, DIR_TO_ZA
+from edugrade.services.mongo.grade_projection import GradeProjectionService
+from edugrade.utils.date import as_naive_utc, date_to_datetime_utc, ensure_date_range
+
+
+STATUS_RUNNING = "RUNNING"
+STATUS_DONE = "DONE"
+STATUS_FAILED = "FAILED"
+
+BATCH_SIZE = 1000
+
+# jobs corriendo en este proceso (evita lanzar dos veces el mismo task); entre procesos decide el lease
+_running: dict[str, asyncio.Task] = {}
+
+
+class ReconversionService:
+  """
+  Recalcula `valueConverted` (TO_ZA) de los exams de un (system, country, rango de fechas)
+  con las reglas vigentes cargadas en memoria. Avanza por keyset (date, _id) y guarda
+  checkpoint por batch, así un job interrumpido se retoma donde quedó.
+  Cada worker (uvicorn) que lo lanza primero lo reclama con un lease (owner + leaseUntil) que
+  se renueva en cada checkpoint: solo el que lo tiene corre el loop; los demás no hacen nada.
+  Si el dueño muere (deploy, crash) su lease sigue vigente un rato: run() espera a que venza y
+  lo reclama; si en ese tiempo otro worker lo renovó, ese está vivo y es el que sigue.
+  """
+
+  def __init__(self, db, audit_logger):
+    self.jobs = ReconversionJobRepository(db)
+    self.grades = GradeRepository(db)
+    self.options = OptionsRepository(db)
+    self.conv = ConversionRulesService(db)
+    self.projections = GradeProjectionService(db)
+    self.audit_logger = audit_logger
+
+  async def start(self, payload: dict, audit: AuditContext) -> dict:
+    date_from = payload.get("dateFrom")
+    date_to = payload.get("dateTo")
+    if date_from and date_to:
+      try:
+        ensure_date_range(date_from, date_to)
+      except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def _do() -> dict:
+      params = {
+        "system": payload["system"],
+        "country": payload.get("country"),
+        "dateFrom": date_to_datetime_utc(date_from) if date_from else None,
+        "dateTo": date_to_datetime_utc(date_to) if date_to else None,
+      }
+      total = await self.grades.count_for_reconversion(
+        system=params["system"],
+        country=params["country"],
+        date_from=params["dateFrom"],
+        date_to=params["dateTo"],
+      )
+      return await self.jobs.create({
+        **params,
+        "status": STATUS_RUNNING,
+        "total": total,
+        "scanned": 0,
+        "updated": 0,
+        "failed": 0,
+        "checkpoint": None,
+        "owner": None,
+        "leaseUntil": None,
+        "error": None,
+        "startedAt": datetime.now(timezone.utc),
+        "finishedAt": None,
+      })
+
+    job = await audited(
+      audit_logger=self.audit_logger,
+      audit=audit,
+      operation="CREATE",
+      db="mongo",
+      entity_type="ReconversionJob",
+      entity_id="(pending)",
+      payload_summary=(
+        "reconversion job start; "
+        f"system={payload.get('system')} country={payload.get('country')} "
+        f"from={date_from} to={date_to}"
+      ),
+      fn=_do,
+      entity_id_from_result=lambda doc: str(doc.get("_id") or "(missing)"),
+    )
+
+    self.spawn(job["_id"])
+    return job
+
+  async def get(self, job_id: str) -> dict:
+    if not ObjectId.is_valid(job_id):
+      raise HTTPException(status_code=400, detail="Invalid id")
+
+    job = await self.jobs.get_by_id(ObjectId(job_id))
+    if not job:
+      raise HTTPException(status_code=404, detail="Reconversion job not found")
+    return job
+
+  async def resume(self, job_id: str) -> dict:
+    job = await self.get(job_id)
+    if job.get("status") == STATUS_DONE:
+      raise HTTPException(status_code=409, detail="Reconversion job already finished")
+
+    if job.get("status") != STATUS_RUNNING:
+      job = await self.jobs.update(
+        job["_id"],
+        {"status": STATUS_RUNNING, "error": None, "finishedAt": None, "owner": None, "leaseUntil": None},
+      )
+
+    self.spawn(job["_id"])
+    return job
+
+  async def resume_interrupted(self) -> int:
+    # Al arrancar: RUNNING = otro worker lo está corriendo o el proceso murió a mitad de camino;
+    # run() reclama los que tienen el lease vencido y espera a que venza el de los demás
+    jobs = await self.jobs.list_by_status(STATUS_RUNNING)
+    for job in jobs:
+      self.spawn(job["_id"])
+    return len(jobs)
+
+  def spawn(self, job_id: ObjectId) -> None:
+    key = str(job_id)
+    task = _running.get(key)
+    if task is not None and not task.done():
+      return
+    task = asyncio.create_task(self.run(job_id))
+    _running[key] = task
+    task.add_done_callback(lambda _t: _running.pop(key, None))
+
+  async def run(self, job_id: ObjectId) -> None:
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+    job = await self._claim(job_id, owner)
+    if job is None:
+      return
+    try:
+      await self._run(job, owner)
+    except Exception as e:
+      print(f"[reconversion] job {job_id} FAILED: {type(e).__name__}: {e}")
+      await self.jobs.update_owned(job_id, owner, {"status": STATUS_FAILED, "error": f"{type(e).__name__}: {e}"[:500]})
+
+  async def _claim(self, job_id: ObjectId, owner: str) -> dict | None:
+    # None = el job ya no está RUNNING o lo corre otro worker vivo (renovó el lease mientras se esperaba)
+    waited_for: datetime | None = None
+    while True:
+      job = await self.jobs.claim(job_id, owner, settings.reconversion_lease_seconds)
+      if job is not None:
+        return job
+
+      current = await self.jobs.get_by_id(job_id)
+      if not current or current.get("status") != STATUS_RUNNING:
+        return None
+      lease = as_naive_utc(current.get("leaseUntil"))
+      if lease is None:
+        # lo soltaron entre el claim y la lectura: reintentar
+        continue
+      if waited_for is not None and lease > waited_for:
+        return None
+
+      waited_for = lease
+      now = as_naive_utc(datetime.now(timezone.utc))
+      # jitter: los workers que arrancaron juntos no reintentan todos en el mismo instante
+      await asyncio.sleep(max((lease - now).total_seconds(), 0) + random.uniform(0.5, 3))
+
+  async def _run(self, job: dict, owner: str) -> None:
+    job_id = job["_id"]
+
+    system = job["system"]
+    to_za_rules = await self.conv.load_rules(direction=DIR_TO_ZA, system=system)
+
+    # valueConverted cambia => las proyecciones materializadas se recalculan en el mismo write
+    project = settings.grade_projections_enabled
+    systems = await self.options.get_systems() if project else []
+    from_za_rules = await self.conv.load_rules(direction=DIR_FROM_ZA) if project else []
+
+    cp = job.get("checkpoint")
+    after = (cp["date"], cp["lastId"]) if cp else None
+
+    while True:
+      docs = await self.grades.list_for_reconversion(
+        system=system,
+        country=job.get("country"),
+        date_from=job.get("dateFrom"),
+        date_to=job.get("dateTo"),
+        after=after,
+        limit=BATCH_SIZE,
+      )
+      if not docs:
+        break
+
+      updates: dict[ObjectId, dict] = {}
+      failed = 0
+      for d in docs:
+        rule = self.conv.pick_rule(
+          to_za_rules,
+          system=system,
+          country=d.get("country"),
+          grade=str(d.get("grade")),
+          when=d["date"],
+        )
+        if rule is None:
+          failed += 1
+          continue
+
+        try:
+          value_za = self.conv.map_to_za(rule.get("map", {}), str(d.get("value")))
+        except HTTPException:
+          failed += 1
+          continue
+
+        if value_za == d.get("valueConverted"):
+          continue
+
+        fields: dict = {"valueConverted": value_za}
+        if project:
+          at = datetime.now(timezone.utc)
+          for s, v in self.projections.compute({**d, "valueConverted": value_za}, systems, from_za_rules).items():
+            fields[f"projections.{s}"] = v
+            fields[f"projectedAt.{s}"] = at
+        updates[d["_id"]] = fields
+
+      updated = await self.grades.bulk_set_value_converted(updates)
+
+      last = docs[-1]
+      after = (last["date"], last["_id"])
+      owned = await self.jobs.save_checkpoint(
+        job_id,
+        owner=owner,
+        lease_seconds=settings.reconversion_lease_seconds,
+        checkpoint={"date": last["date"], "lastId": last["_id"]},
+        scanned=len(docs),
+        updated=updated,
+        failed=failed,
+      )
+      if not owned:
+        print(f"[reconversion] job {job_id}: lease lost, another worker took it over")
+        return
+
+    # Dashboard: los promedios se agregan en vivo sobre valueConverted, no hay agregados
+    # materializados que reconstruir; las proyecciones ya se actualizaron por batch.
+    await self.jobs.update_owned(job_id, owner, {"status": STATUS_DONE, "finishedAt": datetime.now(timezone.utc)})
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from collections import defaultdict
+
+from fastapi import HTTPException
+
+from edugrade.repository.mongo.grade import GradeRepository
+from edugrade.services.mongo.conversion_rules import DIR_TO_ZA, ConversionRulesService
+from edugrade.utils.date import date_to_datetime_utc
+from edugrade.utils.string import normalize_value_key
+
+
+SIMULATION_BATCH_SIZE = 5000
+
+
+def _to_float(v) -> float | None:
+  try:
+    return float(v)
+  except (TypeError, ValueError):
+    return None
+
+
+class _Acc:
+  __slots__ = ("matched", "before_used", "before_sum", "after_used", "after_sum")
+
+  def __init__(self):
+    self.matched = 0
+    self.before_used = 0
+    self.before_sum = 0.0
+    self.after_used = 0
+    self.after_sum = 0.0
+
+
+def _average(read: int, used: int, total: float) -> dict:
+  return {
+    "examsRead": read,
+    "examsUsedInAverage": used,
+    "averageZA": (total / used) if used > 0 else None,
+  }
+
+
+class ConversionSimulationService:
+  """
+  What-if de una regla TO_ZA en borrador: recorre una sola vez los exams afectados
+  (solo los campos necesarios, por batches) y devuelve promedios antes/después por
+  institución y materia. No escribe nada.
+  Un exam cuenta solo si pick_rule elegiría el borrador entre las reglas actuales (el mismo
+  criterio que la re-conversión); los que sigue cubriendo otra regla salen en examsShadowed.
+  """
+
+  def __init__(self, db):
+    self.repo = GradeRepository(db)
+    self.conv = ConversionRulesService(db)
+
+  async def simulate(self, draft: dict) -> dict:
+    if draft.get("direction", DIR_TO_ZA) != DIR_TO_ZA:
+      raise HTTPException(
+        status_code=400,
+        detail="Only TO_ZA drafts change stored ZA values; FROM_ZA only affects display",
+      )
+
+    system = draft["system"]
+    mapping = {normalize_value_key(k): _to_float(v) for k, v in draft["map"].items()}
+    grade = draft.get("grade") or {}
+    valid_from = date_to_datetime_utc(draft["validFrom"])
+
+    # el borrador compite con las reglas vigentes igual que si ya estuviera guardado
+    draft_rule = {
+      "system": system,
+      "country": draft.get("country") or "ANY",
+      "grade": grade,
+      "validFrom": valid_from,
+      "validTo": None,
+    }
+    rules = [*await self.conv.load_rules(direction=DIR_TO_ZA, system=system), draft_rule]
+
+    acc: dict[tuple[str, str], _Acc] = defaultdict(_Acc)
+    matched = changed = not_convertible = shadowed = 0
+
+    async for candidates in self.repo.iter_for_simulation(
+      system=system,
+      country=draft.get("country"),
+      grade_min=str(grade.get("min", "0")),
+      grade_max=str(grade.get("max", "99")),
+      date_from=valid_from,
+      batch_size=SIMULATION_BATCH_SIZE,
+    ):
+      batch = [
+        d for d in candidates
+        if self.conv.pick_rule(
+          rules, system=system, country=d.get("country"), grade=str(d.get("grade")), when=d["date"],
+        ) is draft_rule
+      ]
+      shadowed += len(candidates) - len(batch)
+
+      # lookup del draft de una vez para todo el batch
+      befores = [_to_float(d.get("valueConverted")) for d in batch]
+      afters = [mapping.get(normalize_value_key(d.get("value", ""))) for d in batch]
+
+      for d, before, after in zip(batch, befores, afters):
+        a = acc[(d.get("institutionId"), d.get("subjectId"))]
+        a.matched += 1
+        if before is not None:
+          a.before_used += 1
+          a.before_sum += before
+        if after is not None:
+          a.after_used += 1
+          a.after_sum += after
+        else:
+          not_convertible += 1
+        if before != after:
+          changed += 1
+
+      matched += len(batch)
+
+    institutions = await self._merge_with_totals(acc)
+    return {
+      "system": draft["system"],
+      "country": draft.get("country") or "ANY",
+      "examsMatched": matched,
+      "examsChanged": changed,
+      "examsNotConvertible": not_convertible,
+      "examsShadowed": shadowed,
+      "institutions": institutions,
+    }
+
+  async def _merge_with_totals(self, acc: dict[tuple[str, str], _Acc]) -> list[dict]:
+    # Totales actuales de las instituciones afectadas; "después" = total - afectados(antes) + afectados(después)
+    inst_ids = sorted({iid for iid, _ in acc.keys() if iid})
+    rows = await self.repo.sums_by_institution_subject(inst_ids)
+
+    by_inst: dict[str, list[dict]] = defaultdict(list)
+    for r in rows:
+      by_inst[r.get("institutionId")].append(r)
+
+    out: list[dict] = []
+    for iid in inst_ids:
+      subjects_out: list[dict] = []
+      i_matched = i_read = 0
+      i_before_used = i_after_used = 0
+      i_before_sum = i_after_sum = 0.0
+
+      for r in sorted(by_inst.get(iid, []), key=lambda x: str(x.get("subjectId"))):
+        a = acc.get((iid, r.get("subjectId"))) or _Acc()
+        read = int(r.get("examsRead") or 0)
+        before_used = int(r.get("examsUsedInAverage") or 0)
+        before_sum = float(r.get("sumZA") or 0)
+        after_used = before_used - a.before_used + a.after_used
+        after_sum = before_sum - a.before_sum + a.after_sum
+
+        i_matched += a.matched
+        i_read += read
+        i_before_used += before_used
+        i_before_sum += before_sum
+        i_after_used += after_used
+        i_after_sum += after_sum
+
+        if a.matched == 0:
+          continue
+
+        subjects_out.append({
+          "subjectId": str(r.get("subjectId")),
+          "examsMatched": a.matched,
+          "before": _average(read, before_used, before_sum),
+          "after": _average(read, after_used, after_sum),
+        })
+
+      out.append({
+        "institutionId": iid,
+        "examsMatched": i_matched,
+        "before": _average(i_read, i_before_used, i_before_sum),
+        "after": _average(i_read, i_after_used, i_after_sum),
+        "subjects": subjects_out,
+      })
+
+    return out
@@ -1,20 +1,38 @@
+from __future__ import annotations
+
 from bson import ObjectId
 from fastapi import HTTPException
+from edugrade.repository.mongo.outbox import OutboxRepository
 from edugrade.repository.mongo.student import StudentRepository
 from edugrade.audit.context import AuditContext
 from edugrade.audit.exec import audited
+from edugrade.utils.cursor import decode_cursor
+from edugrade.services.mongo.bulk import bulk_report, created_ids
+from edugrade.services.outbox import delete_student_op, enroll_student_op, upsert_student_op
 
 
 
 class StudentService:
   def __init__(self, db, audit_logger):
     self.repo = StudentRepository(db)
+    # cambios para Neo4j: los aplica el dispatcher (services/outbox.py), no el request
+    self.outbox = OutboxRepository(db)
     self.audit_logger = audit_logger
 
   async def bootstrap(self) -> None:
     await self.repo.ensure_indexes()
 
-  async def create(self, payload: dict, audit: AuditContext) -> dict:
+  async def create(self, payload: dict, audit: AuditContext, enroll: dict | None = None) -> dict:
+    # enroll: {institution_id, start, end} -> STUDIES_AT en el mismo lote del grafo que el alta
+    async def _do() -> dict:
+      doc = await self.repo.create(payload)
+      student_id = str(doc.get("_id") or doc.get("id"))
+      ops = [upsert_student_op(student_id)]
+      if enroll:
+        ops.append(enroll_student_op(student_id, enroll["institution_id"], enroll["start"], enroll.get("end")))
+      await self.outbox.append(ops)
+      return doc
+
     return await audited(
       audit_logger=self.audit_logger,
       audit=audit,
@@ -23,10 +41,30 @@ class StudentService:
       entity_type="Student",
       entity_id="(pending)",
       payload_summary=f"create student; keys={list(payload.keys())}",
-      fn=lambda: self.repo.create(payload),
+      fn=_do,
       entity_id_from_result=lambda doc: str(doc.get("_id") or doc.get("id") or "(missing)"),
     )
 
+  async def create_many(self, items: list[dict], audit: AuditContext) -> dict:
+    # un solo insert_many (ordered=False) y una entrada de auditoría por batch
+    async def _do() -> dict:
+      docs, errors = await self.repo.create_many(items)
+      report = bulk_report(docs, errors)
+      await self.outbox.append([upsert_student_op(i) for i in created_ids(report)])
+      return report
+
+    return await audited(
+      audit_logger=self.audit_logger,
+      audit=audit,
+      operation="CREATE_BATCH",
+      db="mongo",
+      entity_type="Student",
+      entity_id="(batch)",
+      payload_summary=f"bulk create students; items={len(items)}",
+      fn=_do,
+      entity_id_from_result=lambda r: f"(batch created={r['created']} failed={r['failed']})",
+    )
+
   async def get(self, student_id: str) -> dict:
     if not ObjectId.is_valid(student_id):
       raise HTTPException(status_code=400, detail="Invalid id")
@@ -45,6 +83,7 @@ class StudentService:
     identity: str | None = None,
     limit: int = 50,
     skip: int = 0,
+    cursor: str | None = None,
   ) -> list[dict]:
 
     if identity and not nationality:
@@ -53,6 +92,15 @@ class StudentService:
         detail="Nationality is required when identity is provided"
       )
 
+    after = None
+    if cursor:
+      if first_name or last_name:
+        raise HTTPException(status_code=400, detail="cursor is not supported with name search; use skip")
+      try:
+        after = decode_cursor(cursor)
+      except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     return await self.repo.list(
       first_name=first_name,
       last_name_like=last_name,
@@ -60,6 +108,7 @@ class StudentService:
       identity=identity,
       limit=limit,
       skip=skip,
+      after=after,
     )
 
   async def delete(self, student_id: str, audit: AuditContext) -> None:
@@ -70,6 +119,7 @@ class StudentService:
       ok = await self.repo.delete(ObjectId(student_id))
       if not ok:
         raise HTTPException(status_code=404, detail="Student not found")
+      await self.outbox.append([delete_student_op(student_id)])
       return None
 
     await audited(
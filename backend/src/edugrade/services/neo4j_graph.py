@@ -1,41 +1,118 @@
-from edugrade.core.neo4j_db import get_neo4j_driver
+from fastapi import HTTPException, Request
+from neo4j import AsyncDriver
+from edugrade.config import settings
 from edugrade.repository.neo4j_graph import Neo4jGraphRepository
+from edugrade.services.equivalence_groups import apply_equivalence_pairs
+from edugrade.services.history_cache import StudentHistoryCache
+from edugrade.services.subject_catalog import SubjectCatalog
+from edugrade.utils.coalescer import WriteCoalescer
+from edugrade.utils.date import ensure_date
 from typing import Any, Dict, List, Optional
 
 class Neo4jGraphService:
-    def __init__(self):
-        self.driver = get_neo4j_driver()
+    def __init__(self, driver: AsyncDriver, redis: Any = None):
+        # driver único (AsyncGraphDatabase) creado en lifespan; el service también (core/services.py)
+        self.driver = driver
         self.repo = Neo4jGraphRepository(self.driver)
-
-        # Crear constraints automáticamente
-        self.repo.ensure_constraints()
+        self.subjects = SubjectCatalog(self.repo, redis)
+        # historial armado por alumno; se invalida en cada escritura que toca a ese alumno
+        self.history_cache = StudentHistoryCache(redis)
+        # links concurrentes (seeder/integraciones) -> un UNWIND por lote en vez de una tx por request
+        wait = settings.graph_link_batch_wait_ms / 1000
+        self._studies_at = WriteCoalescer(self._flush_studies_at, settings.graph_link_batch_size, wait)
+        self._took = WriteCoalescer(self._flush_took, settings.graph_link_batch_size, wait)
 
     # ---------- UPSERTS ----------
 
-    def upsert_student(self, mongoId: str):
-        return self.repo.upsert_student(mongoId)
+    async def upsert_student(self, mongoId: str):
+        return await self.repo.upsert_student(mongoId)
     
-    def delete_student(self, mongoId: str):
-        return self.repo.delete_student(mongoId)
+    async def delete_student(self, mongoId: str):
+        # sus pares de inscripciones salen de TRANSFER_FLOW en la misma transacción
+        result = await self.repo.write_unit(
+            lambda repo: _with_transfer_flows(repo, [mongoId], lambda: repo.delete_student(mongoId))
+        )
+        await self.history_cache.invalidate(mongoId)
+        return result
+
+    async def upsert_institution(self, mongoId: str):
+        return await self.repo.upsert_institution(mongoId)
+
+    async def upsert_student_enrolled(
+        self,
+        studentMongoId: str,
+        institutionMongoId: str,
+        startDate: str,
+        endDate: str | None = None,
+    ):
+        # alta + STUDIES_AT en una sola transacción: si el link falla no queda el nodo suelto
+        async def _work(repo: Neo4jGraphRepository):
+            student = await repo.upsert_student(studentMongoId)
+            await _with_transfer_flows(
+                repo,
+                [studentMongoId],
+                lambda: repo.link_studies_at(studentMongoId, institutionMongoId, startDate, endDate),
+            )
+            return student
+
+        student = await self.repo.write_unit(_work)
+        await self.history_cache.invalidate(studentMongoId)
+        return student
+
+    async def upsert_students(self, mongoIds: list[str]) -> int:
+        return await self.repo.upsert_students(mongoIds)
+
+    async def upsert_institutions(self, mongoIds: list[str]) -> int:
+        return await self.repo.upsert_institutions(mongoIds)
 
-    def upsert_institution(self, mongoId: str):
-        return self.repo.upsert_institution(mongoId)
+    async def apply_sync_batch(
+        self,
+        *,
+        institutionIds: list[str],
+        studentIds: list[str],
+        enrollments: list[dict],
+        deletedStudentIds: list[str],
+    ) -> dict:
+        # un lote del outbox en UNA transacción: upserts -> STUDIES_AT -> bajas
+        touched = list({e["studentMongoId"] for e in enrollments} | set(deletedStudentIds))
+
+        async def _work(repo: Neo4jGraphRepository):
+            async def _enroll_and_delete():
+                return (await repo.enroll_students(enrollments), await repo.delete_students(deletedStudentIds))
+
+            institutions = await repo.upsert_institutions(institutionIds)
+            students = await repo.upsert_students(studentIds)
+            enrolled, deleted = await _with_transfer_flows(repo, touched, _enroll_and_delete)
+            return {"institutions": institutions, "students": students, "enrollments": enrolled, "deleted": deleted}
+
+        result = await self.repo.write_unit(_work)
+        for sid in touched:
+            await self.history_cache.invalidate(sid)
+        return result
 
-    def upsert_subject(self, name: str, institutionMongoId: str):
-        return self.repo.upsert_subject(name, institutionMongoId)
+    async def upsert_subject(self, name: str, institutionMongoId: str):
+        subject = await self.repo.upsert_subject(name, institutionMongoId)
+        await self.subjects.invalidate(institutionMongoId)
+        return subject
 
     # ---------- RELATIONSHIPS ----------
 
-    def link_studies_at(
+    async def link_studies_at(
         self,
         studentMongoId: str,
         institutionMongoId: str,
         startDate: str,
         endDate: str | None = None,
     ):
-        return self.repo.link_studies_at(studentMongoId, institutionMongoId, startDate, endDate)
+        # fechas validadas acá: una inválida es un 400 de este caller, no un error del lote
+        return await self._studies_at.submit({
+            "studentMongoId": studentMongoId,
+            "institutionMongoId": institutionMongoId,
+            "startDate": ensure_date(startDate, "startDate"),
+            "endDate": None if endDate is None else ensure_date(endDate, "endDate"),
+        })
 
-    def link_took(
+    async def link_took(
         self,
         studentMongoId: str,
         subjectId: str,
@@ -43,49 +120,158 @@ class Neo4jGraphService:
         grade: str,
         endDate: str | None = None,
     ):
-        return self.repo.link_took(studentMongoId, subjectId, startDate, grade, endDate)
+        return await self._took.submit({
+            "studentMongoId": studentMongoId,
+            "subjectId": subjectId,
+            "startDate": ensure_date(startDate, "startDate"),
+            "endDate": None if endDate is None else ensure_date(endDate, "endDate"),
+            "grade": grade,
+        })
+
+    async def _flush_studies_at(self, rows: list[dict]) -> list:
+        student_ids = list({row["studentMongoId"] for row in rows})
+        links = await self.repo.write_unit(
+            lambda repo: _with_transfer_flows(repo, student_ids, lambda: repo.link_studies_at_many(rows))
+        )
+        await self._invalidate_linked(rows, links)
+        return [
+            link if link is not None else ValueError(
+                f"Not found: studentMongoId={row['studentMongoId']} or institutionMongoId={row['institutionMongoId']}"
+            )
+            for row, link in zip(rows, links)
+        ]
+
+    async def _flush_took(self, rows: list[dict]) -> list:
+        links = await self.repo.link_took_many(rows)
+        await self._invalidate_linked(rows, links)
+        return [
+            link if link is not None else ValueError(
+                f"Not found: studentMongoId={row['studentMongoId']} or subjectId={row['subjectId']}"
+            )
+            for row, link in zip(rows, links)
+        ]
+
+    async def _invalidate_linked(self, rows: list[dict], links: list) -> None:
+        for sid in {row["studentMongoId"] for row, link in zip(rows, links) if link is not None}:
+            await self.history_cache.invalidate(sid)
+
+    async def add_equivalence(self, fromSubjectId: str, toSubjectId: str, levelStage: str):
+        if fromSubjectId == toSubjectId:
+            raise ValueError("fromSubjectId and toSubjectId must be different")
+
+        # membresías + plan + escritura en una sola transacción (si A y B tienen grupos distintos, se fusionan)
+        async def _work(repo: Neo4jGraphRepository):
+            rows = await repo.get_group_memberships(levelStage, [fromSubjectId, toSubjectId])
+            group_by_id = {r["subjectId"]: r.get("groupId") for r in rows}
+            if fromSubjectId not in group_by_id or toSubjectId not in group_by_id:
+                raise ValueError("Cannot add equivalence: subject not found")
+
+            ga, gb = group_by_id[fromSubjectId], group_by_id[toSubjectId]
+            plan = await apply_equivalence_pairs(repo, levelStage, [(fromSubjectId, toSubjectId)], rows)
+
+            if ga and ga == gb:
+                a_state = "ALREADY_GROUPED"
+            elif ga:
+                a_state = "A_IN_GROUP"
+            else:
+                a_state = "A_ISOLATED"
+
+            return {
+                "aState": a_state,
+                "bWasInGroup": gb is not None,
+                "merged": bool(plan.merges),
+                "groupId": plan.group_of.get(fromSubjectId, ga),
+            }
 
-    def add_equivalence(self, fromSubjectId: str, toSubjectId: str, levelStage: str):
-        return self.repo.add_equivalence(fromSubjectId, toSubjectId, levelStage)
+        return await self.repo.write_unit(_work)
     
-    def unlink_equivalence_by_subject(self, subjectId: str, levelStage: str):
-        return self.repo.unlink_equivalence_by_subject(subjectId, levelStage)    
+    async def add_equivalences_bulk(self, levelStage: str, pairs: list[tuple[str, str]]) -> dict:
+        # componentes en memoria (union-find, incluye fusiones de grupos existentes) y
+        # escritura por UNWIND en batches, todo en una sola transacción
+        async def _work(repo: Neo4jGraphRepository):
+            subject_ids = sorted({sid for pair in pairs for sid in pair})
+            memberships = await repo.get_group_memberships(levelStage, subject_ids)
+            existing = {m["subjectId"] for m in memberships}
+
+            valid: list[tuple[str, str]] = []
+            skipped: list[dict] = []
+            for i, (a, b) in enumerate(pairs):
+                if a == b:
+                    skipped.append({"index": i, "reason": "fromSubjectId and toSubjectId must be different"})
+                elif a not in existing or b not in existing:
+                    skipped.append({"index": i, "reason": "subject not found"})
+                else:
+                    valid.append((a, b))
+
+            plan = await apply_equivalence_pairs(repo, levelStage, valid, memberships)
+            return {
+                "levelStage": str(levelStage),
+                "pairs": len(pairs),
+                "applied": len(valid),
+                "groupsCreated": len(plan.new_groups),
+                "groupsMerged": len(plan.merges),
+                "subjectsJoined": len(plan.joins),
+                "skipped": skipped,
+            }
+
+        return await self.repo.write_unit(_work)
+
+    async def unlink_equivalence_by_subject(self, subjectId: str, levelStage: str):
+        return await self.repo.unlink_equivalence_by_subject(subjectId, levelStage)    
     
-    def are_equivalent_by_cycle(self, aId: str, bId: str, levelStage: str):
-        return self.repo.are_equivalent_by_cycle(aId, bId, levelStage)
+    async def are_equivalent(self, aId: str, bId: str, levelStage: str):
+        return await self.repo.are_equivalent(aId, bId, levelStage)
 
     # ---------- READ QUERIES ----------
 
-    def get_student_subjects(self, studentMongoId: str):
-        return self.repo.get_student_subjects(studentMongoId)
+    async def get_student_subjects(self, studentMongoId: str):
+        return await self.repo.get_student_subjects(studentMongoId)
     
-    def get_equivalences_group(self, subjectId: str, levelStage: str):
-        return self.repo.get_equivalences_group(subjectId, levelStage)
+    async def get_equivalences_group(self, subjectId: str, levelStage: str):
+        return await self.repo.get_equivalences_group(subjectId, levelStage)
     
-    def get_student_institutions(self, studentId: str):
-        return self.repo.get_institutions_by_student(studentId)
+    async def get_student_institutions(self, studentId: str):
+        return await self.repo.get_institutions_by_student(studentId)
     
-    def get_student_subject_took(self, studentMongoId: str, subjectId: str):
-        return self.repo.get_student_subject_took(studentMongoId, subjectId)
+    async def get_student_subject_took(self, studentMongoId: str, subjectId: str):
+        return await self.repo.get_student_subject_took(studentMongoId, subjectId)
     
-    def get_subjects_by_institution(self, institutionMongoId: str):
-        return self.repo.get_subjects_by_institution(institutionMongoId)
+    async def get_transfer_flows(
+        self,
+        year: Optional[int] = None,
+        fromInstitutionMongoId: Optional[str] = None,
+        toInstitutionMongoId: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        return await self.repo.get_transfer_flows(year, fromInstitutionMongoId, toInstitutionMongoId, limit)
+
+    async def get_subjects_by_institution(self, institutionMongoId: str):
+        return await self.subjects.get_subjects_by_institution(institutionMongoId)
 
-    def get_subjects_by_institution_student_interval(
+    async def search_subjects(
+        self,
+        text: str,
+        institutionMongoId: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        return await self.repo.search_subjects(text, institutionMongoId, skip, limit)
+
+    async def get_subjects_by_institution_student_interval(
         self,
         institutionMongoId: str,
         studentMongoId: str,
         dateFrom: str,
         dateTo: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
-        return self.repo.get_subjects_by_institution_student_interval(
+        return await self.repo.get_subjects_by_institution_student_interval(
             institutionMongoId=institutionMongoId,
             studentMongoId=studentMongoId,
             dateFrom=dateFrom,
             dateTo=dateTo,
         )
     
-    def get_subjects_by_institution_student(
+    async def get_subjects_by_institution_student(
         self,
         institutionMongoId: str,
         studentMongoId: str,
@@ -95,34 +281,88 @@ class Neo4jGraphService:
         tiene relación STUDIES_AT con esa institución. Incluye grade si existe
         relación TOOK (si no, grade = None).
         """
-        return self.repo.get_subjects_by_institution_student(
+        return await self.repo.get_subjects_by_institution_student(
             institutionMongoId=institutionMongoId,
             studentMongoId=studentMongoId,
         )
     
-    def get_students_by_institution(self, institutionMongoId: str):
-        return self.repo.get_students_by_institution(institutionMongoId)
+    async def get_students_by_institution(
+        self,
+        institutionMongoId: str,
+        after: Optional[str] = None,
+        limit: int = 50,
+        dateFrom: Optional[str] = None,
+        dateTo: Optional[str] = None,
+    ) -> list[str]:
+        return await self.repo.get_students_by_institution(institutionMongoId, after, limit, dateFrom, dateTo)
+
+    async def count_students_by_institution(
+        self,
+        institutionMongoId: str,
+        dateFrom: Optional[str] = None,
+        dateTo: Optional[str] = None,
+    ) -> int:
+        return await self.repo.count_students_by_institution(institutionMongoId, dateFrom, dateTo)
     
-    def get_student_history_rows(self, studentMongoId: str):
-        return self.repo.get_student_history_rows(studentMongoId)
+    async def get_student_history_rows(self, studentMongoId: str):
+        return await self.repo.get_student_history_rows(studentMongoId)
     
-    def get_student_enrollments(self, studentMongoId: str) -> List[Dict[str, Any]]:
-        return self.repo.get_student_enrollments(studentMongoId)
+    async def get_student_enrollments(self, studentMongoId: str) -> List[Dict[str, Any]]:
+        return await self.repo.get_student_enrollments(studentMongoId)
+
+    async def get_student_subject_rows(self, studentMongoId: str) -> List[Dict[str, Any]]:
+        return await self.repo.get_student_subject_rows(studentMongoId)
+
+    async def get_student_history_data(self, studentMongoId: str) -> tuple[list[dict], list[dict]]:
+        # enrollments + materias del historial: una sola transacción de lectura (snapshot consistente)
+        async def _work(repo: Neo4jGraphRepository):
+            enrollments = await repo.get_student_enrollments(studentMongoId)
+            if not enrollments:
+                return [], []
+            return enrollments, await repo.get_student_subject_rows(studentMongoId)
 
-    def get_student_subject_rows(self, studentMongoId: str) -> List[Dict[str, Any]]:
-        return self.repo.get_student_subject_rows(studentMongoId)
+        return await self.repo.read_unit(_work)
+
+    async def get_transfer_matches(self, studentMongoId: str, targetInstitutionMongoId: str, levelStage: str):
+        return await self.repo.get_transfer_matches(studentMongoId, targetInstitutionMongoId, levelStage)
+
+    async def get_students_history_data(
+        self,
+        studentMongoIds: list[str],
+    ) -> dict[str, tuple[list[dict], list[dict]]]:
+        # lo mismo que get_student_history_data para muchos alumnos: 2 queries por lote, no 2 por alumno
+        async def _work(repo: Neo4jGraphRepository):
+            enrollments = await repo.get_enrollments_for_students(studentMongoIds)
+            enrolled = sorted({e["studentMongoId"] for e in enrollments})
+            return enrollments, await repo.get_subject_rows_for_students(enrolled)
+
+        enrollments, subjects = await self.repo.read_unit(_work)
+        out: dict[str, tuple[list[dict], list[dict]]] = {sid: ([], []) for sid in studentMongoIds}
+        for e in enrollments:
+            out[e["studentMongoId"]][0].append(e)
+        for s in subjects:
+            out[s["studentMongoId"]][1].append(s)
+        return out
     
-    def get_subjects_by_ids(self, subjectIds: list[str]):
-        return self.repo.get_subjects_by_ids(subjectIds)
+    async def get_subjects_by_ids(self, subjectIds: list[str]):
+        return await self.subjects.get_subjects_by_ids(subjectIds)
 
     # def recommend_subjects_for_student(self, studentId: str, limit: int = 10):
     #     return self.repo.recommend_subjects_for_student(studentId, limit)
 
-# ---------- Función Factory ----------
-_service = None
+# ---------- Dependency ----------
+
+async def _with_transfer_flows(repo: Neo4jGraphRepository, studentMongoIds: list[str], write):
+    # dentro de write_unit: TRANSFER_FLOW pierde los pares viejos de estos alumnos y gana los nuevos
+    await repo.apply_transfer_flows(studentMongoIds, -1)
+    result = await write()
+    await repo.apply_transfer_flows(studentMongoIds, 1)
+    return result
+
 
-def get_neo4j_service():
-    global _service
-    if _service is None:
-        _service = Neo4jGraphService()
-    return _service
\ No newline at end of file
+def get_neo4j_service(request: Request) -> Neo4jGraphService:
+    # misma instancia para todos los requests (core/services.build_services)
+    service = getattr(getattr(request.app.state, "services", None), "neo4j", None)
+    if service is None:
+        raise HTTPException(status_code=503, detail="Service 'neo4j' unavailable")
+    return service
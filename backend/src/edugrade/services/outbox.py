@@ -0,0 +1,211 @@
+''' outbox Mongo -> Neo4j: los endpoints solo escriben en Mongo y este dispatcher lleva los cambios al grafo '''
+
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from fastapi import Request
+
+from edugrade.audit.context import AuditContext
+from edugrade.audit.exec import audited
+from edugrade.config import settings
+from edugrade.repository.mongo.outbox import STATUS_PENDING, OutboxRepository
+from edugrade.repository.mongo.student import StudentRepository
+from edugrade.services.neo4j_graph import Neo4jGraphService
+
+OP_UPSERT_STUDENT = "UPSERT_STUDENT"
+OP_UPSERT_INSTITUTION = "UPSERT_INSTITUTION"
+OP_ENROLL_STUDENT = "ENROLL_STUDENT"
+OP_DELETE_STUDENT = "DELETE_STUDENT"
+
+
+# ---------- operaciones ----------
+# key = idempotencia: la misma operación pendiente no se encola dos veces y reaplicarla no cambia el grafo
+
+def upsert_student_op(student_id: str) -> dict:
+  return {
+    "op": OP_UPSERT_STUDENT,
+    "key": f"student:{student_id}:upsert",
+    "entityIds": [student_id],
+    "payload": {"studentMongoId": student_id},
+  }
+
+
+def upsert_institution_op(institution_id: str) -> dict:
+  return {
+    "op": OP_UPSERT_INSTITUTION,
+    "key": f"institution:{institution_id}:upsert",
+    "entityIds": [institution_id],
+    "payload": {"institutionMongoId": institution_id},
+  }
+
+
+def enroll_student_op(student_id: str, institution_id: str, start: str, end: str | None = None) -> dict:
+  return {
+    "op": OP_ENROLL_STUDENT,
+    "key": f"student:{student_id}:enroll:{institution_id}:{start}",
+    "entityIds": [student_id, institution_id],
+    "payload": {
+      "studentMongoId": student_id,
+      "institutionMongoId": institution_id,
+      "startDate": start,
+      "endDate": end,
+    },
+  }
+
+
+def delete_student_op(student_id: str) -> dict:
+  return {
+    "op": OP_DELETE_STUDENT,
+    "key": f"student:{student_id}:delete",
+    "entityIds": [student_id],
+    "payload": {"studentMongoId": student_id},
+  }
+
+
+class OutboxDispatcher:
+  """
+  Toma lotes de la cola (lease por doc), los agrupa por tipo y los aplica en una sola
+  transacción de Neo4j con UNWIND. Todas las operaciones son MERGE / DETACH DELETE, así que
+  reaplicar un lote (lease vencido, reintento) es inocuo. Si el lote falla se reintenta
+  doc por doc para aislar la operación que rompe; esa sola queda con backoff y, tras
+  outbox_max_attempts, en FAILED (la repara el comando reconcile_graph).
+  """
+
+  def __init__(self, mongo_db, neo: Neo4jGraphService, audit_logger=None):
+    self.repo = OutboxRepository(mongo_db)
+    self.students = StudentRepository(mongo_db)
+    self.neo = neo
+    self.audit_logger = audit_logger
+    self.worker = f"{socket.gethostname()}:{os.getpid()}"
+
+  async def dispatch_once(self, entity_ids: list[str] | None = None) -> int:
+    docs = await self.repo.claim(
+      self.worker,
+      settings.outbox_batch_size,
+      settings.outbox_lease_seconds,
+      entity_ids=entity_ids,
+    )
+    if not docs:
+      return 0
+
+    try:
+      await self._apply(docs)
+      await self.repo.mark_done([d["_id"] for d in docs], docs[0]["claimToken"])
+      return len(docs)
+    except Exception as e:
+      if len(docs) == 1:
+        await self._retry(docs[0], e)
+        return 1
+      print(f"[outbox] batch of {len(docs)} FAILED, retrying one by one: {type(e).__name__}: {e}")
+
+    for doc in docs:
+      try:
+        await self._apply([doc])
+        await self.repo.mark_done([doc["_id"]], doc["claimToken"])
+      except Exception as e:
+        await self._retry(doc, e)
+    return len(docs)
+
+  async def _retry(self, doc: dict, error: Exception) -> None:
+    updated = await self.repo.mark_retry(
+      doc,
+      f"{type(error).__name__}: {error}",
+      max_attempts=settings.outbox_max_attempts,
+      backoff_seconds=settings.outbox_backoff_seconds,
+    )
+    if updated and updated.get("status") != STATUS_PENDING:
+      print(f"[outbox] {doc['key']} FAILED after {updated['attempts']} attempts: {type(error).__name__}: {error}")
+
+  async def _apply(self, docs: list[dict]) -> dict:
+    institutions: dict[str, None] = {}
+    students: dict[str, None] = {}
+    enrollments: dict[str, dict] = {}
+    deleted: dict[str, None] = {}
+    for d in docs:
+      p = d["payload"]
+      if d["op"] == OP_UPSERT_INSTITUTION:
+        institutions[p["institutionMongoId"]] = None
+      elif d["op"] == OP_UPSERT_STUDENT:
+        students[p["studentMongoId"]] = None
+      elif d["op"] == OP_ENROLL_STUDENT:
+        enrollments[d["key"]] = p
+      elif d["op"] == OP_DELETE_STUDENT:
+        deleted[p["studentMongoId"]] = None
+      else:
+        raise ValueError(f"Unknown outbox op: {d['op']}")
+
+    # un alta que se reintenta después de la baja no debe resucitar el nodo: solo alumnos que siguen en Mongo
+    touched = list(students) + [e["studentMongoId"] for e in enrollments.values()]
+    alive = await self.students.existing_ids(touched) if touched else set()
+
+    async def _do():
+      return await self.neo.apply_sync_batch(
+        institutionIds=list(institutions),
+        studentIds=[s for s in students if s in alive],
+        enrollments=[e for e in enrollments.values() if e["studentMongoId"] in alive],
+        deletedStudentIds=list(deleted),
+      )
+
+    return await audited(
+      audit_logger=self.audit_logger,
+      audit=AuditContext(request_id=uuid4(), user_name="outbox"),
+      operation="SYNC_BATCH",
+      db="neo4j",
+      entity_type="Outbox",
+      entity_id="(batch)",
+      payload_summary=(
+        f"outbox sync; ops={len(docs)} institutions={len(institutions)} students={len(students)} "
+        f"enrollments={len(enrollments)} deleted={len(deleted)}"
+      ),
+      fn=_do,
+    )
+
+  async def flush_for(self, entity_ids: list[str]) -> None:
+    # read-your-writes para los endpoints que necesitan los nodos ya en el grafo (links)
+    # respeta el backoff: una op que falló no se reintenta antes de su nextAttemptAt
+    deadline = time.monotonic() + settings.outbox_flush_timeout_seconds
+    while (due := await self.repo.next_pending_at(entity_ids)) is not None:
+      remaining = deadline - time.monotonic()
+      wait = (due - datetime.now(timezone.utc)).total_seconds()
+      if remaining <= 0 or wait >= remaining:
+        # en backoff más allá del timeout: queda para el dispatcher de fondo
+        return
+      if wait > 0:
+        await asyncio.sleep(wait)
+        continue
+      if not await self.dispatch_once(entity_ids):
+        # lo tiene tomado otro worker: esperar a que lo suelte
+        await asyncio.sleep(0.05)
+
+  async def stats(self) -> dict:
+    stats = await self.repo.stats()
+    oldest = stats.pop("oldestPendingAt")
+    lag = 0.0
+    if oldest is not None:
+      if oldest.tzinfo is None:
+        oldest = oldest.replace(tzinfo=timezone.utc)
+      lag = max((datetime.now(timezone.utc) - oldest).total_seconds(), 0.0)
+    return {**stats, "lagSeconds": round(lag, 3)}
+
+
+async def run_outbox_dispatcher(dispatcher: OutboxDispatcher) -> None:
+  while True:
+    applied = 0
+    try:
+      applied = await dispatcher.dispatch_once()
+    except Exception as e:
+      print(f"[outbox] dispatch FAILED: {type(e).__name__}: {e}")
+    # lote lleno = hay más esperando: seguir sin dormir
+    if applied < settings.outbox_batch_size:
+      await asyncio.sleep(settings.outbox_poll_seconds)
+
+
+def get_outbox(request: Request) -> OutboxDispatcher | None:
+  # None = sin Neo4j/Mongo en el arranque; las escrituras siguen encolando y se aplican al volver
+  return getattr(getattr(request.app.state, "services", None), "outbox", None)
@@ -1,63 +1,119 @@
 # edugrade/services/history/student_history.py
 from __future__ import annotations
 
+import json
+from collections import defaultdict
 from datetime import date
 from fastapi import HTTPException
 
+from edugrade.core.loader import Loaders
+from edugrade.services.history_cache import StudentHistoryCache, etag_for
 from edugrade.services.neo4j_graph import Neo4jGraphService
-from edugrade.repository.mongo.institution import InstitutionRepository
 from edugrade.utils.object_id import is_objectid_hex
 
-import asyncio
-async def _neo(callable_, *args, **kwargs):
-    return await asyncio.to_thread(callable_, *args, **kwargs)
 
-def _year_start(y: int) -> date:
-  return date(y, 1, 1)
+# ids por query UNWIND en el historial en lote
+HISTORY_BATCH_CHUNK = 500
 
-def _year_end(y: int) -> date:
-  return date(y, 12, 31)
 
-def _coalesce_end(d: date | None) -> date:
-  return d if d else date.today()
+def _coalesce_end(d: date | None, today: date) -> date:
+  return d if d else today
 
 def _intersects(a_from: date, a_to: date, b_from: date, b_to: date) -> bool:
   return a_from <= b_to and b_from <= a_to
 
 
 class StudentHistoryService:
-  def __init__(self, mongo_db, neo: Neo4jGraphService):
-    self.inst_repo = InstitutionRepository(mongo_db)
+  def __init__(
+    self,
+    mongo_db,
+    neo: Neo4jGraphService,
+    loaders: Loaders | None = None,
+    cache: StudentHistoryCache | None = None,
+  ):
+    self.loaders = loaders or Loaders(mongo_db)
     self.neo = neo
+    self.cache = cache or StudentHistoryCache()
 
-  async def get_history(self, student_id: str) -> dict:
+  async def get_history_json(self, student_id: str) -> tuple[str, bytes]:
+    # (etag, body JSON) desde el cache; en miss se arma y se guarda bajo la versión leída antes
     if not is_objectid_hex(student_id):
       raise HTTPException(status_code=400, detail="Invalid studentId")
 
-    # 1) Enrollments (STUDIES_AT)
-    enrollments = await _neo(self.neo.get_student_enrollments, student_id)
-    print(enrollments)
+    version = await self.cache.version(student_id)
+    # el mismo "hoy" para la key y para armar el historial (si no, un miss a medianoche se cruza de día)
+    today = date.today()
+    hit = await self.cache.get(student_id, version, today)
+    if hit is not None:
+      return hit
+
+    history = await self.get_history(student_id, today)
+    body = json.dumps(history, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = etag_for(body)
+    await self.cache.set(student_id, version, today, etag, body)
+    return etag, body
+
+  async def get_history(self, student_id: str, today: date | None = None) -> dict:
+    if not is_objectid_hex(student_id):
+      raise HTTPException(status_code=400, detail="Invalid studentId")
+
+    # 1) Enrollments (STUDIES_AT) y 2) Subjects (TOOK), en una sola transacción de lectura
+    # subjects: subjectId, subjectName, institutionMongoId, subjectStartDate, subjectEndDate, grade
+    enrollments, subjects = await self.neo.get_student_history_data(student_id)
 
     if not enrollments:
       # Si no hay enrollments, no hay historial de instituciones/años
       return {"years": []}
 
-    # 2) Subjects (TOOK) con intervalos por materia
-    # Debe devolver: subjectId, subjectName, institutionMongoId, subjectStartDate, subjectEndDate, grade
-    subjects = await _neo(self.neo.get_student_subject_rows, student_id)
-
     # 3) Nombres de instituciones (Mongo)
-    inst_ids = sorted({e["institutionMongoId"] for e in enrollments})
-    inst_docs = []
-    for iid in inst_ids:
-      inst_docs.append(await self.inst_repo.get_one(iid))
-
-    inst_name_by_id = {
-      iid: d.get("name")
-      for iid, d in zip(inst_ids, inst_docs)
-      if d and d.get("name")
-    }
+    inst_name_by_id = await self._institution_names({e["institutionMongoId"] for e in enrollments})
+    return self._assemble(enrollments, subjects, inst_name_by_id, today or date.today())
+
+  async def iter_histories(self, student_ids: list[str], chunk_size: int = HISTORY_BATCH_CHUNK):
+    """
+    Historiales de muchos alumnos, en el orden pedido, de a chunk_size: por chunk una
+    query UNWIND por tipo de fila (enrollments / materias) y un solo fetch de instituciones
+    (el loader del request ya no vuelve a pedir las que trajo en chunks anteriores).
+    Ids inválidos o con datos rotos salen como {"studentId", "error"} sin cortar el resto.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    today = date.today()
+    for i in range(0, len(student_ids), chunk_size):
+      chunk = student_ids[i:i + chunk_size]
+      valid = [sid for sid in chunk if is_objectid_hex(sid)]
+      data = await self.neo.get_students_history_data(valid) if valid else {}
+
+      inst_name_by_id = await self._institution_names({
+        e["institutionMongoId"] for enrollments, _ in data.values() for e in enrollments
+      })
 
+      for sid in chunk:
+        if sid not in data:
+          yield {"studentId": sid, "error": "Invalid studentId"}
+          continue
+        enrollments, subjects = data[sid]
+        try:
+          history = self._assemble(enrollments, subjects, inst_name_by_id, today) if enrollments else {"years": []}
+        except HTTPException as e:
+          yield {"studentId": sid, "error": e.detail}
+          continue
+        yield {"studentId": sid, **history}
+
+  async def _institution_names(self, inst_ids: set[str]) -> dict[str, str]:
+    ids = sorted(inst_ids)
+    if not ids:
+      return {}
+    docs = await self.loaders.institutions.load_many(ids)
+    return {iid: d.get("name") for iid, d in zip(ids, docs) if d and d.get("name")}
+
+  @classmethod
+  def _assemble(
+    cls,
+    enrollments: list[dict],
+    subjects: list[dict],
+    inst_name_by_id: dict[str, str],
+    today: date,
+  ) -> dict:
     # 4) Enrollments separados por (institutionMongoId, enrollmentId)
     enrollment_by_key: dict[tuple[str, str], tuple[date, date | None]] = {}
 
@@ -80,12 +136,49 @@ class StudentHistoryService:
       enrollment_by_key[(iid, eid)] = (inst_from, inst_to)
 
     # Rango de años basado en enrollments
-    periods = [(fr, _coalesce_end(to)) for fr, to in enrollment_by_key.values()]
+    periods = [(fr, _coalesce_end(to, today)) for fr, to in enrollment_by_key.values()]
     min_year = min(fr.year for fr, _ in periods)
     max_year = max(to.year for _, to in periods)
 
-    # 5) Parse subjects una sola vez
-    parsed_subjects: list[dict] = []
+    # 5) Parse subjects una sola vez, agrupados por (institución, año de inicio) y ordenados por fecha
+    # (Opción A: una materia se asigna SOLO al año de su startDate)
+    subjects_by_bucket: dict[tuple[str, int], list[dict]] = defaultdict(list)
+    for ps in sorted(cls._parse_subjects(subjects), key=lambda x: x["from"]):
+      subjects_by_bucket[(ps["institutionMongoId"], ps["from"].year)].append(ps)
+
+    # 6) Barrido: cada enrollment cae en los años consecutivos que cubre; se recorren
+    # en orden así que dentro de cada año queda el mismo orden que los enrollments
+    years_out: list[dict] = [{"year": y, "institutions": []} for y in range(min_year, max_year + 1)]
+
+    for (iid, _eid), (inst_from, inst_to_opt) in enrollment_by_key.items():
+      inst_to = _coalesce_end(inst_to_opt, today)
+
+      for y in range(inst_from.year, inst_to.year + 1):
+        subjects_out = [
+          {
+            "subjectId": ps["subjectId"],
+            "name": ps["subjectName"],
+            "fromDate": ps["from"].isoformat(),
+            "toDate": ps["to"].isoformat() if ps["to"] else None,
+            "grade": ps.get("grade"),
+          }
+          for ps in subjects_by_bucket.get((iid, y), ())
+          # la materia tiene que intersectar con ESTE enrollment
+          if _intersects(inst_from, inst_to, ps["from"], _coalesce_end(ps["to"], today))
+        ]
+
+        # siempre se agrega la institución, aunque subjects_out sea []
+        years_out[y - min_year]["institutions"].append({
+          "institutionId": iid,
+          "name": inst_name_by_id.get(iid),
+          "subjects": subjects_out,
+        })
+
+    return {"years": years_out}
+
+  @staticmethod
+  def _parse_subjects(subjects: list[dict]) -> list[dict]:
+    parsed: list[dict] = []
     for s in subjects:
       if not s.get("subjectStartDate"):
         continue
@@ -106,7 +199,7 @@ class StudentHistoryService:
         except Exception:
           raise HTTPException(status_code=500, detail="Neo4j data error: invalid subjectEndDate")
 
-      parsed_subjects.append({
+      parsed.append({
         "subjectId": s.get("subjectId"),
         "subjectName": s.get("subjectName"),
         "institutionMongoId": subj_inst,
@@ -114,60 +207,4 @@ class StudentHistoryService:
         "from": s_from,
         "to": s_to,
       })
-
-    # 6) Construir salida incluyendo años e instituciones aunque no haya subjects
-    years_out: list[dict] = []
-
-    for y in range(min_year, max_year + 1):
-      y_from, y_to = _year_start(y), _year_end(y)
-      institutions_out: list[dict] = []
-
-      for (iid, eid), (inst_from, inst_to_opt) in enrollment_by_key.items():
-        inst_to = _coalesce_end(inst_to_opt)
-
-        # Institución existe en ese año?
-        if not _intersects(inst_from, inst_to, y_from, y_to):
-          continue
-
-        subjects_out: list[dict] = []
-
-        for ps in parsed_subjects:
-          # (1) Materia pertenece a ESTA institución
-          if ps["institutionMongoId"] != iid:
-            continue
-
-          s_from = ps["from"]
-          s_to = _coalesce_end(ps["to"])
-
-          # (2) Materia intersecta con el enrollment
-          if not _intersects(inst_from, inst_to, s_from, s_to):
-            continue
-
-          # (3) Opción A: asignar SOLO al año del startDate del subject
-          if s_from.year != y:
-            continue
-
-          subjects_out.append({
-            "subjectId": ps["subjectId"],
-            "name": ps["subjectName"],
-            "fromDate": s_from.isoformat(),
-            "toDate": ps["to"].isoformat() if ps["to"] else None,
-            "grade": ps.get("grade"),
-          })
-
-        subjects_out.sort(key=lambda x: x["fromDate"])
-
-        # ✅ CLAVE: siempre agrego la institución, aunque subjects_out sea []
-        institutions_out.append({
-          "institutionId": iid,
-          "name": inst_name_by_id.get(iid),
-          "subjects": subjects_out,
-        })
-
-      # ✅ CLAVE: siempre agrego el año, aunque institutions_out sea []
-      years_out.append({
-        "year": y,
-        "institutions": institutions_out,
-      })
-
-    return {"years": years_out}
\ No newline at end of file
+    return parsed
@@ -0,0 +1,98 @@
+''' catálogo de materias en memoria del proceso: id -> nombre e institución -> materias ordenadas '''
+
+import time
+from typing import Any, Dict, List, Optional
+
+from edugrade.config import settings
+from edugrade.repository.neo4j_graph import Neo4jGraphRepository
+from edugrade.utils.ttl_cache import TTLCache
+
+# INCR en cada alta de materia; cada worker compara contra la suya y vacía su caché si cambió
+VERSION_KEY = "subjects:catalog:version"
+
+
+class SubjectCatalog:
+    """
+    Las materias solo cambian por upsert_subject, así que las lecturas de nombres y listados
+    por institución se sirven desde acá y Neo4j se consulta solo en misses.
+    Invalidación: local al instante en este proceso; entre workers vía VERSION_KEY en Redis,
+    chequeada como mucho cada subject_catalog_version_check_seconds.
+    """
+
+    def __init__(self, repo: Neo4jGraphRepository, redis: Any = None):
+        self.repo = repo
+        self.redis = redis
+        ttl = settings.subject_catalog_ttl_seconds
+        self._subjects = TTLCache(settings.subject_catalog_max_subjects, ttl)         # id -> {id, name}
+        self._by_institution = TTLCache(settings.subject_catalog_max_institutions, ttl)  # inst -> [subject]
+        self._version: Optional[str] = None
+        self._version_checked_at = 0.0
+        # sube con cada invalidación: una carga que empezó antes no puede pisar datos nuevos
+        self._generation = 0
+
+    def _clear(self) -> None:
+        self._subjects.clear()
+        self._by_institution.clear()
+        self._generation += 1
+
+    async def _sync_version(self) -> None:
+        if self.redis is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < settings.subject_catalog_version_check_seconds:
+            return
+        self._version_checked_at = now
+        try:
+            version = await self.redis.get(VERSION_KEY)
+        except Exception as e:
+            print(f"[cache] subject catalog version FAILED: {type(e).__name__}: {e}")
+            return
+        if version != self._version:
+            self._clear()
+            self._version = version
+
+    async def get_subjects_by_institution(self, institutionMongoId: str) -> List[Dict[str, Any]]:
+        await self._sync_version()
+        cached = self._by_institution.get(institutionMongoId)
+        if cached is None:
+            generation = self._generation
+            cached = await self.repo.get_subjects_by_institution(institutionMongoId)
+            if generation == self._generation:
+                self._by_institution.set(institutionMongoId, cached)
+                for s in cached:
+                    self._subjects.set(s["id"], {"id": s["id"], "name": s.get("name")})
+        return [dict(s) for s in cached]
+
+    async def get_subjects_by_ids(self, subjectIds: List[str]) -> List[Dict[str, Any]]:
+        await self._sync_version()
+        out: List[Dict[str, Any]] = []
+        missing: List[str] = []
+        for sid in dict.fromkeys(subjectIds):
+            hit = self._subjects.get(sid)
+            if hit is None:
+                missing.append(sid)
+            else:
+                out.append(dict(hit))
+
+        if missing:
+            generation = self._generation
+            rows = await self.repo.get_subjects_by_ids(missing)
+            for r in rows:
+                if generation == self._generation:
+                    self._subjects.set(r["id"], {"id": r["id"], "name": r.get("name")})
+                out.append(dict(r))
+        return out
+
+    async def invalidate(self, institutionMongoId: Optional[str] = None) -> None:
+        if institutionMongoId is None:
+            self._clear()
+        else:
+            self._by_institution.pop(institutionMongoId)
+            self._generation += 1
+
+        if self.redis is None:
+            return
+        try:
+            await self.redis.incr(VERSION_KEY)
+        except Exception as e:
+            print(f"[cache] subject catalog invalidate FAILED: {type(e).__name__}: {e}")
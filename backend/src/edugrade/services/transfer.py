@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date
+
+from fastapi import HTTPException
+
+from edugrade.core.loader import Loaders
+from edugrade.repository.mongo.grade import GradeRepository
+from edugrade.services.mongo.conversion_rules import DIR_FROM_ZA, ConversionRulesService
+from edugrade.services.neo4j_graph import Neo4jGraphService
+from edugrade.utils.date import date_to_datetime_utc
+from edugrade.utils.object_id import is_objectid_hex
+from edugrade.utils.string import non_empty_str
+
+
+class TransferService:
+  """
+  Qué materias de una institución destino ya tiene acreditadas un alumno.
+  Un solo round trip a cada store, en paralelo: la query de Neo4j (TOOK -> grupo de
+  equivalencia -> materias destino), un aggregate de sus exámenes en Mongo y la institución destino.
+  """
+
+  def __init__(self, mongo_db, neo: Neo4jGraphService, loaders: Loaders | None = None):
+    self.grades = GradeRepository(mongo_db)
+    self.conv = ConversionRulesService(mongo_db)
+    self.loaders = loaders or Loaders(mongo_db)
+    self.neo = neo
+
+  async def evaluate(
+    self,
+    student_id: str,
+    target_institution_id: str,
+    level_stage: str,
+    target_system: str | None = None,
+  ) -> dict:
+    if not is_objectid_hex(student_id):
+      raise HTTPException(status_code=400, detail="Invalid studentId")
+    if not is_objectid_hex(target_institution_id):
+      raise HTTPException(status_code=400, detail="Invalid targetInstitution")
+    try:
+      level_stage = non_empty_str(level_stage, "levelStage")
+    except ValueError as e:
+      raise HTTPException(status_code=400, detail=str(e))
+
+    matches, averages, institution = await asyncio.gather(
+      self.neo.get_transfer_matches(student_id, target_institution_id, level_stage),
+      self.grades.averages_by_student_subject(student_id),
+      self.loaders.institutions.load(target_institution_id),
+    )
+    if institution is None:
+      raise HTTPException(status_code=404, detail="Target institution not found")
+
+    avg_by_subject = {a["subjectId"]: a for a in averages}
+    project = await self._projector(target_system, institution.get("country"))
+
+    out: list[dict] = []
+    for m in matches:
+      avg = avg_by_subject.get(m["sourceSubjectId"]) or {}
+      avg_za = avg.get("averageZA")
+      display_value, display_system = project(avg_za) if avg_za is not None else (None, None)
+      out.append({
+        **m,
+        "examsUsedInAverage": int(avg.get("examsUsedInAverage") or 0),
+        "averageZA": avg_za,
+        "displayValue": display_value,
+        "displaySystem": display_system,
+      })
+
+    return {
+      "studentId": student_id,
+      "targetInstitutionId": target_institution_id,
+      "levelStage": level_stage,
+      "matches": out,
+    }
+
+  async def _projector(self, target_system: str | None, country: str | None):
+    # reglas FROM_ZA cargadas una vez; la conversión de cada promedio es en memoria
+    if target_system is None or target_system == "ZA":
+      return lambda avg_za: (str(avg_za), "ZA")
+
+    try:
+      ts = non_empty_str(target_system, "targetSystem")
+    except ValueError as e:
+      raise HTTPException(status_code=400, detail=str(e))
+
+    rules = await self.conv.load_rules(direction=DIR_FROM_ZA, system=ts)
+    rule = self.conv.pick_rule(
+      rules,
+      system=ts,
+      country=country,
+      grade="0",   # mismo placeholder que el dashboard: sin selector de grade por ahora
+      when=date_to_datetime_utc(date.today()),
+    )
+    if rule is None:
+      raise HTTPException(status_code=404, detail="No conversion rule found for the given parameters/date")
+
+    mapping = rule.get("map", {})
+    return lambda avg_za: (self.conv.map_from_za(mapping, str(avg_za), ts), ts)
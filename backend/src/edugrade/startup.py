@@ -1,66 +1,262 @@
+import asyncio
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase
 from cassandra.cluster import Cluster
 import redis.asyncio as redis
 
 from edugrade.config import settings
 from edugrade.audit.schema import ensure_audit_schema
 from edugrade.audit.logger import AuditLogger
+from edugrade.core.services import build_services
+from edugrade.repository.mongo.conversion_rule import ConversionRuleRepository
+from edugrade.repository.mongo.grade import GradeRepository
+from edugrade.repository.mongo.institution import InstitutionRepository
+from edugrade.repository.mongo.options import OptionsRepository
+from edugrade.repository.mongo.outbox import OutboxRepository
+from edugrade.repository.mongo.reconversion_job import ReconversionJobRepository
+from edugrade.repository.mongo.schema_version import SchemaVersionRepository
+from edugrade.repository.mongo.student import StudentRepository
+from edugrade.repository.neo4j_graph import Neo4jGraphRepository
+from edugrade.migrations.equivalence_groups import migrate_equivalence_cycles
+from edugrade.migrations.native_dates import migrate_native_dates
+from edugrade.migrations.transfer_flows import migrate_transfer_flows
+from edugrade.services.mongo.grade_projection import run_projection_refresher
+from edugrade.services.outbox import run_outbox_dispatcher
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    app.state.mongo_client = None
-    app.state.mongo_db = None
+# subir al agregar/cambiar índices, constraints o migraciones: el arranque solo los aplica
+# cuando la versión guardada en cada store difiere (Cassandra: audit.schema.AUDIT_SCHEMA_VERSION)
+MONGO_SCHEMA_VERSION = 4
+NEO4J_SCHEMA_VERSION = 3
+
+
+async def ensure_mongo_indexes(mongo_db) -> bool:
+    ok = True
+    for repo_cls in (
+        StudentRepository,
+        InstitutionRepository,
+        GradeRepository,
+        ConversionRuleRepository,
+        OptionsRepository,
+        ReconversionJobRepository,
+        OutboxRepository,
+    ):
+        try:
+            await repo_cls(mongo_db).ensure_indexes()
+        except Exception as e:
+            ok = False
+            print(f"[startup] Mongo indexes {repo_cls.__name__}: {type(e).__name__}: {e}")
+    return ok
+
+
+async def backfill_search_keys(mongo_db) -> bool:
+    # documentos creados antes de la búsqueda por trigramas
+    ok = True
+    for repo_cls in (StudentRepository, InstitutionRepository):
+        try:
+            done = await repo_cls(mongo_db).backfill_search_keys()
+            if done:
+                print(f"[startup] Search keys backfilled for {done} {repo_cls.__name__} docs")
+        except Exception as e:
+            ok = False
+            print(f"[startup] Search keys {repo_cls.__name__}: {type(e).__name__}: {e}")
+    return ok
+
+
+async def apply_mongo_schema(mongo_db) -> bool:
+    versions = SchemaVersionRepository(mongo_db)
+    if not settings.schema_force_apply and await versions.get("mongo") == MONGO_SCHEMA_VERSION:
+        return False
+
+    indexed = await ensure_mongo_indexes(mongo_db)
+    backfilled = await backfill_search_keys(mongo_db)
+    # con algún paso fallido no se guarda la versión: el próximo arranque reintenta
+    if indexed and backfilled:
+        await versions.set("mongo", MONGO_SCHEMA_VERSION)
+    return True
+
+
+async def apply_neo4j_schema(driver) -> bool:
+    repo = Neo4jGraphRepository(driver)
+    if not settings.schema_force_apply and await repo.get_schema_version("graph") == NEO4J_SCHEMA_VERSION:
+        return False
+
+    await repo.ensure_constraints()
+
+    # equivalencias viejas (ciclos EQUIVALENT_TO) -> grupos; no-op una vez migradas
+    migrated = await migrate_equivalence_cycles(driver)
+    if migrated:
+        print(f"[startup] Equivalence groups migrated: {migrated}")
+
+    # fechas de STUDIES_AT/TOOK guardadas como string -> date; no-op una vez migradas
+    converted = await migrate_native_dates(driver)
+    if converted:
+        print(f"[startup] Native dates migrated: {converted}")
+
+    # TRANSFER_FLOW se mantiene incremental; la primera vez se arma desde STUDIES_AT (necesita fechas nativas)
+    if await migrate_transfer_flows(driver):
+        print("[startup] Transfer flows built from STUDIES_AT")
+
+    await repo.set_schema_version("graph", NEO4J_SCHEMA_VERSION)
+    return True
+
+
+async def connect_mongo():
+    client = AsyncIOMotorClient(settings.mongo_uri)
     try:
-        mongo_client = AsyncIOMotorClient(settings.mongo_uri)
-        mongo_db = mongo_client[settings.mongo_db]
-        await mongo_client.admin.command("ping")
-        app.state.mongo_client = mongo_client
-        app.state.mongo_db = mongo_db
-    except Exception as e:
-        print(f"[startup] Mongo disabled: {type(e).__name__}: {e}")
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        raise
+    return client
+
 
-    app.state.neo4j_driver = None
+async def connect_neo4j():
+    # un solo driver async para toda la app; los services lo reciben ya construido
+    driver = AsyncGraphDatabase.driver(
+        settings.neo4j_uri,
+        auth=(settings.neo4j_user, settings.neo4j_password),
+        max_transaction_retry_time=settings.neo4j_max_transaction_retry_seconds,
+    )
     try:
-        app.state.neo4j_driver = GraphDatabase.driver(
-            settings.neo4j_uri,
-            auth=(settings.neo4j_user, settings.neo4j_password),
-        )
+        # abre la primera conexión del pool ahora y no en el primer request
+        await driver.verify_connectivity()
     except Exception as e:
-        print(f"[startup] Neo4j disabled: {type(e).__name__}: {e}")
-    
-    app.state.cassandra_cluster = None
-    app.state.cassandra_session = None
-    app.state.audit_logger = None
+        # el driver reconecta solo cuando Neo4j aparezca
+        print(f"[startup] Neo4j not reachable yet: {type(e).__name__}: {e}")
+    return driver
+
+
+async def connect_redis():
+    client = redis.from_url(settings.redis_url, decode_responses=True)
+    await client.ping()
+    return client
 
+
+def connect_cassandra():
+    # bloqueante (cassandra-driver): se corre en un thread
+    cluster = Cluster(settings.cassandra_hosts, port=settings.cassandra_port)
     try:
-        cass_cluster = Cluster(settings.cassandra_hosts, port=settings.cassandra_port)
-        cass_session = cass_cluster.connect()
+        return cluster, cluster.connect()
+    except Exception:
+        cluster.shutdown()
+        raise
 
-        # Crear keyspace + tablas si no existen
-        ensure_audit_schema(cass_session, settings.cassandra_keyspace)
 
-        app.state.cassandra_cluster = cass_cluster
-        app.state.cassandra_session = cass_session
-        app.state.audit_logger = AuditLogger(
-            cass_session,
-            service_name=settings.app_name,
-        )
+async def timed_step(timings: dict[str, float], name: str, fn):
+    # un paso del arranque: mide duración y, si falla, lo reporta y devuelve None
+    t0 = time.perf_counter()
+    try:
+        return await fn()
     except Exception as e:
-        print(f"[startup] Cassandra disabled: {type(e).__name__}: {e}")
-    
+        print(f"[startup] {name} failed: {type(e).__name__}: {e}")
+        return None
+    finally:
+        timings[name] = (time.perf_counter() - t0) * 1000
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    timings: dict[str, float] = {}
+    t0 = time.perf_counter()
+
+    # 1) conexiones a los cuatro stores en paralelo
+    mongo_client, neo4j_driver, redis_client, cassandra = await asyncio.gather(
+        timed_step(timings, "mongo.connect", connect_mongo),
+        timed_step(timings, "neo4j.connect", connect_neo4j),
+        timed_step(timings, "redis.connect", connect_redis),
+        timed_step(timings, "cassandra.connect", lambda: asyncio.to_thread(connect_cassandra)),
+    )
+
+    app.state.mongo_client = mongo_client
+    app.state.mongo_db = mongo_client[settings.mongo_db] if mongo_client is not None else None
+    app.state.neo4j_driver = neo4j_driver
+    app.state.redis = redis_client
+    app.state.cassandra_cluster, app.state.cassandra_session = cassandra or (None, None)
+
+    # 2) schema/índices/constraints, también en paralelo; cada store salta si su versión ya está aplicada
+    schema_steps = []
+    if app.state.mongo_db is not None:
+        schema_steps.append(timed_step(timings, "mongo.schema", lambda: apply_mongo_schema(app.state.mongo_db)))
+    if app.state.neo4j_driver is not None:
+        schema_steps.append(timed_step(timings, "neo4j.schema", lambda: apply_neo4j_schema(app.state.neo4j_driver)))
+    if app.state.cassandra_session is not None:
+        schema_steps.append(timed_step(
+            timings,
+            "cassandra.schema",
+            lambda: asyncio.to_thread(
+                ensure_audit_schema,
+                app.state.cassandra_session,
+                settings.cassandra_keyspace,
+                settings.schema_force_apply,
+            ),
+        ))
+    await asyncio.gather(*schema_steps)
+
+    app.state.audit_logger = None
+    if app.state.cassandra_session is not None:
+        try:
+            app.state.audit_logger = AuditLogger(
+                app.state.cassandra_session,
+                service_name=settings.app_name,
+            )
+        except Exception as e:
+            print(f"[startup] Cassandra audit disabled: {type(e).__name__}: {e}")
+
+    # 3) services construidos una vez; las dependencias de los endpoints los toman de app.state
+    t_services = time.perf_counter()
+    app.state.services = build_services(
+        app.state.mongo_db,
+        app.state.neo4j_driver,
+        app.state.audit_logger,
+        app.state.redis,
+    )
+    timings["services"] = (time.perf_counter() - t_services) * 1000
+
+    app.state.projection_task = None
+    if settings.grade_projections_enabled and app.state.mongo_db is not None:
+        app.state.projection_task = asyncio.create_task(
+            run_projection_refresher(app.state.mongo_db, settings.grade_projections_refresh_seconds)
+        )
+
+    # Mongo -> Neo4j: aplica en segundo plano lo que las escrituras dejaron en el outbox
+    app.state.outbox_task = None
+    if app.state.services.outbox is not None:
+        app.state.outbox_task = asyncio.create_task(run_outbox_dispatcher(app.state.services.outbox))
+
+    # jobs de re-conversión que quedaron a mitad de camino (reinicio/deploy)
+    if app.state.services.reconversion is not None:
+        try:
+            resumed = await app.state.services.reconversion.resume_interrupted()
+            if resumed:
+                print(f"[startup] Resumed {resumed} reconversion job(s)")
+        except Exception as e:
+            print(f"[startup] Reconversion resume failed: {type(e).__name__}: {e}")
+
+    timings["total"] = (time.perf_counter() - t0) * 1000
+    print("[startup] timings: " + " ".join(f"{name}={ms:.0f}ms" for name, ms in timings.items()))
+
     try:
         yield
     finally:
+        if app.state.projection_task:
+            app.state.projection_task.cancel()
+
+        if app.state.outbox_task:
+            app.state.outbox_task.cancel()
+
         if app.state.mongo_client:
             app.state.mongo_client.close()
 
         if app.state.neo4j_driver:
-            app.state.neo4j_driver.close()
+            await app.state.neo4j_driver.close()
+
+        if app.state.redis:
+            await app.state.redis.aclose()
 
         if app.state.cassandra_session:
             app.state.cassandra_session.shutdown()
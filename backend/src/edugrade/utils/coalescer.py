@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class WriteCoalescer:
+  """
+  Junta escrituras concurrentes y las manda en un solo lote: se vacía cuando llega a
+  max_batch items o pasan max_wait_seconds desde el primero que quedó esperando.
+  flush recibe los items en orden de llegada y devuelve, en el mismo orden, el resultado
+  de cada uno o la excepción que le corresponde; cada caller recibe solo lo suyo.
+  Si flush falla entero, todos los callers de ese lote reciben la misma excepción.
+  """
+
+  def __init__(
+    self,
+    flush: Callable[[list[Any]], Awaitable[list[Any]]],
+    max_batch: int,
+    max_wait_seconds: float,
+  ):
+    self._flush = flush
+    self.max_batch = max(1, int(max_batch))
+    self.max_wait_seconds = max_wait_seconds
+    self._pending: list[tuple[Any, asyncio.Future]] = []
+    self._timer: asyncio.TimerHandle | None = None
+    # referencias a los flush en curso (create_task no las retiene)
+    self._inflight: set[asyncio.Task] = set()
+
+  async def submit(self, item: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    self._pending.append((item, fut))
+    if len(self._pending) >= self.max_batch:
+      self._start_flush()
+    elif self._timer is None:
+      self._timer = loop.call_later(self.max_wait_seconds, self._start_flush)
+    # si el caller se cancela se cancela solo su future; el lote se escribe igual
+    return await fut
+
+  def _start_flush(self) -> None:
+    if self._timer is not None:
+      self._timer.cancel()
+      self._timer = None
+    batch, self._pending = self._pending, []
+    if not batch:
+      return
+    task = asyncio.get_running_loop().create_task(self._run(batch))
+    self._inflight.add(task)
+    task.add_done_callback(self._inflight.discard)
+
+  async def _run(self, batch: list[tuple[Any, asyncio.Future]]) -> None:
+    try:
+      results = await self._flush([item for item, _ in batch])
+      if len(results) != len(batch):
+        raise RuntimeError(f"coalescer flush returned {len(results)} results for {len(batch)} items")
+    except Exception as e:
+      results = [e] * len(batch)
+
+    for (_, fut), result in zip(batch, results):
+      if fut.done():
+        continue
+      if isinstance(result, BaseException):
+        fut.set_exception(result)
+      else:
+        fut.set_result(result)
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+# Cursor opaco para keyset pagination sobre (createdAt, _id) descendente
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+def encode_cursor(created_at: datetime, _id: ObjectId) -> str:
+  raw = json.dumps({"c": created_at.isoformat(), "i": str(_id)}, separators=(",", ":"))
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+  try:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return datetime.fromisoformat(data["c"]), ObjectId(data["i"])
+  except Exception as e:
+    raise ValueError("Invalid cursor") from e
+
+def next_cursor(docs: list[dict], limit: int) -> str | None:
+  # Página incompleta => no hay más
+  if len(docs) < limit or not docs:
+    return None
+  last = docs[-1]
+  if not isinstance(last.get("createdAt"), datetime):
+    return None
+  return encode_cursor(last["createdAt"], ObjectId(str(last["_id"])))
+
+def keyset_filter(after: tuple[datetime, ObjectId]) -> dict:
+  created_at, _id = after
+  return {
+    "$or": [
+      {"createdAt": {"$lt": created_at}},
+      {"createdAt": created_at, "_id": {"$lt": _id}},
+    ]
+  }
+
+# Cursor opaco sobre una sola clave ascendente (ej. mongoId en listados de Neo4j)
+
+def encode_key_cursor(key: str) -> str:
+  return base64.urlsafe_b64encode(json.dumps({"k": key}).encode()).decode().rstrip("=")
+
+def decode_key_cursor(cursor: str) -> str:
+  try:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    key = json.loads(base64.urlsafe_b64decode(padded.encode()))["k"]
+  except Exception as e:
+    raise ValueError("Invalid cursor") from e
+  if not isinstance(key, str):
+    raise ValueError("Invalid cursor")
+  return key
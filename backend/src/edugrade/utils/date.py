@@ -30,3 +30,9 @@ def ensure_date(value, field_name: str) -> date:
 def ensure_date_range(from_date: date, to_date: date) -> None:
   if from_date > to_date:
     raise ValueError("fromDate must be <= toDate")
+
+def as_naive_utc(value: datetime | None) -> datetime | None:
+  # Motor devuelve datetimes naive (UTC); los del request vienen con tzinfo
+  if value is None or value.tzinfo is None:
+    return value
+  return value.astimezone(timezone.utc).replace(tzinfo=None)
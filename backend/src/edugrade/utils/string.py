@@ -1,4 +1,5 @@
 import math
+import unicodedata
 
 def non_empty_str(s: str | None, field_name: str = "Value") -> str:
   if s is None:
@@ -17,4 +18,34 @@ def round_half_up(value_str: str) -> int:
   return math.floor(number + 0.5) if number >= 0 else math.ceil(number - 0.5)
 
 def normalize_value_key(v: str) -> str:
-  return str(v).strip()
\ No newline at end of file
+  return str(v).strip()
+
+def fold_text(s: str | None) -> str:
+  # minúsculas, sin acentos y con espacios colapsados: "  José  María" -> "jose maria"
+  if not s:
+    return ""
+  decomposed = unicodedata.normalize("NFKD", str(s))
+  stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+  return " ".join(stripped.casefold().split())
+
+def trigram_keys(s: str | None, prefix: str = "") -> list[str]:
+  # estilo pg_trgm: cada palabra se rellena con "  " adelante y " " atrás
+  keys: set[str] = set()
+  for word in fold_text(s).split():
+    padded = f"  {word} "
+    for i in range(len(padded) - 2):
+      keys.add(prefix + padded[i:i + 3])
+  return sorted(keys)
+
+def query_trigrams(q: str | None, prefix: str = "") -> list[str]:
+  # palabras >= 3: trigramas internos (match de substring);
+  # palabras cortas: trigramas de inicio de palabra (match de prefijo)
+  keys: set[str] = set()
+  for word in fold_text(q).split():
+    if len(word) >= 3:
+      grams = [word[i:i + 3] for i in range(len(word) - 2)]
+    else:
+      padded = f"  {word}"
+      grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    keys.update(prefix + g for g in grams)
+  return sorted(keys)
\ No newline at end of file
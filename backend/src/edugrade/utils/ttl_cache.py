@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+  # dict en memoria con vencimiento por entrada y tope de tamaño (desaloja el menos usado)
+
+  def __init__(self, max_size: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+    self.max_size = max(1, int(max_size))
+    self.ttl_seconds = ttl_seconds
+    self._clock = clock
+    self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    item = self._data.get(key, _MISSING)
+    if item is _MISSING:
+      return default
+    expires_at, value = item
+    if expires_at <= self._clock():
+      del self._data[key]
+      return default
+    self._data.move_to_end(key)
+    return value
+
+  def set(self, key: Hashable, value: Any) -> None:
+    self._data[key] = (self._clock() + self.ttl_seconds, value)
+    self._data.move_to_end(key)
+    while len(self._data) > self.max_size:
+      self._data.popitem(last=False)
+
+  def pop(self, key: Hashable) -> None:
+    self._data.pop(key, None)
+
+  def clear(self) -> None:
+    self._data.clear()
+
+  def __len__(self) -> int:
+    return len(self._data)
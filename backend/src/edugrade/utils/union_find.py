@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Hashable, Iterable
+
+
+class UnionFind:
+  # disjoint-set con path halving + unión por tamaño: ~O(1) amortizado por operación
+
+  def __init__(self, items: Iterable[Hashable] = ()):
+    self._parent: dict[Hashable, Hashable] = {}
+    self._size: dict[Hashable, int] = {}
+    for x in items:
+      self.add(x)
+
+  def add(self, x: Hashable) -> None:
+    if x not in self._parent:
+      self._parent[x] = x
+      self._size[x] = 1
+
+  def find(self, x: Hashable) -> Hashable:
+    self.add(x)
+    parent = self._parent
+    while parent[x] != x:
+      parent[x] = parent[parent[x]]
+      x = parent[x]
+    return x
+
+  def union(self, a: Hashable, b: Hashable) -> Hashable:
+    ra, rb = self.find(a), self.find(b)
+    if ra == rb:
+      return ra
+    if self._size[ra] < self._size[rb]:
+      ra, rb = rb, ra
+    self._parent[rb] = ra
+    self._size[ra] += self._size[rb]
+    return ra
+
+  def groups(self) -> list[list[Hashable]]:
+    out: dict[Hashable, list[Hashable]] = defaultdict(list)
+    for x in self._parent:
+      out[self.find(x)].append(x)
+    return list(out.values())